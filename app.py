@@ -1,7 +1,5 @@
 import streamlit as st
-from modules import utils, data_extraction, ai_processing, excel_processing, document_processing # Added document_processing
-from prompts import email_prompts, linkedin_prompts, facebook_prompts, google_search_prompts, google_display_prompts
-import time
+from modules import utils, ai_processing, excel_processing, export_processing, ad_records, job_queue, llm_cache, pipeline, request_scheduler, run_metrics, stage_cache
 
 # --- Page Config ---
 st.set_page_config(page_title="Branding & Marketing Ad Generator", layout="wide")
@@ -9,8 +7,20 @@ st.set_page_config(page_title="Branding & Marketing Ad Generator", layout="wide"
 # --- Initialize Session State ---
 if 'generated_excel_bytes' not in st.session_state:
     st.session_state.generated_excel_bytes = None
-if 'generated_transparency_doc_bytes' not in st.session_state: # New state for Word doc
-    st.session_state.generated_transparency_doc_bytes = None
+if 'generated_document_inputs' not in st.session_state: # Inputs of the Word doc, which is built on download
+    st.session_state.generated_document_inputs = None
+if 'generated_ad_table' not in st.session_state: # Flat ad table behind every export format
+    st.session_state.generated_ad_table = None
+if 'generated_run_metrics' not in st.session_state: # run_metrics.RunMetrics of the last run
+    st.session_state.generated_run_metrics = None
+if 'stage_cache' not in st.session_state: # Stage outputs reused by the next run when their inputs are unchanged
+    st.session_state.stage_cache = stage_cache.StageCache()
+if 'generation_job_id' not in st.session_state: # Background job of the last run; the URL keeps it across reloads
+    st.session_state.generation_job_id = st.query_params.get("job")
+if 'loaded_job_id' not in st.session_state: # Job whose reports are in this session
+    st.session_state.loaded_job_id = None
+if 'client_url_for_file' not in st.session_state:
+    st.session_state.client_url_for_file = ""
 if 'company_name_for_file' not in st.session_state:
     st.session_state.company_name_for_file = "report"
 if 'lead_objective_for_file' not in st.session_state:
@@ -56,15 +66,131 @@ with col2:
         objective_link_placeholder = "https://www.example.com/schedule-meeting"
     objective_specific_link_input = st.text_input(objective_link_label, placeholder=objective_link_placeholder, key="obj_link")
 
-    content_count_input = st.slider("Ad Variations per Type/Funnel Stage", 1, 10, 3, key="content_count")
+    content_count_input = st.slider("Ad Variations per Type/Funnel Stage", 1, 20, 3, key="content_count")
+    regenerate_fresh_input = st.checkbox("Regenerate fresh (ignore cached AI responses and earlier results)", key="regenerate_fresh")
+    generation_mode_input = st.selectbox(
+        "Generation Requests", list(pipeline.GENERATION_MODES), format_func=pipeline.GENERATION_MODES.get, key="generation_mode",
+        help="Batching channels/stages into fewer requests saves quota; per-stage requests stream ads sooner."
+    )
 
 # --- Generate Button & Progress ---
 st.header("3. Generate Content")
 
-if st.button("✨ Generate Ad Content & Reports", type="primary", use_container_width=True):
+JOB_POLL_SECONDS = 1.0 # How often the page checks on a running generation job
+
+
+def run_generation_job(job, client, campaign, sources, use_cache, generation_mode, stages, file_info):
+    """
+    Runs on the shared job queue (see job_queue), off the script thread: the pipeline and the
+    Excel report. Progress, notices and streamed ads are reported through `job`.
+    """
+    pipeline_result = pipeline.run_pipeline(
+        client,
+        campaign,
+        sources,
+        on_progress=lambda fraction, text: job.set_progress(fraction * 0.95, text), # Cap before final Excel step
+        on_notice=job.add_notice,
+        use_cache=use_cache,
+        on_ad=job.add_item,
+        generation_mode=generation_mode,
+        stages=stages,
+    )
+    outputs = {
+        "file_info": file_info, "ad_content": pipeline_result.ad_content, "metrics": pipeline_result.metrics,
+        "document_inputs": pipeline_result.document_inputs, "ad_table": None, "excel_bytes": None,
+    }
+    if not pipeline_result.has_context:
+        job.set_progress(1.0, "Failed: No context.")
+        return outputs
+
+    # --- 3. Create Excel Report ---
+    job.set_progress(0.95, "Formatting Excel report...")
+    valid_ad_content = {k: v for k, v in pipeline_result.ad_content.items() if v is not None}
+    if not valid_ad_content:
+        job.add_notice("error", "No ad content was successfully generated. Cannot create Excel report.")
+        job.set_progress(1.0, "Failed: No ad content for Excel.")
+        return outputs
+    with run_metrics.activate(pipeline_result.metrics):
+        ad_table = ad_records.ad_data_to_table(valid_ad_content)
+        outputs["ad_table"] = ad_table
+        outputs["excel_bytes"] = stages.run(
+            "excel_report", (valid_ad_content,),
+            lambda: excel_processing.create_excel_report_from_table(ad_table, ad_records.channels_in(valid_ad_content)),
+            use_cache=use_cache,
+        )
+    pipeline_result.metrics.finish() # Include the Excel report in the run's wall time
+    job.set_progress(1.0, "All reports generated!")
+    return outputs
+
+
+def load_job_outputs(job):
+    """Copies a finished job's reports into this session (rebuilt from the persisted ads after a server restart)."""
+    outputs = job.result
+    if outputs is None: # Only the persisted output survived: ads and file names, no metrics or transparency inputs
+        outputs = {"file_info": {}, "metrics": None, "document_inputs": None, "ad_table": None, "excel_bytes": None, **(job.output or {})}
+        valid_ad_content = {k: v for k, v in (outputs.get("ad_content") or {}).items() if v is not None}
+        if valid_ad_content:
+            outputs["ad_table"] = ad_records.ad_data_to_table(valid_ad_content)
+            outputs["excel_bytes"] = excel_processing.create_excel_report_from_table(outputs["ad_table"], ad_records.channels_in(valid_ad_content))
+    for name, value in outputs["file_info"].items():
+        st.session_state[name] = value
+    st.session_state.generated_excel_bytes = outputs["excel_bytes"]
+    st.session_state.generated_ad_table = outputs["ad_table"]
+    st.session_state.generated_document_inputs = outputs["document_inputs"]
+    st.session_state.generated_run_metrics = outputs["metrics"]
+
+
+def show_ad_preview(items):
+    """Live preview of the ads streamed so far, one expander per ad set."""
+    sections = {}
+    for result_key, list_key, item in items:
+        if result_key not in sections:
+            sections[result_key] = st.expander(result_key.replace("_", " "), expanded=True)
+        section = sections[result_key]
+        if isinstance(item, dict):
+            headline = item.get("headline") or item.get("subject_line") or ""
+            body = item.get("body") or item.get("introductory_text") or item.get("primary_text") or ""
+            section.markdown(f"**{headline}**\n\n{body}")
+        else: # Google headline/description assets
+            section.markdown(f"- {list_key[:-1].capitalize()}: {item}")
+
+
+def show_notices(notices):
+    levels = {"success": st.success, "info": st.info, "warning": st.warning, "error": st.error}
+    for level, message in notices:
+        levels[level](message)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_running_job(job_id):
+    """Polls a queued or running job without rerunning the whole page; reruns it once the job ends."""
+    queue = job_queue.get_job_queue()
+    job = queue.get(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    snapshot = job.snapshot()
+    if snapshot["status"] == "queued":
+        stats = queue.stats()
+        st.info(
+            f"Waiting for a free worker: {stats['running']} of {stats['max_concurrent']} generation jobs are running, "
+            f"{queue.queue_position(job)} queued ahead of yours."
+        )
+    st.progress(int(snapshot["progress"] * 100), text=snapshot["progress_text"] or "Extracting context and generating ad content...")
+    st.caption("This run continues on the server if you change inputs or reload the page.")
+    show_notices(snapshot["notices"])
+    if snapshot["items"]:
+        st.subheader("Live Preview")
+        show_ad_preview(snapshot["items"])
+
+
+generation_job = job_queue.get_job_queue().get(st.session_state.generation_job_id) if st.session_state.generation_job_id else None
+
+if st.button("✨ Generate Ad Content & Reports", type="primary", use_container_width=True, disabled=bool(generation_job and generation_job.active)):
     # Reset previous generation
     st.session_state.generated_excel_bytes = None
-    st.session_state.generated_transparency_doc_bytes = None
+    st.session_state.generated_document_inputs = None
+    st.session_state.generated_ad_table = None
+    st.session_state.generated_run_metrics = None
 
     # --- Input Validation ---
     valid_inputs = True
@@ -89,193 +215,77 @@ if st.button("✨ Generate Ad Content & Reports", type="primary", use_container_
     if not valid_inputs:
         st.stop()
 
-    st.session_state.company_name_for_file = utils.extract_company_name_from_url(client_url)
-    st.session_state.lead_objective_for_file = utils.sanitize_for_filename(lead_objective_input)
-
-    progress_bar = st.progress(0, text="Initializing...")
-
-    # --- 1. Context Extraction & Summarization (Individual) ---
-    website_text, website_summary = None, None
-    additional_text, additional_summary = None, None
-    lead_magnet_text, lead_magnet_summary = None, None
-    
-    extraction_progress_step = 5 # Progress per extraction/summarization pair
-
-    with st.spinner("Extracting and summarizing website content..."):
-        progress_bar.progress(extraction_progress_step * 0, text="Extracting website content...")
-        website_text = data_extraction.extract_text_from_url(client_url)
-        if website_text:
-            progress_bar.progress(extraction_progress_step * 1, text="Summarizing website content...")
-            website_summary = ai_processing.summarize_text(website_text, client)
-            st.success("Website content processed.")
-        else:
-            st.warning("Could not extract text from website URL.")
-    
-    if additional_context_file:
-        with st.spinner("Extracting and summarizing additional context file..."):
-            progress_bar.progress(extraction_progress_step * 2, text="Extracting additional context...")
-            additional_text = data_extraction.extract_text_from_file(additional_context_file)
-            if additional_text:
-                progress_bar.progress(extraction_progress_step * 3, text="Summarizing additional context...")
-                additional_summary = ai_processing.summarize_text(additional_text, client)
-                st.success("Additional context file processed.")
-            else:
-                st.warning("Could not extract text from additional context file.")
-
-    if lead_magnet_file:
-        with st.spinner("Extracting and summarizing lead magnet file..."):
-            progress_bar.progress(extraction_progress_step * 4, text="Extracting lead magnet content...")
-            lead_magnet_text = data_extraction.extract_text_from_file(lead_magnet_file)
-            if lead_magnet_text:
-                progress_bar.progress(extraction_progress_step * 5, text="Summarizing lead magnet content...")
-                lead_magnet_summary = ai_processing.summarize_text(lead_magnet_text, client)
-                st.success("Lead magnet file processed.")
-            else:
-                st.warning("Could not extract text from lead magnet file.")
-
-    if not (website_summary or additional_summary or lead_magnet_summary):
-        st.error("No context could be summarized. Please provide valid inputs.")
-        progress_bar.progress(100, text="Failed: No context.")
-        st.stop()
-
-    # --- Create Transparency Document ---
-    current_progress = extraction_progress_step * 6
-    progress_bar.progress(current_progress, text="Generating transparency document...")
-    with st.spinner("Generating transparency Word document..."):
-        st.session_state.generated_transparency_doc_bytes = document_processing.create_transparency_document(
-            client_url,
-            website_text, website_summary,
-            additional_text, additional_summary,
-            lead_magnet_text, lead_magnet_summary
-        )
-        st.info("Transparency document generated.")
-    
-    # --- Define Context Strings for AI Prompts ---
-    # General context (URL + Additional)
-    general_context_parts = []
-    if website_summary:
-        general_context_parts.append(f"Company Website Summary:\n{website_summary}")
-    if additional_summary:
-        general_context_parts.append(f"Additional Company Context Summary:\n{additional_summary}")
-    
-    context_for_general_ads = "\n\n---\n\n".join(general_context_parts) if general_context_parts else "No general company context available."
-
-    # Demand Gen context (URL + Additional + Lead Magnet)
-    demand_gen_context_parts = []
-    if website_summary:
-        demand_gen_context_parts.append(f"Company Website Summary:\n{website_summary}")
-    if additional_summary:
-        demand_gen_context_parts.append(f"Additional Company Context Summary:\n{additional_summary}")
-    if lead_magnet_summary:
-        demand_gen_context_parts.append(f"Lead Magnet Summary (Primary Focus for this Ad):\n{lead_magnet_summary}")
-    else: # If no lead magnet summary, DG ads might not be effective, but we can try with general context
-        demand_gen_context_parts.append("NOTE: Lead magnet summary is missing. Ad copy will be based on general company context.")
-
-    context_for_demand_gen_ads = "\n\n---\n\n".join(demand_gen_context_parts) if demand_gen_context_parts else "No context available for Demand Gen ads."
-
-
-    # --- 2. Generate Ad Content ---
-    all_ad_content_json = {}
-    # total_tasks for generation part (excluding context extraction and doc gen)
-    generation_tasks_total = 8 # Email, 3x LinkedIn, 3x Facebook, Google Search, Google Display
-    generation_tasks_completed = 0 # <<< Defined here
-    
-    # Base progress after context extraction and doc gen (e.g., 35%)
-    base_progress_for_generation = current_progress 
-    # Remaining progress for generation (e.g., 60%)
-    remaining_progress_total = 95 - base_progress_for_generation 
-
-
-    def update_generation_progress(task_name):
-        # nonlocal generation_tasks_completed # <<< REMOVE THIS LINE
-        global generation_tasks_completed # <<< USE THIS INSTEAD
-        generation_tasks_completed += 1
-        progress_value = base_progress_for_generation + int((generation_tasks_completed / generation_tasks_total) * remaining_progress_total)
-        progress_value = min(progress_value, 95) # Cap before final Excel step
-        progress_bar.progress(progress_value, text=f"Generating {task_name}...")
-
-    with st.spinner("Generating Email Content..."):
-        email_prompt = email_prompts.get_email_prompt(
-            context_for_general_ads, 
-            lead_objective_input, 
-            objective_specific_link or client_url, 
-            content_count_input
-        )
-        all_ad_content_json["Email"] = ai_processing.generate_json_content(client, email_prompt, "Email Ads")
-        update_generation_progress("Email Ads")
-
-    # LinkedIn Ads
-    linkedin_stages = {
-        "BA": ("Brand Awareness", learn_more_link or client_url, "Learn More", context_for_general_ads),
-        "DG": ("Demand Gen", lead_magnet_download_link or client_url, "Download", context_for_demand_gen_ads),
-        "DC": ("Demand Capture", objective_specific_link or client_url, "Register, Request Demo", context_for_general_ads)
-    }
-    for key, (stage_name, link, cta, stage_context) in linkedin_stages.items():
-        with st.spinner(f"Generating LinkedIn {stage_name} Ads..."):
-            if not link and (key == "DG" or key == "DC"): # Ensure critical links are present
-                st.warning(f"Skipping LinkedIn {stage_name} as required link is missing.")
-                update_generation_progress(f"LinkedIn {stage_name} Ads (Skipped)")
-                time.sleep(0.1)
-                continue
-            prompt = linkedin_prompts.get_linkedin_prompt(stage_context, stage_name, link, cta, content_count_input, lead_objective_input)
-            all_ad_content_json[f"LinkedIn_{key}"] = ai_processing.generate_json_content(client, prompt, f"LinkedIn {stage_name} Ads")
-            update_generation_progress(f"LinkedIn {stage_name} Ads")
-            time.sleep(0.5) 
-
-    # Facebook Ads
-    facebook_stages = {
-        "BA": ("Brand Awareness", learn_more_link or client_url, "Learn More", context_for_general_ads),
-        "DG": ("Demand Gen", lead_magnet_download_link or client_url, "Download", context_for_demand_gen_ads),
-        "DC": ("Demand Capture", objective_specific_link or client_url, "Book Now", context_for_general_ads)
+    file_info = {
+        "company_name_for_file": utils.extract_company_name_from_url(client_url),
+        "client_url_for_file": client_url,
+        "lead_objective_for_file": utils.sanitize_for_filename(lead_objective_input),
     }
-    for key, (stage_name, link, cta, stage_context) in facebook_stages.items():
-        with st.spinner(f"Generating Facebook {stage_name} Ads..."):
-            if not link and (key == "DG" or key == "DC"):
-                st.warning(f"Skipping Facebook {stage_name} as required link is missing.")
-                update_generation_progress(f"Facebook {stage_name} Ads (Skipped)")
-                time.sleep(0.1)
-                continue
-            prompt = facebook_prompts.get_facebook_prompt(stage_context, stage_name, link, cta, content_count_input, lead_objective_input)
-            all_ad_content_json[f"Facebook_{key}"] = ai_processing.generate_json_content(client, prompt, f"Facebook {stage_name} Ads")
-            update_generation_progress(f"Facebook {stage_name} Ads")
-            time.sleep(0.5)
-
-    with st.spinner("Generating Google Search Ad Components..."):
-        gsearch_prompt = google_search_prompts.get_google_search_prompt(context_for_general_ads)
-        all_ad_content_json["GoogleSearch"] = ai_processing.generate_json_content(client, gsearch_prompt, "Google Search Ads")
-        update_generation_progress("Google Search Ads")
-        time.sleep(0.5)
-
-    with st.spinner("Generating Google Display Ad Components..."):
-        gdisplay_prompt = google_display_prompts.get_google_display_prompt(context_for_general_ads)
-        all_ad_content_json["GoogleDisplay"] = ai_processing.generate_json_content(client, gdisplay_prompt, "Google Display Ads")
-        update_generation_progress("Google Display Ads")
-    
-    # --- 3. Create Excel Report ---
-    progress_bar.progress(95, text="Formatting Excel report...")
-    with st.spinner("Creating Excel report..."):
-        valid_ad_content = {k: v for k, v in all_ad_content_json.items() if v is not None}
-        if not valid_ad_content:
-            st.error("No ad content was successfully generated. Cannot create Excel report.")
-            progress_bar.progress(100, text="Failed: No ad content for Excel.")
-            st.stop()
-            
-        excel_bytes = excel_processing.create_excel_report(
-            valid_ad_content, 
-            st.session_state.company_name_for_file, 
-            lead_objective_input
-        )
-        st.session_state.generated_excel_bytes = excel_bytes
-    
-    progress_bar.progress(100, text="All reports generated!")
-    st.success("🎉 Ad content & transparency reports generated and ready for download!")
+
+    # --- 1 & 2. Context Extraction, Summarization & Ad Generation ---
+    # Website, additional context and lead magnet are extracted/summarized in parallel, and each
+    # channel's generation starts as soon as the summaries it depends on are ready. The run goes
+    # to the server-wide job queue, so this page can rerun or reload while it works.
+    campaign = pipeline.CampaignInputs(
+        client_url=client_url,
+        lead_objective=lead_objective_input,
+        content_count=content_count_input,
+        learn_more_link=learn_more_link,
+        lead_magnet_download_link=lead_magnet_download_link,
+        objective_specific_link=objective_specific_link,
+    )
+    generation_job = job_queue.get_job_queue().submit(
+        f"{file_info['company_name_for_file']} ads",
+        run_generation_job,
+        client,
+        campaign,
+        {"website": client_url, "additional": additional_context_file, "lead_magnet": lead_magnet_file},
+        not regenerate_fresh_input,
+        generation_mode_input,
+        st.session_state.stage_cache,
+        file_info,
+        serialize=lambda outputs: {"ad_content": outputs["ad_content"], "file_info": outputs["file_info"]},
+    )
+    st.session_state.generation_job_id = generation_job.job_id
+    st.query_params["job"] = generation_job.job_id # Lets a reloaded page find the job again
+
+if st.session_state.generation_job_id and generation_job is None:
+    st.warning("The last generation job is no longer available.")
+    st.session_state.generation_job_id = None
+    st.query_params.pop("job", None)
+elif generation_job and generation_job.active:
+    show_running_job(generation_job.job_id)
+elif generation_job:
+    if st.session_state.loaded_job_id != generation_job.job_id:
+        load_job_outputs(generation_job)
+        st.session_state.loaded_job_id = generation_job.job_id
+    if generation_job.status == "done" and st.session_state.generated_excel_bytes:
+        st.success("🎉 Ad content & transparency reports generated and ready for download!")
+        cache_stats = llm_cache.get_llm_cache().stats()
+        st.caption(f"AI response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses this session, {cache_stats['entries']} entries stored.")
+        scheduler_stats = request_scheduler.get_request_scheduler().stats()
+        if scheduler_stats["prompt_tokens"]:
+            st.caption(
+                f"Prompt-prefix cache: {scheduler_stats['cached_prompt_tokens']:,} of {scheduler_stats['prompt_tokens']:,} "
+                f"prompt tokens served from the provider cache ({scheduler_stats['prompt_cache_hit_rate']:.0%})."
+            )
+    elif generation_job.status == "failed":
+        st.error(f"Generation failed: {generation_job.error}")
+    elif generation_job.status == "interrupted":
+        st.error("Generation was interrupted by a server restart. Please generate again.")
+    if generation_job.notices:
+        with st.expander(f"Run notices ({len(generation_job.notices)})", expanded=not st.session_state.generated_excel_bytes):
+            show_notices(generation_job.notices)
 
 # --- Download Buttons ---
-if st.session_state.generated_transparency_doc_bytes:
+if st.session_state.generated_document_inputs:
     doc_file_name = f"{st.session_state.company_name_for_file}_context_transparency_report.docx"
     st.download_button(
         label="📄 Download Transparency Report (DOCX)",
-        data=st.session_state.generated_transparency_doc_bytes,
+        # Built only when clicked, with the metrics of the whole run. Streamlit calls this on a
+        # thread without the script context, so it must not read st.session_state itself.
+        data=lambda document_inputs=st.session_state.generated_document_inputs, metrics=st.session_state.generated_run_metrics: (
+            pipeline.build_transparency_document(document_inputs, metrics)
+        ),
         file_name=doc_file_name,
         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         use_container_width=True,
@@ -293,5 +303,57 @@ if st.session_state.generated_excel_bytes:
         key="download_xlsx"
     )
 
+if st.session_state.generated_ad_table is not None:
+    with st.expander("More export formats"):
+        file_prefix = f"{st.session_state.company_name_for_file}_{st.session_state.lead_objective_for_file}"
+        for format_id, (format_label, file_suffix, mime, _) in export_processing.EXPORT_FORMATS.items():
+            if format_id == "xlsx":
+                continue # Offered above
+            st.download_button(
+                label=f"Download {format_label}",
+                # Built only when clicked, on a thread without the script context: bind the session values now
+                data=lambda format_id=format_id, ad_table=st.session_state.generated_ad_table, company_name=st.session_state.company_name_for_file, client_url=st.session_state.client_url_for_file: (
+                    export_processing.export_ad_table(ad_table, format_id, company_name, client_url)
+                ),
+                file_name=f"{file_prefix}_{file_suffix}",
+                mime=mime,
+                use_container_width=True,
+                key=f"download_{format_id}"
+            )
+
+if st.session_state.generated_run_metrics is not None:
+    with st.expander("Run metrics"):
+        run_metrics_data = st.session_state.generated_run_metrics.to_dict()
+        run_totals = run_metrics_data["totals"]
+        st.caption(
+            f"{run_totals['llm_calls']} AI calls, {run_totals['prompt_tokens']:,} prompt tokens "
+            f"({run_totals['prompt_cache_hit_rate']:.0%} cached), {run_totals['completion_tokens']:,} completion tokens, "
+            f"estimated cost ${run_totals['cost_usd']:.4f}. "
+            + ", ".join(f"{cache.replace('_', ' ')} cache hit rate {rate:.0%}" for cache, rate in run_totals["cache_hit_rates"].items())
+        )
+        st.dataframe(
+            [{"stage": name, **stage} for name, stage in run_metrics_data["stages"].items()], use_container_width=True, hide_index=True
+        )
+        if run_metrics_data["calls"]:
+            st.dataframe(run_metrics_data["calls"], use_container_width=True, hide_index=True)
+        metrics_file_prefix = f"{st.session_state.company_name_for_file}_run_metrics"
+        json_column, prometheus_column = st.columns(2)
+        json_column.download_button(
+            label="Download metrics (JSON)",
+            data=st.session_state.generated_run_metrics.to_json(),
+            file_name=f"{metrics_file_prefix}.json",
+            mime="application/json",
+            use_container_width=True,
+            key="download_metrics_json"
+        )
+        prometheus_column.download_button(
+            label="Download metrics (Prometheus)",
+            data=st.session_state.generated_run_metrics.to_prometheus(),
+            file_name=f"{metrics_file_prefix}.prom",
+            mime="text/plain",
+            use_container_width=True,
+            key="download_metrics_prometheus"
+        )
+
 st.markdown("---")
 st.markdown("Made by M. Version 0.9")
\ No newline at end of file
@@ -157,7 +157,7 @@ if st.button("✨ Generate Ad Content", type="primary"):
 
     with st.spinner("Generating Email Content..."):
         email_prompt = email_prompts.get_email_prompt(combined_summary, lead_objective_input, objective_specific_link or client_url, content_count_input)
-        all_ad_content_json["Email"] = ai_processing.generate_json_content(client, email_prompt, "Email Ads")
+        all_ad_content_json["Email"] = ai_processing.generate_ad_sets(client, {"Email": ("Email Ads", email_prompt)}, content_count_input)["Email"]
         update_progress("Email Ads")
 
     # LinkedIn Ads
@@ -169,7 +169,7 @@ if st.button("✨ Generate Ad Content", type="primary"):
     for key, (stage_name, link, cta) in linkedin_stages.items():
         with st.spinner(f"Generating LinkedIn {stage_name} Ads..."):
             prompt = linkedin_prompts.get_linkedin_prompt(combined_summary, stage_name, link, cta, content_count_input, lead_objective_input)
-            all_ad_content_json[f"LinkedIn_{key}"] = ai_processing.generate_json_content(client, prompt, f"LinkedIn {stage_name} Ads")
+            all_ad_content_json[f"LinkedIn_{key}"] = ai_processing.generate_ad_sets(client, {f"LinkedIn_{key}": (f"LinkedIn {stage_name} Ads", prompt)}, content_count_input)[f"LinkedIn_{key}"]
             update_progress(f"LinkedIn {stage_name} Ads")
             time.sleep(0.5) # Small delay if API rate limits are a concern
 
@@ -182,19 +182,19 @@ if st.button("✨ Generate Ad Content", type="primary"):
     for key, (stage_name, link, cta) in facebook_stages.items():
         with st.spinner(f"Generating Facebook {stage_name} Ads..."):
             prompt = facebook_prompts.get_facebook_prompt(combined_summary, stage_name, link, cta, content_count_input, lead_objective_input)
-            all_ad_content_json[f"Facebook_{key}"] = ai_processing.generate_json_content(client, prompt, f"Facebook {stage_name} Ads")
+            all_ad_content_json[f"Facebook_{key}"] = ai_processing.generate_ad_sets(client, {f"Facebook_{key}": (f"Facebook {stage_name} Ads", prompt)}, content_count_input)[f"Facebook_{key}"]
             update_progress(f"Facebook {stage_name} Ads")
             time.sleep(0.5)
 
     with st.spinner("Generating Google Search Ad Components..."):
         gsearch_prompt = google_search_prompts.get_google_search_prompt(combined_summary)
-        all_ad_content_json["GoogleSearch"] = ai_processing.generate_json_content(client, gsearch_prompt, "Google Search Ads")
+        all_ad_content_json["GoogleSearch"] = ai_processing.generate_ad_sets(client, {"GoogleSearch": ("Google Search Ads", gsearch_prompt)}, content_count_input)["GoogleSearch"]
         update_progress("Google Search Ads")
         time.sleep(0.5)
 
     with st.spinner("Generating Google Display Ad Components..."):
         gdisplay_prompt = google_display_prompts.get_google_display_prompt(combined_summary)
-        all_ad_content_json["GoogleDisplay"] = ai_processing.generate_json_content(client, gdisplay_prompt, "Google Display Ads")
+        all_ad_content_json["GoogleDisplay"] = ai_processing.generate_ad_sets(client, {"GoogleDisplay": ("Google Display Ads", gdisplay_prompt)}, content_count_input)["GoogleDisplay"]
         update_progress("Google Display Ads")
 
     # --- 3. Create Excel Report ---
@@ -0,0 +1,213 @@
+"""
+Headless batch runner: generates ad content and reports for many clients without the Streamlit UI.
+
+Usage:
+    python batch.py clients.jsonl --output-dir out/ --workers 3
+    python batch.py clients.csv --output-dir out/ --regenerate-fresh
+    python batch.py clients.jsonl --formats xlsx,csv,google_ads_editor,linkedin_bulk,meta_bulk
+    python batch.py clients.jsonl --generation-mode per_channel   # fewer, larger requests per client
+    python batch.py clients.jsonl --batch-api --extract-workers 4   # overnight runs through the provider's Batch API
+
+Each JSONL object / CSV row accepts the following fields (only client_url is required):
+    client_url, lead_objective ("Demo Booking" or "Sales Meeting"), content_count,
+    learn_more_link, lead_magnet_download_link, objective_link,
+    additional_context_path (PDF/PPTX), lead_magnet_path (PDF)
+Relative file paths are resolved against the input file's directory.
+Each client's directory also gets run_metrics.json (stage timings, tokens, estimated cost, cache
+hit rates); the per-client totals are repeated in manifest.json.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules import utils, ai_processing, ad_constraints, ad_records, batch_jobs, export_processing, pipeline, run_metrics, stage_cache
+
+DEFAULT_LEAD_OBJECTIVE = "Demo Booking"
+DEFAULT_CONTENT_COUNT = 3
+DEFAULT_WORKERS = 2 # Clients processed at once; each client already runs its own calls in parallel
+DEFAULT_EXTRACT_WORKERS = 4 # Clients crawling or parsing files at once, across all workers
+DEFAULT_FORMATS = ("xlsx",)
+
+logger = logging.getLogger("batch")
+
+
+def read_client_rows(input_path: str) -> list[dict]:
+    """Reads client rows from a .jsonl or .csv file."""
+    with open(input_path, newline="", encoding="utf-8") as f:
+        if input_path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    # Treat empty CSV cells like missing keys
+    return [{key: value for key, value in row.items() if value not in (None, "")} for row in rows]
+
+
+def _resolve_path(path: str | None, base_dir: str) -> str | None:
+    if not path:
+        return None
+    return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+
+def process_client(client, row: dict, row_number: int, base_dir: str, output_dir: str, use_cache: bool, formats=DEFAULT_FORMATS, generation_mode: str = "per_stage", stages=None, extraction_slots=None) -> dict:
+    """Runs the full pipeline for one client row and writes its reports. Returns a manifest entry."""
+    started = time.perf_counter()
+    client_url = utils.validate_and_format_url(row.get("client_url", ""))
+    if not client_url:
+        return {"row": row_number, "status": "skipped", "error": "client_url is required"}
+
+    lead_objective = row.get("lead_objective", DEFAULT_LEAD_OBJECTIVE)
+    campaign = pipeline.CampaignInputs(
+        client_url=client_url,
+        lead_objective=lead_objective,
+        content_count=int(row.get("content_count", DEFAULT_CONTENT_COUNT)),
+        learn_more_link=utils.validate_and_format_url(row.get("learn_more_link")),
+        lead_magnet_download_link=utils.validate_and_format_url(row.get("lead_magnet_download_link")),
+        objective_specific_link=utils.validate_and_format_url(row.get("objective_link")),
+    )
+    company_name = utils.extract_company_name_from_url(client_url)
+    notices = []
+    add_notice = lambda level, message: notices.append(f"{level}: {message}")
+
+    with utils.capture_notices(add_notice): # Errors inside the modules, e.g. a failed ad set
+        result = pipeline.run_pipeline(
+            client,
+            campaign,
+            {
+                "website": client_url,
+                "additional": _resolve_path(row.get("additional_context_path"), base_dir),
+                "lead_magnet": _resolve_path(row.get("lead_magnet_path"), base_dir),
+            },
+            on_notice=add_notice,
+            use_cache=use_cache,
+            generation_mode=generation_mode,
+            stages=stages,
+            extraction_slots=extraction_slots,
+        )
+    entry = {"row": row_number, "client_url": client_url, "notices": notices}
+    valid_ad_content = {k: v for k, v in result.ad_content.items() if v is not None}
+    if not valid_ad_content:
+        entry.update(
+            status="failed", error="No ad content was generated", seconds=round(time.perf_counter() - started, 2),
+            metrics=result.metrics.totals(),
+        )
+        return entry
+
+    client_dir = os.path.join(output_dir, f"{row_number:04d}_{company_name}")
+    os.makedirs(client_dir, exist_ok=True)
+    ad_table = ad_records.ad_data_to_table(valid_ad_content)
+    entry["files"] = []
+    with run_metrics.activate(result.metrics):
+        for format_id in formats:
+            _, file_suffix, _, _ = export_processing.EXPORT_FORMATS[format_id]
+            export_path = os.path.join(client_dir, f"{company_name}_{utils.sanitize_for_filename(lead_objective)}_{file_suffix}")
+            with open(export_path, "wb") as f:
+                f.write(export_processing.export_ad_table(ad_table, format_id, company_name, client_url))
+            entry["files"].append(export_path)
+        result.metrics.finish() # Include the exports in the run's wall time
+        doc_bytes = pipeline.build_transparency_document(result.document_inputs, result.metrics)
+    if doc_bytes:
+        doc_path = os.path.join(client_dir, f"{company_name}_context_transparency_report.docx")
+        with open(doc_path, "wb") as f:
+            f.write(doc_bytes)
+        entry["files"].append(doc_path)
+    metrics_path = os.path.join(client_dir, "run_metrics.json")
+    with open(metrics_path, "w", encoding="utf-8") as f:
+        f.write(result.metrics.to_json())
+    entry["files"].append(metrics_path)
+
+    entry.update(
+        status="ok" if len(valid_ad_content) == len(result.ad_content) else "partial",
+        failed_sets=sorted(k for k, v in result.ad_content.items() if v is None),
+        constraint_violations=[ad_constraints.format_violation(violation) for violation in result.constraint_violations],
+        seconds=round(time.perf_counter() - started, 2),
+        metrics=result.metrics.totals(),
+    )
+    return entry
+
+
+def run_batch(input_path: str, output_dir: str, workers: int = DEFAULT_WORKERS, use_cache: bool = True, formats=DEFAULT_FORMATS, generation_mode: str = "per_stage", batch_api: bool = False, extract_workers: int = DEFAULT_EXTRACT_WORKERS) -> list[dict]:
+    """
+    Processes every client row on a bounded worker pool and writes manifest.json to output_dir.
+    With `batch_api`, every AI request goes through the provider's asynchronous Batch API
+    (see batch_jobs.BatchClient): all clients run at once so their requests share batches.
+    Either way at most `extract_workers` clients crawl or parse files at the same time.
+    """
+    client = ai_processing.create_openai_client()
+    if not client:
+        raise SystemExit("Could not initialize the OpenAI client. Set OPENAI_API_KEY or configure secrets.toml.")
+
+    rows = read_client_rows(input_path)
+    if batch_api:
+        client = batch_jobs.BatchClient(client)
+        workers = max(workers, len(rows)) # Workers mostly wait on batch results; extraction stays capped below
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info("Processing %d clients with %d workers, %d extracting at once", len(rows), workers, extract_workers)
+
+    manifest = []
+    stages = stage_cache.StageCache() # Rows sharing a context file summarize it once
+    extraction_slots = threading.Semaphore(extract_workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_client, client, row, row_number, base_dir, output_dir, use_cache, formats, generation_mode, stages, extraction_slots): row_number
+            for row_number, row in enumerate(rows, 1)
+        }
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+            except Exception as e: # One bad row must not abort the whole batch
+                entry = {"row": futures[future], "status": "failed", "error": str(e)}
+            logger.info("Row %s: %s", entry["row"], entry["status"])
+            manifest.append(entry)
+    if batch_api:
+        client.close()
+        logger.info("Submitted %d batch jobs", client.batches_submitted)
+
+    manifest.sort(key=lambda entry: entry["row"])
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate ad content and reports for many clients.")
+    parser.add_argument("input", help="JSONL or CSV file with one client per row")
+    parser.add_argument("--output-dir", default="batch_output", help="Directory for reports and manifest.json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Clients processed concurrently")
+    parser.add_argument("--regenerate-fresh", action="store_true", help="Ignore cached AI responses")
+    parser.add_argument(
+        "--formats", default=",".join(DEFAULT_FORMATS),
+        help=f"Comma-separated export formats: {', '.join(export_processing.EXPORT_FORMATS)}"
+    )
+    parser.add_argument(
+        "--generation-mode", default="per_stage", choices=list(pipeline.GENERATION_MODES),
+        help="per_stage: one request per channel/stage; per_channel / combined: fewer, larger requests"
+    )
+    parser.add_argument(
+        "--batch-api", action="store_true",
+        help="Send requests through the asynchronous Batch API (cheaper, higher limits, results within 24h)"
+    )
+    parser.add_argument(
+        "--extract-workers", type=int, default=DEFAULT_EXTRACT_WORKERS,
+        help="Clients crawling or parsing files at once (bounds --batch-api runs, which start every client)"
+    )
+    args = parser.parse_args(argv)
+    formats = [format_id.strip() for format_id in args.formats.split(",") if format_id.strip()]
+    unknown_formats = [format_id for format_id in formats if format_id not in export_processing.EXPORT_FORMATS]
+    if unknown_formats:
+        parser.error(f"Unknown export format(s): {', '.join(unknown_formats)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    manifest = run_batch(args.input, args.output_dir, args.workers, use_cache=not args.regenerate_fresh, formats=formats, generation_mode=args.generation_mode, batch_api=args.batch_api, extract_workers=args.extract_workers)
+    failed = [entry for entry in manifest if entry["status"] in ("failed", "skipped")]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Benchmark: per-stage vs per-channel vs combined generation requests.
+
+Runs the full pipeline once per generation mode (see pipeline.GENERATION_MODES) and compares
+wall time, number of generation requests, prompt/completion tokens and the share of ad sets
+that failed. By default the model is simulated (latency = request overhead + prefill + decode
+time, with long outputs occasionally truncated into invalid JSON); pass --live to measure
+against the real API with OPENAI_API_KEY.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_generation_modes
+    python -m benchmarks.bench_generation_modes --runs 5 --content-count 5
+    python -m benchmarks.bench_generation_modes --live --runs 2
+"""
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from pptx import Presentation
+
+from modules import ai_processing, pipeline, token_budget
+
+SIMULATED_REQUEST_OVERHEAD = 0.6 # Seconds before the first token, per request
+SIMULATED_PREFILL_SECONDS_PER_TOKEN = 0.00005
+SIMULATED_DECODE_TOKENS_PER_SECOND = 90
+SIMULATED_TRUNCATION_RATE_PER_1K_TOKENS = 0.01 # Chance a response derails, per 1k completion tokens
+
+
+class SimulatedClient:
+    """
+    Stand-in for the OpenAI client that answers the prompts in prompts/* with well-formed ad JSON,
+    sleeping for a simple latency model (`time_scale` shrinks every sleep) and recording usage.
+    """
+
+    def __init__(self, time_scale: float = 0.1, seed: int = 0):
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _text(self, chars: int) -> str:
+        words = "grow pipeline revenue faster with secure automated insights for modern teams".split()
+        text = ""
+        while len(text) < chars:
+            text += self.random.choice(words) + " "
+        return text[:chars].strip()
+
+    def _task_json(self, instructions: str) -> dict:
+        count_match = re.search(r"generate (\d+) variations", instructions)
+        count = int(count_match.group(1)) if count_match else 3
+        list_key_match = re.search(r'with a key "(\w+)"', instructions)
+        if not list_key_match: # Google: parallel headlines / descriptions lists
+            counts = [int(n) for n in re.findall(r"A list of (\d+)", instructions)] or [5, 5]
+            return {"headlines": [self._text(25) for _ in range(counts[0])], "descriptions": [self._text(80) for _ in range(counts[-1])]}
+        fields_match = re.search(r"following keys: ([^\n]+)", instructions)
+        fields = re.findall(r'"(\w+)"', fields_match.group(1)) if fields_match else ["headline"]
+        return {list_key_match.group(1): [
+            {field: self._text(int(token_budget.FIELD_MAX_CHARS.get(field, 60) * 0.6)) for field in fields}
+            for _ in range(count)
+        ]}
+
+    def simulate(self, **request):
+        """Returns (content, usage, seconds to first token, decode seconds) for a request, without sleeping."""
+        instructions = request["messages"][-1]["content"]
+        if not request.get("response_format"): # Summarization
+            content = self._text(1500)
+        else:
+            keys_match = re.search(r"top-level keys: ([^\n]+)", instructions)
+            if keys_match:
+                sections = re.split(r"=== Task (\w+):[^\n]*===", instructions)[1:]
+                content_json = {key: self._task_json(section) for key, section in zip(sections[::2], sections[1::2])}
+            else:
+                content_json = self._task_json(instructions)
+            content = json.dumps(content_json, ensure_ascii=False)
+
+        prompt_tokens = token_budget.count_message_tokens(request["messages"], request.get("model"))
+        completion_tokens = min(token_budget.count_tokens(content), request.get("max_tokens") or 10 ** 9)
+        with self.lock:
+            truncated = request.get("response_format") and self.random.random() < SIMULATED_TRUNCATION_RATE_PER_1K_TOKENS * completion_tokens / 1000
+        if truncated:
+            content = content[:len(content) // 2]
+        first_token_seconds = self.time_scale * (SIMULATED_REQUEST_OVERHEAD + prompt_tokens * SIMULATED_PREFILL_SECONDS_PER_TOKEN)
+        decode_seconds = self.time_scale * completion_tokens / SIMULATED_DECODE_TOKENS_PER_SECOND
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, prompt_tokens_details=None)
+        with self.lock:
+            self.calls.append({"json": bool(request.get("response_format")), "usage": usage})
+        return content, usage, first_token_seconds, decode_seconds
+
+    def create(self, **request):
+        content, usage, first_token_seconds, decode_seconds = self.simulate(**request)
+        time.sleep(first_token_seconds + decode_seconds)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+class UsageRecordingClient:
+    """Wraps a real client to record usage per call, like SimulatedClient does."""
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        response = self.client.chat.completions.create(**request)
+        with self.lock:
+            self.calls.append({"json": bool(request.get("response_format")), "usage": response.usage})
+        return response
+
+
+def make_context_deck(path: str):
+    """A small company deck used as the only context source, so runs need no network."""
+    prs = Presentation()
+    slides = [
+        ("Acme Analytics", "Revenue intelligence for B2B sales teams. Forecast accurately and find pipeline risk early."),
+        ("Who we serve", "VP Sales and RevOps leaders at 200-2000 employee SaaS companies."),
+        ("Why Acme", "Connects CRM, email and calls in minutes. SOC 2 Type II. 30% better forecast accuracy."),
+    ]
+    for title, body in slides:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = title
+        slide.placeholders[1].text = body
+    prs.save(path)
+
+
+def run(client_factory, modes, runs: int, content_count: int):
+    campaign = pipeline.CampaignInputs(
+        client_url="https://www.acme-analytics.example",
+        lead_objective="Demo Booking",
+        content_count=content_count,
+        learn_more_link="https://www.acme-analytics.example/product",
+        lead_magnet_download_link="https://www.acme-analytics.example/guide.pdf",
+        objective_specific_link="https://www.acme-analytics.example/demo",
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = os.path.join(tmp, "acme.pptx")
+        make_context_deck(deck_path)
+
+        print(f"{'mode':<12} {'seconds':>8} {'requests':>9} {'prompt tok':>11} {'output tok':>11} {'failed sets':>12}")
+        for mode in modes:
+            seconds, requests, prompt_tokens, completion_tokens, failed, total = 0.0, 0, 0, 0, 0, 0
+            for _ in range(runs):
+                client = client_factory()
+                started = time.perf_counter()
+                result = pipeline.run_pipeline(client, campaign, {"additional": deck_path}, use_cache=False, generation_mode=mode)
+                seconds += time.perf_counter() - started
+                generation_calls = [call for call in client.calls if call["json"]]
+                requests += len(generation_calls)
+                prompt_tokens += sum(call["usage"].prompt_tokens for call in generation_calls)
+                completion_tokens += sum(call["usage"].completion_tokens for call in generation_calls)
+                failed += sum(1 for value in result.ad_content.values() if value is None)
+                total += len(result.ad_content)
+            print(
+                f"{mode:<12} {seconds / runs:>8.2f} {requests / runs:>9.1f} {prompt_tokens / runs:>11.0f} "
+                f"{completion_tokens / runs:>11.0f} {failed / max(total, 1):>11.1%}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Pipeline runs per mode")
+    parser.add_argument("--content-count", type=int, default=3, help="Ad variations per channel/stage")
+    parser.add_argument("--modes", default=",".join(pipeline.GENERATION_MODES), help="Comma-separated generation modes")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="Multiplier for simulated latencies")
+    parser.add_argument("--live", action="store_true", help="Use the real OpenAI API instead of the simulated model")
+    args = parser.parse_args(argv)
+
+    if args.live:
+        real_client = ai_processing.create_openai_client()
+        if not real_client:
+            raise SystemExit("Set OPENAI_API_KEY to benchmark against the live API.")
+        client_factory = lambda: UsageRecordingClient(real_client)
+    else:
+        seeds = iter(range(10 ** 6))
+        client_factory = lambda: SimulatedClient(args.time_scale, seed=next(seeds))
+        print(f"(simulated model, latencies x{args.time_scale})")
+    run(client_factory, [mode.strip() for mode in args.modes.split(",") if mode.strip()], args.runs, args.content_count)
+
+
+if __name__ == "__main__":
+    main()
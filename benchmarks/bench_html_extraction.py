@@ -0,0 +1,108 @@
+"""
+Benchmark: HTML parse time and summarization input size per extraction backend.
+
+Compares the original path (BeautifulSoup html.parser, only script/style removed) against every
+installed backend in modules/html_extraction with boilerplate stripping.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_html_extraction                  # synthetic marketing pages
+    python -m benchmarks.bench_html_extraction page1.html ...   # your own saved pages
+"""
+import argparse
+import random
+import time
+
+from bs4 import BeautifulSoup
+
+from modules import html_extraction
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception: # tiktoken missing or no encoding files offline
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    """Exact tokens when tiktoken is available, otherwise the usual ~4 chars/token estimate."""
+    return len(_ENCODING.encode(text)) if _ENCODING else len(text) // 4
+
+
+def baseline_extract(html) -> str:
+    """The pre-benchmark extraction path, kept here for comparison."""
+    soup = BeautifulSoup(html, "html.parser")
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+    return soup.get_text(separator=" ", strip=True)
+
+
+def make_marketing_page(sections: int, seed: int = 0) -> str:
+    """A heavy synthetic marketing page: mega-menu, cookie banner, content sections, fat footer."""
+    rng = random.Random(seed)
+    words = "platform revenue teams pipeline automate insights customers growth secure cloud analytics workflow".split()
+
+    def sentence(n):
+        return " ".join(rng.choice(words) for _ in range(n)).capitalize() + "."
+
+    nav = "".join(f'<li class="menu-item"><a href="/solutions/{i}">{sentence(3)}</a></li>' for i in range(120))
+    content = "".join(
+        f'<section class="feature"><h2>{sentence(5)}</h2><p>{" ".join(sentence(14) for _ in range(4))}</p>'
+        f'<div class="share-buttons"><a href="/share/{i}">Share</a></div></section>'
+        for i in range(sections)
+    )
+    footer = "".join(f'<a href="/footer/{i}">{sentence(2)}</a>' for i in range(200))
+    return (
+        "<html><head><style>" + ".x{color:red}" * 2000 + "</style>"
+        "<script>window.__DATA__=" + str([sentence(8) for _ in range(300)]) + "</script></head><body>"
+        f'<header class="site-header"><nav class="navbar"><ul>{nav}</ul></nav></header>'
+        f'<div id="cookie-consent" class="cookie-banner"><p>{sentence(40)}</p><button>Accept all</button></div>'
+        f"<main><h1>{sentence(6)}</h1>{content}</main>"
+        f'<aside class="sidebar">{sentence(60)}</aside>'
+        f'<footer class="site-footer">{footer}<form class="newsletter"><input/>{sentence(10)}</form></footer>'
+        "</body></html>"
+    )
+
+
+def time_call(fn, html, repeat: int) -> tuple[float, str]:
+    best, text = float("inf"), ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = fn(html)
+        best = min(best, time.perf_counter() - started)
+    return best, text
+
+
+def run(pages: dict, repeat: int = 5):
+    print(f"{'page':<22} {'extractor':<26} {'ms':>9} {'chars':>9} {'tokens':>9} {'tokens vs base':>15}")
+    for page_name, html in pages.items():
+        base_seconds, base_text = time_call(baseline_extract, html, repeat)
+        base_tokens = count_tokens(base_text)
+        rows = [("baseline (html.parser)", base_seconds, base_text)]
+        for backend in html_extraction.BACKENDS:
+            seconds, text = time_call(lambda h, backend=backend: html_extraction.extract_main_text(h, backend=backend), html, repeat)
+            rows.append((f"{backend} + boilerplate", seconds, text))
+        for label, seconds, text in rows:
+            tokens = count_tokens(text)
+            print(f"{page_name:<22} {label:<26} {seconds * 1000:>9.1f} {len(text):>9} {tokens:>9} {tokens / max(base_tokens, 1):>14.0%}")
+    if _ENCODING is None:
+        print("\n(tiktoken not available: token counts are chars/4 estimates)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="Saved HTML pages to benchmark instead of synthetic ones")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args(argv)
+
+    if args.files:
+        pages = {}
+        for path in args.files:
+            with open(path, "rb") as f:
+                pages[path[-22:]] = f.read()
+    else:
+        pages = {f"synthetic-{sections}-sections": make_marketing_page(sections).encode("utf-8") for sections in (10, 50, 200)}
+    run(pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
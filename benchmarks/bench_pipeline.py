@@ -0,0 +1,212 @@
+"""
+Benchmark: the whole pipeline end to end, against local servers only.
+
+Each scenario (fixture size x stub profile) runs the real modules - crawling, PDF/PPTX
+extraction, summarization, generation, the Excel report and the transparency document - in a
+fresh subprocess, so peak RSS and caches belong to that run alone. The model is
+benchmarks.stub_openai_server (latency, 500s and 429s per PROFILES, streaming included) and the
+website is benchmarks.fixtures.serve_site; no API key or quota is used.
+
+Reported per scenario: median wall time, peak RSS of the run and of its PDF workers, the
+per-stage breakdown from run_metrics (seconds summed over each stage's spans, so stages that run
+in parallel can add up to more than the wall time), AI calls, retries and failed ad sets.
+Results are appended to benchmarks/results/history.jsonl and compared with the previous run of
+the same scenario, so regressions show up as a slower or fatter line. The history only compares
+runs on one machine, so it is git-ignored; pass --results to keep one elsewhere.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --sizes small,medium,large --profiles realistic,throttled --runs 3
+    python -m benchmarks.bench_pipeline --mode per_channel --no-save
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import fixtures, stub_openai_server
+
+SIZES = {
+    # Website pages served, slides in the additional-context deck, pages in the lead magnet PDF
+    "small": {"site_pages": 3, "slides": 5, "pdf_pages": 5},
+    "medium": {"site_pages": 8, "slides": 25, "pdf_pages": 40},
+    "large": {"site_pages": 15, "slides": 80, "pdf_pages": 250},
+}
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results", "history.jsonl")
+REGRESSION_THRESHOLD = 0.15 # Flag scenarios this much slower (or bigger) than their previous run
+STAGES = ("extraction", "summarization", "generation", "transparency_document", "excel_report")
+CHILD_RESULT_PREFIX = "BENCH_RESULT "
+
+
+def run_scenario(spec: dict) -> dict:
+    """Runs one pipeline in this process (the benchmark child) and returns its measurements."""
+    from modules import ad_records, ai_processing, excel_processing, pdf_extraction, pipeline, request_scheduler, run_metrics
+
+    client = ai_processing.create_openai_client("stub") # OPENAI_BASE_URL points at the stub server
+    campaign = pipeline.CampaignInputs(
+        client_url=spec["site_url"],
+        lead_objective="Demo Booking",
+        content_count=spec["content_count"],
+        learn_more_link=f"{spec['site_url']}/product/1",
+        lead_magnet_download_link=f"{spec['site_url']}/guide.pdf",
+        objective_specific_link=f"{spec['site_url']}/demo",
+    )
+    started = time.perf_counter()
+    result = pipeline.run_pipeline(
+        client, campaign, {"website": spec["site_url"], "additional": spec["pptx_path"], "lead_magnet": spec["pdf_path"]},
+        use_cache=False, generation_mode=spec["mode"], on_ad=(lambda *ad: None) if spec["stream"] else None,
+    )
+    valid_ad_content = {key: value for key, value in result.ad_content.items() if value is not None}
+    with run_metrics.activate(result.metrics):
+        if valid_ad_content:
+            excel_processing.create_excel_report_from_table(ad_records.ad_data_to_table(valid_ad_content), ad_records.channels_in(valid_ad_content))
+        pipeline.build_transparency_document(result.document_inputs, result.metrics) # What a download does
+    wall_seconds = time.perf_counter() - started
+
+    pdf_extraction.get_pdf_process_pool().shutdown(wait=True) # Reaped workers count towards RUSAGE_CHILDREN
+    totals = result.metrics.totals()
+    scheduler_stats = request_scheduler.get_request_scheduler().stats()
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1), # ru_maxrss is in KiB on Linux
+        "workers_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "stages": {name: stage["seconds"] for name, stage in result.metrics.stage_totals().items()},
+        "llm_calls": totals["llm_calls"],
+        "prompt_tokens": totals["prompt_tokens"],
+        "cached_tokens": totals["cached_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        "retries": scheduler_stats["retries"],
+        "throttled": scheduler_stats["throttled"],
+        "failed_sets": sum(1 for value in result.ad_content.values() if value is None),
+        "ad_sets": len(result.ad_content),
+    }
+
+
+def _run_child(spec: dict, env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_pipeline", "--child", json.dumps(spec)],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith(CHILD_RESULT_PREFIX):
+            return json.loads(line[len(CHILD_RESULT_PREFIX):])
+    raise RuntimeError(f"Benchmark run failed (exit {completed.returncode}):\n{completed.stderr[-2000:]}")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: str) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_runs(scenario: str, runs: list[dict]) -> dict:
+    """One history record: medians over the runs for timings, maxima for memory."""
+    stage_names = dict.fromkeys(name for run in runs for name in run["stages"])
+    return {
+        "scenario": scenario,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "runs": len(runs),
+        "wall_seconds": round(statistics.median(run["wall_seconds"] for run in runs), 3),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "workers_peak_rss_mb": max(run["workers_peak_rss_mb"] for run in runs),
+        "stages": {name: round(statistics.median(run["stages"].get(name, 0.0) for run in runs), 3) for name in stage_names},
+        **{key: round(statistics.mean(run[key] for run in runs), 1) for key in (
+            "llm_calls", "prompt_tokens", "cached_tokens", "completion_tokens", "retries", "throttled", "failed_sets", "ad_sets"
+        )},
+    }
+
+
+def compare(record: dict, previous: dict | None) -> str:
+    """Change in wall time and peak RSS since the previous record of the same scenario."""
+    if not previous:
+        return "(first run)"
+    notes = []
+    for key, name in (("wall_seconds", "wall"), ("peak_rss_mb", "RSS")):
+        change = (record[key] - previous[key]) / previous[key] if previous[key] else 0.0
+        notes.append(f"{name} {change:+.0%}" + (" REGRESSION" if change > REGRESSION_THRESHOLD else ""))
+    return f"vs {previous.get('commit') or previous['timestamp']}: " + ", ".join(notes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="small,medium", help=f"Comma-separated fixture sizes: {', '.join(SIZES)}")
+    parser.add_argument("--profiles", default="realistic", help=f"Comma-separated stub profiles: {', '.join(stub_openai_server.PROFILES)}")
+    parser.add_argument("--mode", default="per_stage", help="Generation mode (see pipeline.GENERATION_MODES)")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per scenario (medians are reported)")
+    parser.add_argument("--content-count", type=int, default=3, help="Ad variations per channel/stage")
+    parser.add_argument("--no-stream", action="store_true", help="Non-streamed generation calls")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSONL history file results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="Print results without storing them")
+    parser.add_argument("--child", help=argparse.SUPPRESS) # Internal: run one scenario and print its result
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(CHILD_RESULT_PREFIX + json.dumps(run_scenario(json.loads(args.child))))
+        return
+
+    history = load_history(args.results)
+    records = []
+    print(f"{'scenario':<32} {'wall s':>7} {'RSS MB':>7} {'wkr MB':>7} " + " ".join(f"{name[:8]:>8}" for name in STAGES) + f" {'calls':>6} {'retries':>7} {'failed':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [size.strip() for size in args.sizes.split(",") if size.strip()]:
+            fixture = SIZES[size]
+            pdf_path, pptx_path = os.path.join(tmp, f"{size}.pdf"), os.path.join(tmp, f"{size}.pptx")
+            fixtures.make_pdf(pdf_path, fixture["pdf_pages"])
+            fixtures.make_pptx(pptx_path, fixture["slides"])
+            site = fixtures.serve_site(fixture["site_pages"])
+            try:
+                for profile in [profile.strip() for profile in args.profiles.split(",") if profile.strip()]:
+                    scenario = f"{size}/{profile}/{args.mode}" + ("" if not args.no_stream else "/no-stream")
+                    runs = []
+                    for run in range(args.runs):
+                        stub = stub_openai_server.serve(0, profile=profile, seed=run) # Fresh server: no prefix cache carried over
+                        run_dir = os.path.join(tmp, f"{size}-{profile}-{run}")
+                        env = dict(
+                            os.environ,
+                            OPENAI_API_KEY="stub",
+                            OPENAI_BASE_URL=f"http://127.0.0.1:{stub.server_address[1]}/v1",
+                            LLM_CACHE_PATH=os.path.join(run_dir, "llm.sqlite3"), # Keep stub answers out of the real caches
+                            HTTP_CACHE_DIR=os.path.join(run_dir, "http"),
+                        )
+                        try:
+                            runs.append(_run_child({
+                                "site_url": site.base_url, "pdf_path": pdf_path, "pptx_path": pptx_path,
+                                "mode": args.mode, "stream": not args.no_stream, "content_count": args.content_count,
+                            }, env))
+                        finally:
+                            stub.shutdown()
+                    record = summarize_runs(scenario, runs)
+                    records.append(record)
+                    previous = next((entry for entry in reversed(history) if entry["scenario"] == scenario), None)
+                    print(
+                        f"{scenario:<32} {record['wall_seconds']:>7.2f} {record['peak_rss_mb']:>7.0f} {record['workers_peak_rss_mb']:>7.0f} "
+                        + " ".join(f"{record['stages'].get(name, 0.0):>8.2f}" for name in STAGES)
+                        + f" {record['llm_calls']:>6.0f} {record['retries']:>7.0f} {record['failed_sets']:>6.0f}  {compare(record, previous)}"
+                    )
+            finally:
+                site.shutdown()
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+        with open(args.results, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        print(f"Appended {len(records)} results to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
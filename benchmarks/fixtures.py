@@ -0,0 +1,139 @@
+"""
+Generated benchmark fixtures: a local company website, and PDF / PPTX files of any size.
+
+Everything is built from a fixed seed, so two runs of a benchmark see the same inputs.
+"""
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pptx import Presentation
+
+WORDS = (
+    "revenue pipeline forecast accuracy sales teams insight automation secure platform customers "
+    "growth analytics integration dashboard workflow onboarding pricing enterprise support data "
+    "quarterly accounts deals risk signals coaching managers reps adoption trusted compliance"
+).split()
+SITE_SECTIONS = ("product", "solutions", "customers", "pricing", "about", "blog", "security", "integrations")
+
+
+def make_text(words: int, seed: int) -> str:
+    """Pseudo-prose of `words` words, split into sentences."""
+    rng = random.Random(seed)
+    sentences, sentence = [], []
+    for _ in range(words):
+        sentence.append(rng.choice(WORDS))
+        if len(sentence) >= rng.randint(8, 16):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf_bytes(pages: int, words_per_page: int = 350, seed: int = 0) -> bytes:
+    """A text PDF (Helvetica, one content stream per page) written by hand; no PDF library needed."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        words = make_text(words_per_page, seed * 100_003 + page).split()
+        lines = [f"Page {page + 1}"] + [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream = "BT /F1 9 Tf 40 800 Td " + " ".join(f"({_pdf_escape(line)}) Tj 0 -12 Td" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents {len(objects)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {pages} >>"
+
+    output, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += b"".join(f"{offset:010d} 00000 n \n".encode("latin-1") for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+    return bytes(output)
+
+
+def make_pdf(path: str, pages: int, words_per_page: int = 350, seed: int = 0):
+    with open(path, "wb") as f:
+        f.write(make_pdf_bytes(pages, words_per_page, seed))
+
+
+def make_pptx(path: str, slides: int, words_per_slide: int = 80, seed: int = 0):
+    """A deck with a title and one body placeholder of text per slide."""
+    prs = Presentation()
+    for slide_number in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {slide_number + 1}: {random.Random(seed + slide_number).choice(WORDS).capitalize()}"
+        slide.placeholders[1].text = make_text(words_per_slide, seed * 100_003 + slide_number)
+    prs.save(path)
+
+
+def make_site_pages(pages: int, words_per_page: int = 400, seed: int = 0) -> dict:
+    """{path: HTML} for a small company site with nav/footer boilerplate, internal links, robots.txt and a sitemap."""
+    paths = ["/"] + [f"/{SITE_SECTIONS[i % len(SITE_SECTIONS)]}/{i // len(SITE_SECTIONS) + 1}" for i in range(pages - 1)]
+    nav = "<nav>" + " ".join(f'<a href="{path}">{path.strip("/") or "home"}</a>' for path in paths[:6]) + "</nav>"
+    footer = "<footer>&copy; Acme Analytics. <a href='/privacy'>Privacy</a> <a href='/terms'>Terms</a></footer>"
+    site = {}
+    for index, path in enumerate(paths):
+        paragraphs = make_text(words_per_page, seed * 100_003 + index)
+        paragraph_html = "".join(f"<p>{sentence.rstrip('.')}.</p>" for sentence in paragraphs.split(". ") if sentence)
+        links = "".join(f'<a href="{paths[(index + step) % len(paths)]}">Read more</a>' for step in (1, 2))
+        site[path] = (
+            f"<html><head><title>Acme Analytics {path}</title></head><body>{nav}"
+            f"<main><h1>Acme Analytics {path}</h1>{paragraph_html}{links}</main>{footer}</body></html>"
+        )
+    site["/robots.txt"] = "User-agent: *\nDisallow: /private\nSitemap: {base_url}/sitemap.xml\n"
+    site["/sitemap.xml"] = (
+        '<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + "".join(f"<url><loc>{{base_url}}{path}</loc></url>" for path in paths)
+        + "</urlset>"
+    )
+    return site
+
+
+def serve_site(pages: int, port: int = 0, latency: float = 0.0, words_per_page: int = 400) -> ThreadingHTTPServer:
+    """
+    Serves make_site_pages on a background thread, with ETags (so the crawler's HTTP cache can
+    revalidate) and an optional per-request `latency`. The site is at server.base_url.
+    """
+    site = make_site_pages(pages, words_per_page)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            template = site.get(self.path)
+            if template is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if latency:
+                time.sleep(latency)
+            body = template.replace("{base_url}", server.base_url).encode("utf-8")
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            content_type = "text/xml" if self.path.endswith(".xml") else "text/plain" if self.path.endswith(".txt") else "text/html"
+            self.send_response(200)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Keep benchmark output quiet
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
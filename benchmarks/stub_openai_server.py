@@ -0,0 +1,291 @@
+"""
+Local stub of the OpenAI endpoints this project uses, for testing without an API key or cost.
+
+Serves /v1/chat/completions (streaming and not), /v1/files and /v1/batches. Completions come from
+benchmarks.bench_generation_modes.SimulatedClient, so ad prompts get well-formed ad JSON.
+Batches finish `--batch-seconds` after they are created.
+
+A profile (see PROFILES) sets the simulated latency and how often chat completions fail with a
+500 or get throttled with a 429 + retry-after-ms, either at random or whenever more than
+`max_concurrency` requests are in flight. Repeated system prompts of 1024+ tokens are reported
+as cached prompt tokens, like the provider's prefix cache.
+
+Usage (from the repository root):
+    python -m benchmarks.stub_openai_server --port 8765 --batch-seconds 2 --profile flaky
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8765/v1 BATCH_POLL_SECONDS=1 \\
+        python batch.py clients.jsonl --batch-api
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_generation_modes import SimulatedClient
+from modules import token_budget
+
+PROFILES = {
+    # time_scale: SimulatedClient latency multiplier; error_rate / throttle_rate: share of chat
+    # completions answered with a 500 / 429; max_concurrency: in-flight requests before 429s
+    "instant": {"time_scale": 0.0, "error_rate": 0.0, "throttle_rate": 0.0, "max_concurrency": None, "retry_after": 0.2},
+    "realistic": {"time_scale": 0.2, "error_rate": 0.0, "throttle_rate": 0.0, "max_concurrency": None, "retry_after": 0.5},
+    "flaky": {"time_scale": 0.2, "error_rate": 0.1, "throttle_rate": 0.0, "max_concurrency": None, "retry_after": 0.5},
+    "throttled": {"time_scale": 0.2, "error_rate": 0.0, "throttle_rate": 0.05, "max_concurrency": 4, "retry_after": 0.5},
+}
+STREAM_DELTA_CHARS = 24 # Content per streamed chunk
+PREFIX_CACHE_MIN_TOKENS = 1024 # Provider caches prompt prefixes from this length, in 128-token steps
+PREFIX_CACHE_STEP_TOKENS = 128
+
+
+class StubState:
+    def __init__(self, batch_seconds: float, time_scale: float | None = None, profile: str = "instant", seed: int = 0):
+        self.batch_seconds = batch_seconds
+        self.profile = dict(PROFILES[profile])
+        if time_scale is not None:
+            self.profile["time_scale"] = time_scale
+        self.model = SimulatedClient(time_scale=self.profile["time_scale"], seed=seed)
+        self.random = random.Random(seed)
+        self.files = {} # file id -> {"meta": dict, "content": bytes}
+        self.batches = {} # batch id -> batch dict
+        self.seen_prefixes = set() # Hashes of system prompts already served (prefix cache)
+        self.in_flight = 0
+        self.counts = {"completions": 0, "errors": 0, "throttled": 0, "streams": 0}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def admit(self) -> int | None:
+        """Applies the profile to an incoming chat completion: None to serve it, or the error status to answer with."""
+        with self.lock:
+            self.counts["completions"] += 1
+            max_concurrency = self.profile["max_concurrency"]
+            over_limit = max_concurrency is not None and self.in_flight >= max_concurrency
+            if over_limit or self.profile["throttle_rate"] and self.random.random() < self.profile["throttle_rate"]:
+                self.counts["throttled"] += 1
+                return 429
+            if self.profile["error_rate"] and self.random.random() < self.profile["error_rate"]:
+                self.counts["errors"] += 1
+                return 500
+            self.in_flight += 1
+            return None
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def cached_tokens(self, messages: list, model: str | None) -> int:
+        """Prompt tokens a provider prefix cache would serve: the system prompt, once seen before."""
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = messages[0].get("content") or ""
+        with self.lock:
+            seen = prefix in self.seen_prefixes
+            self.seen_prefixes.add(prefix)
+        tokens = token_budget.count_tokens(prefix, model)
+        if not seen or tokens < PREFIX_CACHE_MIN_TOKENS:
+            return 0
+        return tokens - tokens % PREFIX_CACHE_STEP_TOKENS
+
+    def new_id(self, prefix: str) -> str:
+        with self.lock:
+            return f"{prefix}-{next(self.ids)}"
+
+    def _usage(self, body: dict, usage) -> dict:
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.prompt_tokens + usage.completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": self.cached_tokens(body["messages"], body.get("model"))},
+        }
+
+    def complete(self, body: dict, sleep: bool = True) -> dict:
+        content, usage, first_token_seconds, decode_seconds = self.model.simulate(**body)
+        if sleep:
+            time.sleep(first_token_seconds + decode_seconds)
+        return {
+            "id": self.new_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": self._usage(body, usage),
+        }
+
+    def stream(self, body: dict):
+        """Yields chat.completion.chunk dicts, paced like the simulated model decodes."""
+        content, usage, first_token_seconds, decode_seconds = self.model.simulate(**body)
+        chunk_id, created, model = self.new_id("chatcmpl"), int(time.time()), body.get("model", "stub")
+
+        def chunk(delta: dict, finish_reason=None, usage=None) -> dict:
+            choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else []
+            return {"id": chunk_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices, "usage": usage}
+
+        with self.lock:
+            self.counts["streams"] += 1
+        time.sleep(first_token_seconds)
+        yield chunk({"role": "assistant", "content": ""})
+        pieces = [content[i:i + STREAM_DELTA_CHARS] for i in range(0, len(content), STREAM_DELTA_CHARS)]
+        for piece in pieces:
+            time.sleep(decode_seconds / max(len(pieces), 1))
+            yield chunk({"content": piece})
+        yield chunk({}, finish_reason="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk(None, usage=self._usage(body, usage))
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        meta = {
+            "id": self.new_id("file"), "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+        self.files[meta["id"]] = {"meta": meta, "content": content}
+        return meta
+
+    def run_batch(self, batch: dict):
+        """Answers every line of the input file, then marks the batch completed after batch_seconds."""
+        started = time.monotonic()
+        batch["status"] = "in_progress"
+        output_lines = []
+        for line in self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            output_lines.append(json.dumps({
+                "id": self.new_id("batch_req"),
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": self.new_id("req"), "body": self.complete(request["body"], sleep=False)},
+                "error": None,
+            }))
+        output = self.add_file(f"{batch['id']}_output.jsonl", "batch_output", ("\n".join(output_lines) + "\n").encode("utf-8"))
+        time.sleep(max(0.0, self.batch_seconds - (time.monotonic() - started)))
+        batch.update(
+            status="completed", output_file_id=output["id"], completed_at=int(time.time()),
+            request_counts={"total": len(output_lines), "completed": len(output_lines), "failed": 0},
+        )
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, payload: dict, status: int = 200, headers: dict | None = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, chunks):
+            """Server-sent events, ended by closing the connection (HTTP/1.0 style)."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_POST(self):
+            if self.path == "/v1/chat/completions":
+                body = json.loads(self._body())
+                status = state.admit()
+                if status == 429:
+                    return self._send_json(
+                        {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}}, 429,
+                        {"retry-after-ms": str(int(state.profile["retry_after"] * 1000))},
+                    )
+                if status:
+                    return self._send_json({"error": {"message": "Internal server error (stub)", "type": "server_error"}}, status)
+                try:
+                    if body.get("stream"):
+                        return self._send_stream(state.stream(body))
+                    return self._send_json(state.complete(body))
+                finally:
+                    state.release()
+            if self.path == "/v1/files":
+                message = BytesParser(policy=default_policy).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + self._body()
+                )
+                fields, filename, content = {}, "upload", b""
+                for part in message.iter_parts():
+                    name = part.get_param("name", header="content-disposition")
+                    if part.get_filename():
+                        filename, content = part.get_filename(), part.get_payload(decode=True)
+                    else:
+                        fields[name] = part.get_content().strip()
+                return self._send_json(state.add_file(filename, fields.get("purpose", "batch"), content))
+            if self.path == "/v1/batches":
+                body = json.loads(self._body())
+                if body.get("input_file_id") not in state.files:
+                    return self._send_json({"error": {"message": "input file not found"}}, 404)
+                batch = {
+                    "id": state.new_id("batch"), "object": "batch", "endpoint": body["endpoint"],
+                    "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+                    "status": "validating", "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+                }
+                state.batches[batch["id"]] = batch
+                threading.Thread(target=state.run_batch, args=(batch,), daemon=True).start()
+                return self._send_json(batch)
+            self._send_json({"error": {"message": f"Unknown endpoint {self.path}"}}, 404)
+
+        def do_GET(self):
+            batch_match = re.fullmatch(r"/v1/batches/([\w-]+)", self.path)
+            if batch_match and batch_match.group(1) in state.batches:
+                return self._send_json(state.batches[batch_match.group(1)])
+            content_match = re.fullmatch(r"/v1/files/([\w-]+)/content", self.path)
+            if content_match and content_match.group(1) in state.files:
+                content = state.files[content_match.group(1)]["content"]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                return self.wfile.write(content)
+            self._send_json({"error": {"message": f"Not found: {self.path}"}}, 404)
+
+        def log_message(self, format, *args):
+            pass # Keep test output quiet
+
+    return Handler
+
+
+def serve(port: int = 8765, batch_seconds: float = 2.0, time_scale: float | None = None, profile: str = "instant", seed: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts the stub on a background thread and returns the server (call .shutdown() to stop).
+    `port=0` picks a free port (see server.server_address); server.state holds the StubState.
+    `time_scale`, if given, overrides the profile's latency multiplier.
+    """
+    state = StubState(batch_seconds, time_scale, profile, seed)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-seconds", type=float, default=2.0, help="Time from batch creation to completion")
+    parser.add_argument("--profile", default="instant", choices=list(PROFILES), help="Latency, error and throttling profile")
+    parser.add_argument("--time-scale", type=float, default=None, help="Override the profile's simulated latency multiplier")
+    args = parser.parse_args(argv)
+    server = serve(args.port, args.batch_seconds, args.time_scale, args.profile)
+    print(f"Stub OpenAI server on http://127.0.0.1:{args.port}/v1, profile '{args.profile}' (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
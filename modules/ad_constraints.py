@@ -0,0 +1,125 @@
+# modules/ad_constraints.py
+import os
+from dataclasses import dataclass
+
+from modules import ad_records, ad_schemas, token_budget
+
+EMAIL_OPENING = "Hi [First Name],"
+# Slack for limits the prompts only give approximately ("~27 characters", "300-400 characters")
+APPROXIMATE_TOLERANCE = float(os.environ.get("CONSTRAINT_APPROXIMATE_TOLERANCE", 0.15))
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    max_chars: int | None = None
+    max_words: int | None = None
+    approximate: bool = False # The prompt asks for "about" this much: allow APPROXIMATE_TOLERANCE over it
+
+
+# channel -> field -> rule, from the limits stated in prompts/*. Google lists are checked per
+# item against the hard limits in token_budget.GOOGLE_LIST_COUNTS. The email prompt sets no
+# length limits; emails are only checked for their opening (EMAIL_OPENING).
+FIELD_RULES = {
+    "LinkedIn": {
+        "introductory_text": FieldRule(max_chars=400, approximate=True),
+        "image_copy": FieldRule(max_words=10, approximate=True),
+        "headline": FieldRule(max_chars=70, approximate=True),
+    },
+    "Facebook": {
+        "primary_text": FieldRule(max_chars=400, approximate=True),
+        "image_copy": FieldRule(max_words=10, approximate=True),
+        "headline": FieldRule(max_chars=27, approximate=True),
+        "link_description": FieldRule(max_chars=27, approximate=True),
+    },
+}
+
+
+@dataclass(frozen=True)
+class Violation:
+    result_key: str
+    list_key: str
+    index: int | None # Item position in the list; None for a wrong item count
+    field: str | None # Ad field; None for Google list items and counts
+    message: str
+
+
+def _limit(value: int, rule: FieldRule) -> int:
+    return int(value * (1 + APPROXIMATE_TOLERANCE)) if rule.approximate else value
+
+
+def _check_text(text: str, rule: FieldRule) -> str | None:
+    text = text.strip()
+    if rule.max_chars is not None and len(text) > _limit(rule.max_chars, rule):
+        return f"{len(text)} characters; the limit is {_limit(rule.max_chars, rule)}"
+    if rule.max_words is not None and len(text.split()) > _limit(rule.max_words, rule):
+        return f"{len(text.split())} words; the limit is {_limit(rule.max_words, rule)}"
+    return None
+
+
+def check_item(result_key: str, list_key: str, item, destination_url: str | None = None) -> list[tuple]:
+    """(field, problem) for every rule one ad (or Google asset string) breaks."""
+    if result_key in token_budget.GOOGLE_LIST_COUNTS:
+        _, max_chars = token_budget.GOOGLE_LIST_COUNTS[result_key][list_key]
+        problem = _check_text(item, FieldRule(max_chars=max_chars))
+        return [(None, problem)] if problem else []
+    channel = ad_records.AD_SET_SPECS[result_key][0]
+    problems = []
+    for field, rule in FIELD_RULES.get(channel, {}).items():
+        problem = _check_text(item.get(field, ""), rule)
+        if problem:
+            problems.append((field, problem))
+    if destination_url and "destination_url" in item and item["destination_url"].strip() != destination_url:
+        problems.append(("destination_url", f"must be exactly {destination_url}"))
+    if channel == "Email" and not item.get("body", "").strip().startswith(EMAIL_OPENING):
+        problems.append(("body", f'must start with "{EMAIL_OPENING}"'))
+    return problems
+
+
+def check_ad_set(result_key: str, ad_set: dict, content_count: int, destination_url: str | None = None) -> list[Violation]:
+    """Every item and count violation of one ad set."""
+    violations = []
+    for list_key, count in ad_schemas.expected_list_counts(result_key, content_count).items():
+        items = ad_set.get(list_key) or []
+        if len(items) != count:
+            violations.append(Violation(result_key, list_key, None, None, f"has {len(items)} of the {count} required items"))
+        for index, item in enumerate(items):
+            violations.extend(
+                Violation(result_key, list_key, index, field, problem)
+                for field, problem in check_item(result_key, list_key, item, destination_url)
+            )
+    return violations
+
+
+def check_ad_content(ad_content: dict, content_count: int, destination_urls: dict | None = None) -> list[Violation]:
+    """Violations of every generated ad set; `destination_urls` maps result key -> the exact URL its ads must use."""
+    destination_urls = destination_urls or {}
+    violations = []
+    for result_key, ad_set in ad_content.items():
+        if ad_set:
+            violations.extend(check_ad_set(result_key, ad_set, content_count, destination_urls.get(result_key)))
+    return violations
+
+
+def fix_destination_urls(ad_content: dict, destination_urls: dict) -> int:
+    """Sets every wrong destination_url to the required one in place; nothing to ask the model. Returns the number fixed."""
+    fixed = 0
+    for result_key, url in destination_urls.items():
+        ad_set = ad_content.get(result_key)
+        if not ad_set or not url:
+            continue
+        for items in ad_set.values():
+            for item in items:
+                if isinstance(item, dict) and "destination_url" in item and item["destination_url"].strip() != url:
+                    item["destination_url"] = url
+                    fixed += 1
+    return fixed
+
+
+def format_violation(violation: Violation) -> str:
+    _, _, list_key, _ = ad_records.AD_SET_SPECS[violation.result_key]
+    where = violation.result_key
+    if violation.index is not None:
+        where += f" #{violation.index + 1}" if list_key else f" {violation.list_key} #{violation.index + 1}"
+    if violation.field:
+        where += f" {violation.field}"
+    return f"{where}: {violation.message}"
@@ -0,0 +1,54 @@
+# modules/ad_dedupe.py
+import os
+import random
+import re
+import zlib
+
+SHINGLE_WORDS = 3 # Word n-grams compared between ads
+MINHASH_PERMUTATIONS = 64 # Signature length; similarity estimates are within ~0.06 of the true Jaccard
+# Estimated Jaccard similarity of two ads' shingles from which the later one is dropped
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", 0.5))
+IGNORED_FIELDS = ("destination_url", "cta_button", "cta") # Shared by every ad of a set by design
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601) # Fixed: signatures must be comparable across calls
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def item_text(item) -> str:
+    """The copy of one ad (headline, body, ...) or a Google asset string."""
+    if isinstance(item, dict):
+        return " ".join(str(value) for field, value in item.items() if field not in IGNORED_FIELDS)
+    return str(item)
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set[int]:
+    """Hashed word n-grams of the lowercased text (the whole text if it is shorter than `size` words)."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set: set[int]) -> tuple[int, ...]:
+    return tuple(min((a * shingle + b) % _PRIME for shingle in shingle_set) for a, b in _PERMUTATIONS)
+
+
+def similarity(signature_a: tuple, signature_b: tuple) -> float:
+    """Estimated Jaccard similarity: the share of permutations whose minimum agrees."""
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def remove_near_duplicates(items: list, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> tuple[list, int]:
+    """
+    Keeps the first of every group of near-identical ads (MinHash over word shingles of their
+    copy), preserving order. Returns (kept items, number dropped).
+    """
+    kept, kept_signatures = [], []
+    for item in items:
+        signature = minhash(shingles(item_text(item)))
+        if any(similarity(signature, other) >= threshold for other in kept_signatures):
+            continue
+        kept.append(item)
+        kept_signatures.append(signature)
+    return kept, len(items) - len(kept)
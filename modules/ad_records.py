@@ -0,0 +1,77 @@
+# modules/ad_records.py
+import pandas as pd
+
+EMAIL_FIELDS = ("headline", "subject_line", "body", "cta")
+LINKEDIN_FIELDS = ("introductory_text", "image_copy", "headline", "destination_url", "cta_button")
+FACEBOOK_FIELDS = ("primary_text", "image_copy", "headline", "link_description", "destination_url", "cta_button")
+GOOGLE_FIELDS = ("headline", "description")
+
+# ad_data key -> (channel, funnel stage, list key inside the AI JSON, ad fields)
+# Google entries have no list key: their JSON holds parallel "headlines"/"descriptions" lists.
+AD_SET_SPECS = {
+    "Email": ("Email", "Demand Capture", "emails", EMAIL_FIELDS),
+    "LinkedIn_BA": ("LinkedIn", "Brand Awareness", "linkedin_brand_awareness_ads", LINKEDIN_FIELDS),
+    "LinkedIn_DG": ("LinkedIn", "Demand Gen", "linkedin_demand_gen_ads", LINKEDIN_FIELDS),
+    "LinkedIn_DC": ("LinkedIn", "Demand Capture", "linkedin_demand_capture_ads", LINKEDIN_FIELDS),
+    "Facebook_BA": ("Facebook", "Brand Awareness", "facebook_brand_awareness_ads", FACEBOOK_FIELDS),
+    "Facebook_DG": ("Facebook", "Demand Gen", "facebook_demand_gen_ads", FACEBOOK_FIELDS),
+    "Facebook_DC": ("Facebook", "Demand Capture", "facebook_demand_capture_ads", FACEBOOK_FIELDS),
+    "GoogleSearch": ("Google Search", None, None, GOOGLE_FIELDS),
+    "GoogleDisplay": ("Google Display", None, None, GOOGLE_FIELDS),
+}
+
+KEY_COLUMNS = ["ad_name", "channel", "funnel_stage", "version"]
+FIELD_COLUMNS = list(dict.fromkeys(field for *_, fields in AD_SET_SPECS.values() for field in fields)) # Ordered union
+RECORD_COLUMNS = KEY_COLUMNS + FIELD_COLUMNS
+
+
+def make_ad_name(channel: str, funnel_stage: str | None, version: int) -> str:
+    """Ad names as they appear in the reports, e.g. "LinkedIn_BrandAwareness_Ver. 2"."""
+    if channel == "Email":
+        return f"Email_{funnel_stage}_Ver. {version}"
+    if funnel_stage is None:
+        return f"{channel.replace(' ', '')}_Ver. {version}"
+    return f"{channel}_{funnel_stage.replace(' ', '')}_Ver. {version}"
+
+
+def iter_ad_records(ad_data: dict):
+    """Yields one flat dict (all RECORD_COLUMNS) per generated ad, in report order."""
+    for data_key, (channel, funnel_stage, list_key, fields) in AD_SET_SPECS.items():
+        ad_set = ad_data.get(data_key)
+        if not ad_set:
+            continue
+        if list_key is None: # Google: pair headlines and descriptions by position
+            headlines = ad_set.get("headlines", [])
+            descriptions = ad_set.get("descriptions", [])
+            ads = [
+                {"headline": headlines[i] if i < len(headlines) else "", "description": descriptions[i] if i < len(descriptions) else ""}
+                for i in range(max(len(headlines), len(descriptions)))
+            ]
+        else:
+            ads = ad_set.get(list_key, [])
+
+        for i, ad in enumerate(ads):
+            record = dict.fromkeys(RECORD_COLUMNS)
+            record.update(
+                ad_name=make_ad_name(channel, funnel_stage, i + 1),
+                channel=channel,
+                funnel_stage=funnel_stage,
+                version=i + 1,
+            )
+            for field in fields:
+                record[field] = ad.get(field)
+            yield record
+
+
+def ad_data_to_table(ad_data: dict) -> pd.DataFrame:
+    """
+    Normalizes the nested AI output (ad_data["LinkedIn_BA"]["linkedin_brand_awareness_ads"], ...)
+    into one flat table with a row per ad: channel, funnel stage, version and every field column.
+    Fields a channel does not use are None. All exports are derived from this table.
+    """
+    return pd.DataFrame(list(iter_ad_records(ad_data)), columns=RECORD_COLUMNS, dtype=object)
+
+
+def channels_in(ad_data: dict) -> set:
+    """Channels with at least one successfully generated ad set (which may still hold zero ads)."""
+    return {AD_SET_SPECS[key][0] for key, ad_set in ad_data.items() if key in AD_SET_SPECS and ad_set}
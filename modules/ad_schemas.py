@@ -0,0 +1,102 @@
+# modules/ad_schemas.py
+from modules import ad_records, token_budget
+
+# Fields the prompts allow to be empty (e.g. no CTA button for Brand Awareness)
+OPTIONAL_FIELDS = ("cta_button",)
+
+
+def expected_list_counts(result_key: str, content_count: int) -> dict:
+    """{list_key: number of items} a complete response for `result_key` contains."""
+    if result_key in token_budget.GOOGLE_LIST_COUNTS:
+        return {list_key: items for list_key, (items, _) in token_budget.GOOGLE_LIST_COUNTS[result_key].items()}
+    _, _, list_key, _ = ad_records.AD_SET_SPECS[result_key]
+    return {list_key: content_count}
+
+
+def _item_schema(result_key: str) -> dict:
+    if result_key in token_budget.GOOGLE_LIST_COUNTS:
+        return {"type": "string"}
+    _, _, _, fields = ad_records.AD_SET_SPECS[result_key]
+    return {
+        "type": "object",
+        "properties": {field: {"type": "string"} for field in fields},
+        "required": list(fields),
+        "additionalProperties": False,
+    }
+
+
+def ad_set_schema(result_key: str, list_counts: dict) -> dict:
+    """JSON Schema (strict-mode compatible) for one ad set with exactly `list_counts` items per list."""
+    item_schema = _item_schema(result_key)
+    return {
+        "type": "object",
+        "properties": {
+            list_key: {"type": "array", "items": item_schema, "minItems": count, "maxItems": count}
+            for list_key, count in list_counts.items()
+        },
+        "required": list(list_counts),
+        "additionalProperties": False,
+    }
+
+
+def json_schema_format(schema: dict, name: str = "ad_sets") -> dict:
+    """response_format for strict structured output with `schema`."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def response_format(result_keys, content_count: int) -> dict:
+    """
+    Structured-output response_format for a request covering `result_keys`: the ad set itself
+    for one key, or an object nesting each ad set under its result key (combined requests).
+    """
+    result_keys = list(result_keys)
+    if len(result_keys) == 1:
+        schema = ad_set_schema(result_keys[0], expected_list_counts(result_keys[0], content_count))
+    else:
+        schema = {
+            "type": "object",
+            "properties": {key: ad_set_schema(key, expected_list_counts(key, content_count)) for key in result_keys},
+            "required": result_keys,
+            "additionalProperties": False,
+        }
+    return json_schema_format(schema)
+
+
+def _is_valid_item(result_key: str, item) -> bool:
+    if result_key in token_budget.GOOGLE_LIST_COUNTS:
+        return isinstance(item, str) and bool(item.strip())
+    _, _, _, fields = ad_records.AD_SET_SPECS[result_key]
+    return isinstance(item, dict) and all(
+        isinstance(item.get(field), str) and (item[field].strip() or field in OPTIONAL_FIELDS)
+        for field in fields
+    )
+
+
+def validate_ad_set(result_key: str, ad_set, list_counts: dict) -> tuple[dict, dict]:
+    """
+    Checks an ad set against the {list_key: item count} it should have (see expected_list_counts).
+    Returns (ad set with only its valid items, {list_key: number of items still missing}).
+    Malformed items are dropped and extra items are cut, so the result always matches the schema
+    apart from missing items.
+    """
+    if not isinstance(ad_set, dict):
+        ad_set = {}
+    valid_set, missing = {}, {}
+    for list_key, count in list_counts.items():
+        items = ad_set.get(list_key)
+        valid_items = [item for item in items if _is_valid_item(result_key, item)][:count] if isinstance(items, list) else []
+        valid_set[list_key] = valid_items
+        if len(valid_items) < count:
+            missing[list_key] = count - len(valid_items)
+    return valid_set, missing
+
+
+def fixup_response_format(item_keys: dict) -> dict:
+    """response_format for a fix-up request: one rewritten item per id in `item_keys` (id -> result key)."""
+    schema = {
+        "type": "object",
+        "properties": {item_id: _item_schema(result_key) for item_id, result_key in item_keys.items()},
+        "required": list(item_keys),
+        "additionalProperties": False,
+    }
+    return json_schema_format(schema, name="ad_fixes")
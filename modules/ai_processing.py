@@ -1,6 +1,19 @@
 import streamlit as st
+import openai
 from openai import OpenAI
+import itertools
 import json
+import logging
+import math
+import os
+import time
+import zlib
+from concurrent.futures import as_completed
+from types import SimpleNamespace
+from modules import ad_constraints, ad_dedupe, ad_records, ad_schemas, json_stream, llm_cache, request_scheduler, run_metrics, token_budget, utils
+from prompts import prompt_assembly
+
+logger = logging.getLogger(__name__)
 
 
 # For this example, we'll use "gpt-4o-mini" as a placeholder for "gpt-4.1-mini"
@@ -11,84 +24,560 @@ import json
 # The user specified "gpt-4.1-mini", so we'll assume it's a valid model string.
 AI_MODEL = "gpt-4.1-mini" # Or "gpt-4o-mini" if "gpt-4.1-mini" is not the API identifier
 SUMMARIZER_MODEL = "gpt-4.1-mini" # Can be a cheaper model if needed, but let's stick to user's model
+GENERATION_MAX_WORKERS = 8 # One worker per channel/stage request in a full run
+SUMMARY_CHUNK_TOKENS = token_budget.SUMMARY_INPUT_TOKENS # Largest input sent in one summarization call
+SUMMARY_MAX_WORKERS = 6 # Parallel chunk summaries for long documents
+SECTION_SEPARATORS = ("\f", "\n\n", "\n", ". ", " ") # Preferred split points, coarsest first
+# Strict json_schema structured outputs; set OPENAI_STRUCTURED_OUTPUTS=0 for models/providers without them
+STRUCTURED_OUTPUTS = os.environ.get("OPENAI_STRUCTURED_OUTPUTS", "1") != "0"
+REPAIR_ATTEMPTS = 1 # Follow-up requests for items missing from an ad set
+# Larger variation counts are split into parallel requests of at most this many ads each
+GENERATION_SHARD_SIZE = int(os.environ.get("GENERATION_SHARD_SIZE", 4))
+TOP_UP_ATTEMPTS = 2 # Follow-up requests for slots left empty after merging shards and removing duplicates
+FIXUP_ATTEMPTS = 1 # Batched requests rewriting the ads that break platform limits (see ad_constraints)
+
+def create_openai_client(api_key: str | None = None):
+    """
+    Initializes an OpenAI client outside of Streamlit caching (e.g. for the batch runner).
+    Falls back to the OPENAI_API_KEY environment variable, then to secrets.toml.
+    """
+    try:
+        api_key = api_key or os.environ.get("OPENAI_API_KEY") or st.secrets["OPENAI_API_KEY"]
+        return OpenAI(api_key=api_key, max_retries=0) # Retries are owned by request_scheduler
+    except Exception as e:
+        utils.notify("error", f"Failed to initialize OpenAI client: {e}")
+        return None
 
 @st.cache_resource
 def get_openai_client():
     """Initializes and returns the OpenAI client."""
     try:
-        client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+        client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"], max_retries=0) # Retries are owned by request_scheduler
         return client
     except Exception as e:
-        st.error(f"Failed to initialize OpenAI client: {e}")
+        utils.notify("error", f"Failed to initialize OpenAI client: {e}")
         return None
 
-@st.cache_data(show_spinner=False)
-def summarize_text(_text_to_summarize: str, _client, max_chars: int = 2500) -> str | None:
-    """Summarizes text using OpenAI API."""
-    if not _text_to_summarize:
-        return None
-    if not _client:
-        st.error("OpenAI client not available for summarization.")
-        return None
+def _create_chat_completion(client, use_cache: bool = True, parse=None, stream_handler_factory=None, label: str = "chat completion", **request):
+    """
+    Runs a chat completion and returns the message content (passed through `parse` if given),
+    going through the persistent LLM response cache. Only responses that parse are cached.
+    `use_cache=False` skips the lookup ("regenerate fresh") but still stores the new response
+    so the next normal run reuses it.
 
-    try:
-        prompt = f"""
+    With `stream_handler_factory`, the completion is streamed: each attempt calls the factory for
+    a fresh `on_delta(text)` callback that receives the content as it arrives. A cache hit is
+    delivered as a single delta.
+
+    Token counts (measured prompt, max_tokens, and the usage the API reports) are logged per call
+    under `label`, and recorded with latency and estimated cost on the current run_metrics run.
+    """
+    parse = parse or (lambda content: content)
+    metrics = run_metrics.current()
+    started = time.perf_counter()
+    cache = llm_cache.get_llm_cache()
+    cache_key = llm_cache.make_cache_key(**request)
+    prompt_tokens = token_budget.count_message_tokens(request["messages"], request.get("model"))
+    if use_cache:
+        cached_content = cache.get(cache_key)
+        if cached_content is not None:
+            logger.info("%s: cache hit (prompt %d tokens)", label, prompt_tokens)
+            if metrics:
+                metrics.record_call(label, request.get("model"), 0, 0, 0, time.perf_counter() - started, cache_hit=True)
+            if stream_handler_factory:
+                stream_handler_factory()(cached_content)
+            return parse(cached_content)
+
+    def complete_once():
+        response = client.chat.completions.create(**request)
+        return SimpleNamespace(content=response.choices[0].message.content, usage=getattr(response, "usage", None))
+
+    def stream_once():
+        on_delta = stream_handler_factory()
+        parts, usage = [], None
+        stream = client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage # Sent on the final chunk
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        return SimpleNamespace(content="".join(parts), usage=usage)
+
+    if getattr(client, "handles_rate_limits", False): # e.g. batch_jobs.BatchClient, which queues instead of calling
+        response = stream_once() if stream_handler_factory else complete_once()
+    else:
+        # Retries with backoff, rate limits and adaptive concurrency are handled by the shared scheduler
+        response = request_scheduler.get_request_scheduler().run(
+            stream_once if stream_handler_factory else complete_once,
+            estimated_tokens=prompt_tokens + (request.get("max_tokens") or request_scheduler.DEFAULT_OUTPUT_TOKENS),
+        )
+    usage = response.usage
+    logger.info(
+        "%s: prompt %d tokens (measured), max_tokens %s, usage prompt=%s cached=%s completion=%s",
+        label, prompt_tokens, request.get("max_tokens"),
+        getattr(usage, "prompt_tokens", None), request_scheduler.get_cached_tokens(usage), getattr(usage, "completion_tokens", None),
+    )
+    if metrics:
+        metrics.record_call(
+            label, request.get("model"),
+            getattr(usage, "prompt_tokens", None) or prompt_tokens, # Measured count if the API sent no usage
+            getattr(usage, "completion_tokens", None) or 0,
+            request_scheduler.get_cached_tokens(usage) or 0,
+            time.perf_counter() - started, cache_hit=False,
+            price_factor=getattr(client, "price_factor", 1.0),
+        )
+    content = response.content
+    parsed = parse(content) # Raises before anything is cached if the response is unusable
+    if content:
+        cache.set(cache_key, content)
+    return parsed
+
+def _count_summary_tokens(text: str) -> int:
+    return token_budget.count_tokens(text, SUMMARIZER_MODEL)
+
+def split_text_into_chunks(text: str, max_chunk_tokens: int = SUMMARY_CHUNK_TOKENS, separators=SECTION_SEPARATORS) -> list[str]:
+    """
+    Splits text into chunks of at most `max_chunk_tokens` summarizer tokens, cutting on the coarsest
+    boundary that works (pages, then paragraphs, lines, sentences, words) and packing neighbouring
+    pieces together. Measured in tokens, so dense text (numbers, URLs, non-English copy) still fits.
+    """
+    text_tokens = _count_summary_tokens(text)
+    if text_tokens <= max_chunk_tokens or len(text) <= 1:
+        return [text]
+    if not separators: # No boundary left: hard cut at the text's own characters-per-token rate
+        size = max(1, int(len(text) * max_chunk_tokens / text_tokens * 0.9))
+        return [chunk for i in range(0, len(text), size) for chunk in split_text_into_chunks(text[i:i + size], max_chunk_tokens, ())]
+
+    separator, finer_separators = separators[0], separators[1:]
+    separator_tokens = _count_summary_tokens(separator)
+    chunks, current, current_tokens = [], "", 0
+    for piece in text.split(separator):
+        for part in split_text_into_chunks(piece, max_chunk_tokens, finer_separators):
+            part_tokens = _count_summary_tokens(part)
+            if current and current_tokens + separator_tokens + part_tokens <= max_chunk_tokens:
+                current, current_tokens = f"{current}{separator}{part}", current_tokens + separator_tokens + part_tokens
+            else:
+                if current:
+                    chunks.append(current)
+                current, current_tokens = part, part_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _truncate_summary_input(text: str) -> str:
+    """Backstop for callers that did not chunk: chunks from split_text_into_chunks always fit."""
+    truncated = token_budget.truncate_to_tokens(text, token_budget.SUMMARY_INPUT_TOKENS, SUMMARIZER_MODEL)
+    if len(truncated) < len(text):
+        logger.warning("Summary input cut to %d tokens: %d of %d characters dropped", token_budget.SUMMARY_INPUT_TOKENS, len(text) - len(truncated), len(text))
+    return truncated
+
+def _summarize_once(text: str, client, max_chars: int, use_cache: bool, part_note: str = "") -> str:
+    """Single summarization call. `part_note` tells the model it only sees part of a document."""
+    prompt = f"""
         Please summarize the following text, focusing on aspects relevant for marketing and advertising copy. 
         Identify the company's unique selling propositions, target audience (if discernible), products/services, 
         and overall brand voice/tone. The summary should be a maximum of {max_chars} characters.
-        Ensure the summary is dense with information useful for creating ad copy.
+        Ensure the summary is dense with information useful for creating ad copy.{part_note}
 
         Text to summarize:
         ---
-        {_text_to_summarize[:30000]} 
+        {_truncate_summary_input(text)} 
         ---
         Concise Summary (max {max_chars} chars):
         """
-        # Truncate input text to avoid overly long prompts for summarization
-        
-        response = _client.chat.completions.create(
-            model=SUMMARIZER_MODEL,
-            messages=[
-                {"role": "system", "content": "You are an expert marketing analyst skilled at extracting key information for ad copywriting."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=int(max_chars / 3), # Estimate tokens based on chars
-            temperature=0.3,
-        )
-        summary = response.choices[0].message.content.strip()
-        return summary[:max_chars] # Enforce max_chars strictly
+    summary = _create_chat_completion(
+        client,
+        use_cache=use_cache,
+        label="summary",
+        model=SUMMARIZER_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert marketing analyst skilled at extracting key information for ad copywriting."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=token_budget.max_tokens_for_chars(max_chars),
+        temperature=0.3,
+    )
+    return summary.strip()[:max_chars] # Enforce max_chars strictly
+
+def pack_sections(pieces, max_chunk_tokens: int = SUMMARY_CHUNK_TOKENS):
+    """
+    Packs streamed text pieces (e.g. one per page) into summarization sections of at most
+    `max_chunk_tokens`, yielding each section as soon as it is full. Oversized pieces are split
+    like split_text_into_chunks does.
+    """
+    separator_tokens = _count_summary_tokens("\f")
+    current, current_tokens = "", 0
+    for piece in pieces:
+        for part in split_text_into_chunks(piece, max_chunk_tokens, SECTION_SEPARATORS[1:]):
+            part_tokens = _count_summary_tokens(part)
+            if current and current_tokens + separator_tokens + part_tokens <= max_chunk_tokens:
+                current, current_tokens = f"{current}\f{part}", current_tokens + separator_tokens + part_tokens
+            else:
+                if current:
+                    yield current
+                current, current_tokens = part, part_tokens
+    if current:
+        yield current
+
+def _summarize_sections(sections, client, max_chars: int, use_cache: bool) -> str | None:
+    """
+    Summarizes a stream of sections. A single section is summarized directly; otherwise each
+    section is summarized in parallel as soon as it arrives (map), while later sections are
+    still being produced, and the partial summaries are merged (reduce).
+    """
+    sections = iter(sections)
+    first_section = next(sections, None)
+    if first_section is None:
+        return None
+    second_section = next(sections, None)
+    if second_section is None:
+        return _summarize_once(first_section, client, max_chars, use_cache) # Fast path: one call
+
+    with utils.make_thread_pool(SUMMARY_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(
+                _summarize_once, section, client, max_chars, use_cache,
+                f"\n        This is part {i} of a longer document; summarize only this part."
+            )
+            for i, section in enumerate(itertools.chain((first_section, second_section), sections), 1)
+        ]
+        partial_summaries = []
+        for future in futures: # Keep document order
+            try:
+                partial_summaries.append(future.result())
+            except Exception as e: # A lost chunk degrades the summary but should not sink it
+                utils.notify("warning", f"Could not summarize part of the document: {e}")
+    if not partial_summaries:
+        raise RuntimeError("Every part of the document failed to summarize.")
+
+    merged = "\n\n".join(f"Part {i} summary:\n{summary}" for i, summary in enumerate(partial_summaries, 1))
+    if _count_summary_tokens(merged) > SUMMARY_CHUNK_TOKENS: # Very long documents: reduce in more than one round
+        return _summarize_sections(split_text_into_chunks(merged), client, max_chars, use_cache)
+    return _summarize_once(
+        merged, client, max_chars, use_cache,
+        "\n        The text consists of summaries of consecutive parts of one document; merge them into a single summary."
+    )
+
+def summarize_text(_text_to_summarize: str, _client, max_chars: int = 2500, use_cache: bool = True) -> str | None:
+    """
+    Summarizes text using OpenAI API. Responses are cached on disk (see llm_cache).
+    Texts longer than SUMMARY_CHUNK_TOKENS are summarized map-reduce style instead of being truncated.
+    """
+    if not _text_to_summarize:
+        return None
+    if not _client:
+        utils.notify("error", "OpenAI client not available for summarization.")
+        return None
+
+    try:
+        return _summarize_sections(split_text_into_chunks(_text_to_summarize), _client, max_chars, use_cache)
     except Exception as e:
-        st.error(f"Error during summarization: {e}")
+        utils.notify("error", f"Error during summarization: {e}")
         return None
 
-def generate_json_content(client, prompt_text: str, content_description: str) -> dict | list | None:
+def summarize_stream(text_pieces, client, max_chars: int = 2500, use_cache: bool = True) -> str | None:
     """
-    Generates content from OpenAI as JSON.
-    `content_description` is for error messages, e.g., "Email Ads".
+    Summarizes text that is still being extracted (an iterable of pieces, e.g. one per page).
+    Sections are sent for summarization while extraction continues, so the full text is never
+    held in memory. Short documents still take the single-call fast path.
     """
     if not client:
-        st.error(f"OpenAI client not available for generating {content_description}.")
+        utils.notify("error", "OpenAI client not available for summarization.")
         return None
     try:
-        response = client.chat.completions.create(
+        return _summarize_sections(pack_sections(text_pieces), client, max_chars, use_cache)
+    except Exception as e:
+        utils.notify("error", f"Error during summarization: {e}")
+        return None
+
+def _list_item_stream_handler_factory(on_item):
+    """
+    Builds per-attempt stream handlers that parse the JSON incrementally and call
+    `on_item(list_key, item)` for every newly finished list item. If the scheduler retries a
+    stream, items already reported are not reported again.
+    """
+    reported_counts = {}
+
+    def new_handler():
+        parser = json_stream.IncrementalListItemParser()
+        attempt_counts = {}
+
+        def on_delta(text):
+            for list_key, item in parser.feed(text):
+                attempt_counts[list_key] = attempt_counts.get(list_key, 0) + 1
+                if attempt_counts[list_key] > reported_counts.get(list_key, 0):
+                    reported_counts[list_key] = attempt_counts[list_key]
+                    on_item(list_key, item)
+        return on_delta
+
+    return new_handler
+
+def _generation_messages(prompt_text: str, context: str | None) -> list[dict]:
+    if context is not None:
+        return prompt_assembly.build_generation_messages(context, prompt_text)
+    return [
+        {"role": "system", "content": prompt_assembly.GENERATION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt_text}
+    ]
+
+_structured_outputs_enabled = STRUCTURED_OUTPUTS # Switched off for the process if the API rejects json_schema
+
+def _request_ad_json(client, prompt_text: str, label: str, schema_format: dict, use_cache: bool, on_item=None, max_tokens: int | None = None, context: str | None = None):
+    """
+    One generation request with strict structured output (JSON mode if unsupported). An
+    unparseable response (e.g. cut off at max_tokens) is not an error: every list item that was
+    complete is salvaged as {list_key: [items]} so only the rest needs repairing.
+    """
+    global _structured_outputs_enabled
+    structured = _structured_outputs_enabled
+    try:
+        return _create_chat_completion(
+            client,
+            use_cache=use_cache,
+            parse=json.loads,
+            stream_handler_factory=_list_item_stream_handler_factory(on_item) if on_item else None,
+            label=label,
             model=AI_MODEL,
-            messages=[
-                {"role": "system", "content": "You are an expert marketing copywriter. Generate content in the specified JSON format."},
-                {"role": "user", "content": prompt_text}
-            ],
-            response_format={"type": "json_object"}, # Request JSON mode
+            messages=_generation_messages(prompt_text, context),
+            response_format=schema_format if structured else {"type": "json_object"},
             temperature=0.7, # Creative but not too random
-            # max_tokens can be adjusted based on expected output size
+            **({"max_tokens": max_tokens} if max_tokens else {}),
         )
-        content_json_str = response.choices[0].message.content
-        
-        # The response content is a JSON string, parse it
-        parsed_json = json.loads(content_json_str)
-        return parsed_json
+    except openai.BadRequestError as e:
+        if not structured or "response_format" not in str(e) and "json_schema" not in str(e):
+            raise
+        logger.warning("Structured outputs rejected (%s); falling back to JSON mode", e)
+        _structured_outputs_enabled = False
+        return _request_ad_json(client, prompt_text, label, schema_format, use_cache, on_item, max_tokens, context)
     except json.JSONDecodeError as e:
-        st.error(f"Error decoding JSON from AI for {content_description}: {e}")
-        st.error(f"Received string: {content_json_str}")
-        return None
+        salvaged = {}
+        for list_key, item in json_stream.IncrementalListItemParser().feed(e.doc):
+            salvaged.setdefault(list_key, []).append(item)
+        logger.warning("%s: unparseable response (%s); salvaged %d complete items", label, e, sum(map(len, salvaged.values())))
+        return salvaged
+
+def _repair_ad_set(client, result_key: str, task: tuple, ad_set: dict, missing: dict, use_cache: bool, context: str | None) -> dict:
+    """Re-requests only the `missing` {list_key: count} items of an ad set; returns the valid new items per list key."""
+    description, instructions = task
+    existing_items = {list_key: items for list_key, items in ad_set.items() if items}
+    parsed = _request_ad_json(
+        client,
+        prompt_assembly.build_repair_instructions(instructions, existing_items, missing),
+        f"{description} (repair)",
+        ad_schemas.json_schema_format(ad_schemas.ad_set_schema(result_key, missing)),
+        use_cache,
+        max_tokens=token_budget.estimate_output_tokens(result_key, max(missing.values())),
+        context=context,
+    )
+    repaired, _ = ad_schemas.validate_ad_set(result_key, parsed, missing)
+    return repaired
+
+def generate_ad_sets(client, tasks: dict, content_count: int, use_cache: bool = True, on_item=None, max_tokens: int | None = None, context: str | None = None) -> dict:
+    """
+    Generates the ad sets for one request and returns {result_key: ad set or None}.
+
+    `tasks` maps result key -> (content description, channel instructions built with
+    context_summary=None). Several tasks go out as one combined request (see
+    prompt_assembly.build_combined_instructions) and are split back by result key.
+    Responses use strict structured output (ad_schemas); every ad set is then validated for
+    item shape and count, and only the missing or malformed items are re-requested
+    (REPAIR_ATTEMPTS), never the whole set.
+    `on_item(result_key, list_key, item)` streams single-task requests; items from combined
+    requests and repairs are reported once they are complete.
+    """
+    with run_metrics.span("generation", keys=list(tasks)):
+        return _generate_ad_sets(client, tasks, content_count, use_cache, on_item, max_tokens, context)
+
+def _generate_ad_sets(client, tasks: dict, content_count: int, use_cache: bool, on_item, max_tokens: int | None, context: str | None) -> dict:
+    keys = list(tasks)
+    if len(keys) == 1:
+        description, prompt_text = tasks[keys[0]]
+    else:
+        description = " + ".join(task_description for task_description, _ in tasks.values())
+        prompt_text = prompt_assembly.build_combined_instructions(tasks)
+    if not client:
+        utils.notify("error", f"OpenAI client not available for generating {description}.")
+        return dict.fromkeys(keys)
+
+    stream_on_item = (lambda list_key, item: on_item(keys[0], list_key, item)) if on_item and len(keys) == 1 else None
+    try:
+        parsed = _request_ad_json(
+            client, prompt_text, description, ad_schemas.response_format(keys, content_count), use_cache, stream_on_item, max_tokens, context
+        )
     except Exception as e:
-        st.error(f"Error generating {content_description} content: {e}")
-        return None
\ No newline at end of file
+        utils.notify("error", f"Error generating {description} content: {e}")
+        return dict.fromkeys(keys)
+
+    results = {}
+    for key in keys:
+        raw_set = parsed if len(keys) == 1 else (parsed.get(key) if isinstance(parsed, dict) else None)
+        ad_set, missing = ad_schemas.validate_ad_set(key, raw_set, ad_schemas.expected_list_counts(key, content_count))
+        if on_item and len(keys) > 1:
+            for list_key, item in json_stream.iter_list_items(ad_set):
+                on_item(key, list_key, item)
+        for _ in range(REPAIR_ATTEMPTS):
+            if not missing:
+                break
+            logger.info("%s: repairing %s", tasks[key][0], missing)
+            try:
+                repaired = _repair_ad_set(client, key, tasks[key], ad_set, missing, use_cache, context)
+            except Exception as e:
+                utils.notify("warning", f"Could not repair {tasks[key][0]}: {e}")
+                break
+            for list_key, items in repaired.items():
+                ad_set[list_key].extend(items)
+                if on_item:
+                    for item in items:
+                        on_item(key, list_key, item)
+            _, missing = ad_schemas.validate_ad_set(key, ad_set, ad_schemas.expected_list_counts(key, content_count))
+        if missing:
+            utils.notify("warning", f"{tasks[key][0]}: {sum(missing.values())} of the requested items could not be generated.")
+        results[key] = ad_set if any(ad_set.values()) else None
+    return results
+
+def is_sharded(result_key: str, content_count: int) -> bool:
+    """Whether generate_sharded_ad_set splits this ad set (Google sets have a fixed size)."""
+    return result_key not in token_budget.GOOGLE_LIST_COUNTS and content_count > GENERATION_SHARD_SIZE
+
+def plan_shards(content_count: int, shard_size: int = GENERATION_SHARD_SIZE) -> list[int]:
+    """Near-equal shard sizes of at most `shard_size`, e.g. 10 -> [4, 3, 3]."""
+    shard_total = math.ceil(content_count / shard_size)
+    base, extra = divmod(content_count, shard_total)
+    return [base + (shard < extra) for shard in range(shard_total)]
+
+def generate_sharded_ad_set(client, result_key: str, description: str, build_instructions, content_count: int, use_cache: bool = True, on_item=None, context: str | None = None) -> dict:
+    """
+    Generates one large ad set as parallel shard requests (see plan_shards) and returns
+    {result_key: ad set or None}, like generate_ad_sets.
+
+    `build_instructions(count)` returns the channel instructions for `count` variations. Each
+    shard gets its own creative angle (prompt_assembly.CREATIVE_ANGLES, rotated by a seed taken
+    from the result key so reruns send the same prompts). The shards are merged in shard order,
+    dropping near-duplicates of earlier ads (ad_dedupe), so identical inputs give the same set;
+    empty slots are then topped up with follow-up requests that see the ads already kept
+    (TOP_UP_ATTEMPTS). `on_item` previews each shard's new ads as soon as the shard finishes,
+    so which of two near-duplicates it shows can differ from the returned set.
+    """
+    if not client:
+        utils.notify("error", f"OpenAI client not available for generating {description}.")
+        return {result_key: None}
+    _, _, list_key, _ = ad_records.AD_SET_SPECS[result_key]
+    shard_counts = plan_shards(content_count)
+    first_angle = zlib.crc32(result_key.encode("utf-8")) % len(prompt_assembly.CREATIVE_ANGLES)
+
+    def request_shard(number: int, count: int) -> list:
+        angle = prompt_assembly.CREATIVE_ANGLES[(first_angle + number - 1) % len(prompt_assembly.CREATIVE_ANGLES)]
+        parsed = _request_ad_json(
+            client,
+            prompt_assembly.add_angle_hint(build_instructions(count), angle, number, len(shard_counts)),
+            f"{description} (shard {number}/{len(shard_counts)})",
+            ad_schemas.response_format([result_key], count),
+            use_cache,
+            max_tokens=token_budget.estimate_output_tokens(result_key, count),
+            context=context,
+        )
+        valid_set, _ = ad_schemas.validate_ad_set(result_key, parsed, {list_key: count})
+        return valid_set[list_key]
+
+    def merge(kept: list, new_items: list) -> list:
+        """Appends the new ads that are not near-duplicates of `kept`, up to content_count; returns them."""
+        merged, _ = ad_dedupe.remove_near_duplicates(kept + new_items) # Kept ads are distinct, so they stay in front
+        added = merged[len(kept):content_count]
+        kept.extend(added)
+        return added
+
+    previewed = []
+
+    def preview(new_items: list):
+        if on_item:
+            for item in merge(previewed, new_items):
+                on_item(result_key, list_key, item)
+
+    with run_metrics.span("generation", keys=[result_key], shards=len(shard_counts)):
+        shard_items = {}
+        with utils.make_thread_pool(len(shard_counts)) as executor:
+            futures = {executor.submit(request_shard, number, count): number for number, count in enumerate(shard_counts, 1)}
+            for future in as_completed(futures):
+                try:
+                    shard_items[futures[future]] = future.result()
+                except Exception as e: # The other shards and the top-up still fill the set
+                    utils.notify("warning", f"Could not generate part of {description}: {e}")
+                else:
+                    preview(shard_items[futures[future]])
+        items = []
+        for number in sorted(shard_items): # Shard order, independent of which shard finished first
+            merge(items, shard_items[number])
+        dropped = sum(len(shard) for shard in shard_items.values()) - len(items)
+        logger.info("%s: %d shards, %d near-duplicate or surplus ads dropped, %d of %d ads", description, len(shard_counts), dropped, len(items), content_count)
+
+        for _ in range(TOP_UP_ATTEMPTS):
+            missing = content_count - len(items)
+            if not missing:
+                break
+            logger.info("%s: topping up %d ads", description, missing)
+            try:
+                repaired = _repair_ad_set(
+                    client, result_key, (description, build_instructions(missing)), {list_key: items}, {list_key: missing}, use_cache, context
+                )
+            except Exception as e:
+                utils.notify("warning", f"Could not top up {description}: {e}")
+                break
+            preview(merge(items, repaired.get(list_key, [])))
+
+    if len(items) < content_count:
+        utils.notify("warning", f"{description}: {content_count - len(items)} of the requested items could not be generated.")
+    return {result_key: {list_key: items} if items else None}
+
+def fix_constraint_violations(client, ad_content: dict, violations: list, use_cache: bool = True, destination_urls: dict | None = None) -> int:
+    """
+    Sends only the items with violations (see ad_constraints.check_ad_content) back in one batched
+    request per attempt (FIXUP_ATTEMPTS) and swaps in, in place, every rewrite that is well formed
+    and passes all rules; other items are kept as they were. Wrong item counts are left to the
+    repair step of generation. Returns the number of items fixed.
+    """
+    destination_urls = destination_urls or {}
+    pending = {}
+    for violation in violations:
+        if violation.index is not None:
+            pending[f"{violation.result_key}.{violation.list_key}.{violation.index + 1}"] = (violation.result_key, violation.list_key, violation.index)
+    if not pending or not client:
+        return 0
+
+    fixed = 0
+    with run_metrics.span("constraint_fixup", items=len(pending)):
+        for _ in range(FIXUP_ATTEMPTS):
+            entries = {}
+            for item_id, (key, list_key, index) in pending.items():
+                channel, funnel_stage, _, _ = ad_records.AD_SET_SPECS[key]
+                item = ad_content[key][list_key][index]
+                problems = [
+                    f"{field}: {problem}" if field else problem
+                    for field, problem in ad_constraints.check_item(key, list_key, item, destination_urls.get(key))
+                ]
+                entries[item_id] = (f"{channel} {funnel_stage}" if funnel_stage else channel, item, problems)
+            try:
+                parsed = _request_ad_json(
+                    client,
+                    prompt_assembly.build_fixup_instructions(entries),
+                    f"constraint fix-up ({len(entries)} items)",
+                    ad_schemas.fixup_response_format({item_id: key for item_id, (key, _, _) in pending.items()}),
+                    use_cache,
+                    max_tokens=token_budget.max_tokens_for_chars(
+                        sum(len(json.dumps(item, ensure_ascii=False)) for _, item, _ in entries.values())
+                    ) + token_budget.OUTPUT_BASE_TOKENS,
+                )
+            except Exception as e:
+                utils.notify("warning", f"Could not fix ads that break platform limits: {e}")
+                break
+            parsed = parsed if isinstance(parsed, dict) else {}
+            for item_id, (key, list_key, index) in list(pending.items()):
+                valid_set, _ = ad_schemas.validate_ad_set(key, {list_key: [parsed.get(item_id)]}, {list_key: 1})
+                if valid_set[list_key] and not ad_constraints.check_item(key, list_key, valid_set[list_key][0], destination_urls.get(key)):
+                    ad_content[key][list_key][index] = valid_set[list_key][0]
+                    del pending[item_id]
+                    fixed += 1
+            if not pending:
+                break
+    logger.info("Constraint fix-up: %d items fixed, %d still breaking limits", fixed, len(pending))
+    return fixed
@@ -0,0 +1,183 @@
+# modules/batch_jobs.py
+import io
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from modules import request_scheduler
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", 30))
+# A batch is submitted once no new request has arrived for this long (every pipeline is waiting)
+BATCH_COLLECT_SECONDS = float(os.environ.get("BATCH_COLLECT_SECONDS", 5))
+BATCH_MAX_REQUESTS = 50_000 # Provider limit per batch input file
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# File and batch calls bypass request_scheduler, so the SDK retries them (the shared client has max_retries=0)
+BATCH_API_MAX_RETRIES = int(os.environ.get("BATCH_API_MAX_RETRIES", 5))
+# Polls in a row that may fail transiently (after the SDK's own retries) before the batch is given up
+BATCH_POLL_MAX_FAILURES = int(os.environ.get("BATCH_POLL_MAX_FAILURES", 120))
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRequestError(Exception):
+    """A request inside a batch failed, or the whole batch did."""
+
+
+def _to_namespace(value):
+    """Turns a JSON chat completion into the attribute-style object the SDK would return."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(item) for item in value]
+    return value
+
+
+def build_batch_input(requests: dict) -> bytes:
+    """JSONL batch input file: one chat completion request per line, keyed by custom_id."""
+    lines = (
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}, ensure_ascii=False)
+        for custom_id, body in requests.items()
+    )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def parse_batch_output(text: str) -> dict:
+    """{custom_id: chat completion body dict, or BatchRequestError} from a batch output/error file."""
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code", 200) >= 400:
+            error = record.get("error") or (response.get("body") or {}).get("error") or response
+            results[record["custom_id"]] = BatchRequestError(f"Batch request failed: {error}")
+        elif not response.get("body"):
+            results[record["custom_id"]] = BatchRequestError("Batch request returned no response body")
+        else:
+            results[record["custom_id"]] = response["body"]
+    return results
+
+
+def run_batch_job(client, requests: dict, poll_seconds: float = BATCH_POLL_SECONDS, on_status=None) -> dict:
+    """
+    Uploads `requests` ({custom_id: chat completion body}) as one batch, polls until it finishes
+    and returns {custom_id: chat completion body dict, or BatchRequestError}. Every call is retried
+    on transient errors (BATCH_API_MAX_RETRIES), and a failed poll is simply repeated at the next
+    interval, up to BATCH_POLL_MAX_FAILURES in a row.
+    """
+    client = client.with_options(max_retries=BATCH_API_MAX_RETRIES)
+    input_file = client.files.create(file=("batch_input.jsonl", io.BytesIO(build_batch_input(requests))), purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW)
+    logger.info("Submitted batch %s with %d requests", batch.id, len(requests))
+    poll_failures = 0
+    while batch.status not in TERMINAL_STATUSES:
+        time.sleep(poll_seconds)
+        try:
+            batch = client.batches.retrieve(batch.id)
+        except Exception as e:
+            poll_failures += 1
+            if not request_scheduler.is_retryable_error(e) or poll_failures >= BATCH_POLL_MAX_FAILURES:
+                raise
+            logger.warning("Polling batch %s failed (%d in a row), retrying: %s", batch.id, poll_failures, e)
+            continue
+        poll_failures = 0
+        if on_status:
+            on_status(batch)
+    logger.info("Batch %s finished: %s", batch.id, batch.status)
+
+    results = {}
+    for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+        if file_id:
+            results.update(parse_batch_output(client.files.content(file_id).text))
+    for custom_id in requests:
+        if custom_id not in results:
+            results[custom_id] = BatchRequestError(f"No result for request in batch {batch.id} (status: {batch.status})")
+    return results
+
+
+class BatchClient:
+    """
+    Drop-in stand-in for the OpenAI client's `chat.completions.create` that routes every request
+    through the provider's asynchronous Batch API.
+
+    Each call blocks its (worker) thread while the request waits in a queue. Once no new request
+    has arrived for `collect_seconds`, i.e. every pipeline is waiting on a result, the queue is
+    submitted as one batch and each caller gets its own completion back. Because callers see an
+    ordinary completion, the pipeline, the LLM response cache, schema repair and the reports all
+    work unchanged; later phases (generation after summaries) simply become later batches.
+    """
+
+    handles_rate_limits = True # Batch quotas are separate: ai_processing skips the request scheduler
+    price_factor = 0.5 # Batch requests are billed at half price (run_metrics cost estimates)
+
+    def __init__(self, client, poll_seconds: float = BATCH_POLL_SECONDS, collect_seconds: float = BATCH_COLLECT_SECONDS):
+        self.client = client
+        self.poll_seconds = poll_seconds
+        self.collect_seconds = collect_seconds
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.batches_submitted = 0
+        self._queue = {} # custom_id -> (request body, Future)
+        self._last_enqueued = 0.0
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="batch-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def create(self, **request):
+        if request.get("stream"):
+            raise ValueError("Streaming is not available in batch mode.")
+        future = Future()
+        with self._condition:
+            custom_id = f"request-{next(self._ids)}"
+            self._queue[custom_id] = (request, future)
+            self._last_enqueued = time.monotonic()
+            self._condition.notify_all()
+        return future.result()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    idle = time.monotonic() - self._last_enqueued
+                    if self._queue and (idle >= self.collect_seconds or len(self._queue) >= BATCH_MAX_REQUESTS):
+                        break
+                    self._condition.wait(timeout=self.collect_seconds - idle if self._queue else None)
+                if self._closed:
+                    return
+                queued = dict(itertools.islice(self._queue.items(), BATCH_MAX_REQUESTS))
+                for custom_id in queued:
+                    del self._queue[custom_id]
+                self.batches_submitted += 1
+            # Polled on its own thread so requests for the next batch keep collecting meanwhile
+            threading.Thread(target=self._run_batch, args=(queued,), daemon=True).start()
+
+    def _run_batch(self, queued: dict):
+        try:
+            results = run_batch_job(self.client, {custom_id: request for custom_id, (request, _) in queued.items()}, self.poll_seconds)
+        except Exception as e: # Upload or polling failed: every caller in this batch gets the error
+            for _, future in queued.values():
+                future.set_exception(BatchRequestError(f"Batch job failed: {e}"))
+            return
+        for custom_id, (_, future) in queued.items():
+            result = results[custom_id]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(_to_namespace(result))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            for _, future in self._queue.values():
+                future.set_exception(BatchRequestError("Batch client closed"))
+            self._queue.clear()
+            self._condition.notify_all()
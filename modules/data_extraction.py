@@ -1,69 +1,148 @@
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
-from pypdf import PdfReader
 from pptx import Presentation
-import io
+import contextlib
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from modules import html_extraction, pdf_extraction, utils, web_crawler
+
+def extract_text_from_html(html: bytes | str) -> str:
+    """
+    Extracts the main visible text from an HTML document, without nav menus, cookie banners,
+    footers and other boilerplate. Uses the fastest installed parser (see html_extraction).
+    """
+    return html_extraction.extract_main_text(html)
 
 @st.cache_data(show_spinner=False)
-def extract_text_from_url(_url: str) -> str | None:
+def extract_text_from_url(url: str) -> str | None:
     """Extracts all text content from a URL."""
     try:
-        response = requests.get(_url, timeout=10)
+        response = requests.get(url, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.decompose()
-        
-        text = soup.get_text(separator=' ', strip=True)
-        return text
+        return extract_text_from_html(response.content)
     except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching URL {_url}: {e}")
+        utils.notify("error", f"Error fetching URL {url}: {e}")
         return None
     except Exception as e:
-        st.error(f"Error parsing URL content: {e}")
+        utils.notify("error", f"Error parsing URL content: {e}")
         return None
 
-@st.cache_data(show_spinner=False)
-def extract_text_from_pdf_bytes(_pdf_bytes: bytes) -> str | None:
-    """Extracts text from PDF bytes."""
+def extract_text_from_site(url: str, max_pages: int = web_crawler.CRAWL_MAX_PAGES) -> str | None:
+    """
+    Crawls the client's site (homepage, sitemap pages and internal links) and returns the
+    deduplicated text of every page, one "Page: <url>" section per page separated by form feeds
+    so the summarizer can split on page boundaries. Unchanged pages are served from the HTTP cache.
+    """
     try:
-        reader = PdfReader(io.BytesIO(_pdf_bytes))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        pages = web_crawler.crawl_site(url, max_pages=max_pages)
     except Exception as e:
-        st.error(f"Error reading PDF file: {e}")
+        utils.notify("error", f"Error crawling website {url}: {e}")
         return None
+    if not pages:
+        return extract_text_from_url(url) # Crawl found nothing usable (e.g. robots.txt); try the single page
+    return "\f".join(f"Page: {page['url']}\n{page['text']}" for page in pages)
 
-@st.cache_data(show_spinner=False)
-def extract_text_from_pptx_bytes(_pptx_bytes: bytes) -> str | None:
-    """Extracts text from PPTX bytes."""
+PDF_MIME_TYPE = "application/pdf"
+PPTX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+FILE_TYPES = {".pdf": PDF_MIME_TYPE, ".pptx": PPTX_MIME_TYPE}
+
+@dataclass(frozen=True)
+class TextChunk:
+    """A piece of extracted text and where it came from, e.g. page 3 of a PDF or slide 7 of a deck."""
+    text: str
+    unit: str # "page" or "slide"
+    number: int
+
+    @property
+    def label(self) -> str:
+        return f"{self.unit.capitalize()} {self.number}"
+
+def join_chunks(chunks) -> str:
+    """Page/slide-tagged text ("Page N" sections separated by form feeds), like crawled site text."""
+    return "\f".join(f"{chunk.label}\n{chunk.text}" for chunk in chunks)
+
+@contextlib.contextmanager
+def _pdf_path(source):
+    """
+    Yields a filesystem path for a PDF source so the extraction workers can open it themselves.
+    Paths are used as they are; uploads are written to a temp file straight from their buffer.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        if hasattr(source, "getbuffer"): # UploadedFile / BytesIO: memoryview, no copy
+            f.write(source.getbuffer())
+        else: # Any other binary file object, copied in blocks
+            source.seek(0)
+            shutil.copyfileobj(source, f)
+        path = f.name
     try:
-        prs = Presentation(io.BytesIO(_pptx_bytes))
-        text = ""
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-        return text
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def iter_pdf_chunks(source):
+    """
+    Yields one TextChunk per PDF page from a path or binary file object. Pages are extracted in
+    parallel on a memory- and time-limited process pool and extraction stops once there is
+    enough text to summarize (see pdf_extraction).
+    """
+    with _pdf_path(source) as path:
+        pages = pdf_extraction.iter_pdf_pages(
+            path,
+            on_skipped=lambda first_page, last_page: utils.notify(
+                "warning", f"Skipped PDF pages {first_page}-{last_page}: they exceeded the extraction time or memory limit."
+            ),
+        )
+        for page_number, text in pages:
+            if text.strip():
+                yield TextChunk(text.strip(), "page", page_number)
+
+def iter_pptx_chunks(source):
+    """Yields one TextChunk per slide from a path or binary file object, reading the deck in place."""
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    prs = Presentation(source)
+    for slide_number, slide in enumerate(prs.slides, 1):
+        text = "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text") and shape.text)
+        if text.strip():
+            yield TextChunk(text.strip(), "slide", slide_number)
+
+def _file_type(source) -> str | None:
+    if isinstance(source, (str, os.PathLike)):
+        extension = os.path.splitext(os.fspath(source))[1].lower()
+        return FILE_TYPES.get(extension, extension)
+    return getattr(source, "type", None)
+
+def iter_file_chunks(source):
+    """
+    Streams TextChunks from an uploaded file or a file path (PDF or PPTX) without copying the
+    file into new bytes objects or building the full text. Errors are reported with utils.notify
+    and end the stream.
+    """
+    if source is None:
+        return
+    file_type = _file_type(source)
+    try:
+        if file_type == PDF_MIME_TYPE:
+            yield from iter_pdf_chunks(source)
+        elif file_type == PPTX_MIME_TYPE:
+            yield from iter_pptx_chunks(source)
+        else:
+            utils.notify("warning", f"Unsupported file type: {file_type}")
+    except pdf_extraction.PDFExtractionError as e:
+        utils.notify("error", f"Error reading PDF file: {e}")
+    except OSError as e:
+        utils.notify("error", f"Error reading file {source}: {e}")
     except Exception as e:
-        st.error(f"Error reading PPTX file: {e}")
-        return None
+        utils.notify("error", f"Error reading {'PDF' if file_type == PDF_MIME_TYPE else 'PPTX'} file: {e}")
 
 def extract_text_from_file(uploaded_file) -> str | None:
-    """Detects file type and extracts text."""
-    if uploaded_file is None:
-        return None
-    
-    file_bytes = uploaded_file.getvalue()
-    if uploaded_file.type == "application/pdf":
-        return extract_text_from_pdf_bytes(file_bytes)
-    elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.presentationml.presentation":
-        return extract_text_from_pptx_bytes(file_bytes)
-    else:
-        st.warning(f"Unsupported file type: {uploaded_file.type}")
-        return None
\ No newline at end of file
+    """Detects file type and extracts text. Prefer iter_file_chunks for large files."""
+    return join_chunks(iter_file_chunks(uploaded_file)) or None
@@ -3,34 +3,77 @@ from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import io
+import re
+import textwrap
+
+RAW_TEXT_MAX_CHARS = 90000 # Per source; keeps the document a reasonable size
+PARAGRAPH_MAX_CHARS = 2000 # Raw extracts are written as paragraphs of at most this size, never as one giant paragraph
+# Control characters Word XML cannot hold (e.g. the form feeds between crawled pages / PDF pages)
+XML_INVALID_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _clean_text(text: str) -> str:
+    return XML_INVALID_CHARS.sub("\n", text)
+
+def split_paragraphs(text: str, max_chars: int = PARAGRAPH_MAX_CHARS) -> list[str]:
+    """
+    Splits a raw extract at blank lines; the lines of a block are packed into paragraphs of up
+    to `max_chars`, and longer lines (e.g. crawled text without newlines) are wrapped at words.
+    """
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", text):
+        current = ""
+        for line in block.splitlines():
+            line = line.strip()
+            for piece in [line] if len(line) <= max_chars else textwrap.wrap(line, max_chars):
+                if current and len(current) + 1 + len(piece) > max_chars:
+                    paragraphs.append(current)
+                    current = ""
+                current = f"{current}\n{piece}" if current else piece
+        if current:
+            paragraphs.append(current)
+    return paragraphs
 
 def create_transparency_document(
     company_url: str,
     website_text: str | None,
     website_summary: str | None,
-    additional_text: str | None,
+    additional_text: str | list | None,
     additional_summary: str | None,
-    lead_magnet_text: str | None,
+    lead_magnet_text: str | list | None,
     lead_magnet_summary: str | None
 ) -> bytes:
     """
     Creates a Word document containing extracted texts and their summaries.
+    Texts are strings or lists of data_extraction.TextChunk, written under one label per page/slide;
+    raw text is split into paragraphs (see split_paragraphs).
     """
     doc = Document()
 
+    def add_text(text):
+        for paragraph in split_paragraphs(_clean_text(text)):
+            doc.add_paragraph(paragraph).alignment = WD_ALIGN_PARAGRAPH.LEFT
+
     def add_section(title, text_content, summary_content, text_header, summary_header):
         if text_content or summary_content:
             doc.add_heading(title, level=1)
             
             if text_content:
                 doc.add_heading(text_header, level=2)
-                p_text = doc.add_paragraph(str(text_content)[:90000]) # Limit length to prevent huge docs
-                p_text.alignment = WD_ALIGN_PARAGRAPH.LEFT
+                if isinstance(text_content, str):
+                    add_text(text_content[:RAW_TEXT_MAX_CHARS]) # Limit length to prevent huge docs
+                else:
+                    remaining_chars = RAW_TEXT_MAX_CHARS
+                    for chunk in text_content:
+                        if remaining_chars <= 0:
+                            break
+                        doc.add_paragraph().add_run(chunk.label).bold = True
+                        add_text(chunk.text[:remaining_chars])
+                        remaining_chars -= len(chunk.text)
                 doc.add_paragraph() # Add some space
             
             if summary_content:
                 doc.add_heading(summary_header, level=2)
-                p_summary = doc.add_paragraph(str(summary_content))
+                p_summary = doc.add_paragraph(_clean_text(str(summary_content)))
                 p_summary.alignment = WD_ALIGN_PARAGRAPH.LEFT
                 doc.add_paragraph() # Add some space
             doc.add_page_break()
@@ -61,4 +104,55 @@ def create_transparency_document(
     doc_bytes = io.BytesIO()
     doc.save(doc_bytes)
     doc_bytes.seek(0)
-    return doc_bytes.getvalue()
\ No newline at end of file
+    return doc_bytes.getvalue()
+
+def add_run_metrics_section(doc_bytes: bytes, metrics) -> bytes:
+    """
+    Appends a "Run Metrics" section (stage timings, token usage, estimated cost, cache hit
+    rates and one row per AI call) from a run_metrics.RunMetrics to a finished document.
+    """
+    doc = Document(io.BytesIO(doc_bytes))
+    data = metrics.to_dict()
+    totals = data["totals"]
+
+    def add_table(headers, rows):
+        table = doc.add_table(rows=1, cols=len(headers))
+        table.style = "Table Grid"
+        for cell, header in zip(table.rows[0].cells, headers):
+            cell.text = header
+            cell.paragraphs[0].runs[0].bold = True
+        for row in rows:
+            for cell, value in zip(table.add_row().cells, row):
+                cell.text = str(value)
+        doc.add_paragraph() # Add some space
+
+    doc.add_heading("Run Metrics", level=1)
+    cost_note = "" if totals["cost_complete"] else " (models without a known price excluded)"
+    doc.add_paragraph(
+        f"Total time: {totals['seconds']:.1f} s. AI calls: {totals['llm_calls']}. "
+        f"Tokens: {totals['prompt_tokens']:,} prompt ({totals['cached_tokens']:,} served from the provider's prompt cache), "
+        f"{totals['completion_tokens']:,} completion. Estimated cost: ${totals['cost_usd']:.4f}{cost_note}."
+    )
+    for cache, hit_rate in totals["cache_hit_rates"].items():
+        doc.add_paragraph(f"{cache.replace('_', ' ').capitalize()} cache hit rate: {hit_rate:.0%}", style="List Bullet")
+
+    doc.add_heading("Stage Timings", level=2)
+    add_table(["Stage", "Spans", "Seconds"], [(name, stage["count"], f"{stage['seconds']:.2f}") for name, stage in data["stages"].items()])
+
+    if data["calls"]:
+        doc.add_heading("AI Calls", level=2)
+        add_table(
+            ["Call", "Cache", "Seconds", "Prompt", "Cached", "Completion", "Cost (USD)"],
+            [
+                (
+                    call["label"], "hit" if call["cache_hit"] else "miss", f"{call['seconds']:.2f}",
+                    call["prompt_tokens"], call["cached_tokens"], call["completion_tokens"],
+                    "n/a" if call["cost_usd"] is None else f"{call['cost_usd']:.5f}",
+                )
+                for call in data["calls"]
+            ],
+        )
+
+    doc_bytes = io.BytesIO()
+    doc.save(doc_bytes)
+    return doc_bytes.getvalue()
@@ -0,0 +1,121 @@
+# modules/export_processing.py
+import io
+import re
+
+import pandas as pd
+
+from modules import excel_processing, run_metrics
+
+GOOGLE_SEARCH_MAX_HEADLINES = 15
+GOOGLE_SEARCH_MAX_DESCRIPTIONS = 4
+GOOGLE_DISPLAY_MAX_HEADLINES = 5
+GOOGLE_DISPLAY_MAX_DESCRIPTIONS = 5
+
+# Meta's bulk import expects call-to-action enum values rather than button labels
+META_CTA_VALUES = {"Learn More": "LEARN_MORE", "Download": "DOWNLOAD", "Book Now": "BOOK_NOW", "Sign Up": "SIGN_UP", "Contact Us": "CONTACT_US"}
+
+
+def _csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8-sig") # BOM so Excel opens emoji/accents correctly
+
+
+def to_csv(ad_table: pd.DataFrame, **_) -> bytes:
+    return _csv_bytes(ad_table)
+
+
+def to_jsonl(ad_table: pd.DataFrame, **_) -> bytes:
+    return ad_table.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+
+
+def to_parquet(ad_table: pd.DataFrame, **_) -> bytes:
+    """Requires pyarrow (installed alongside Streamlit)."""
+    buffer = io.BytesIO()
+    ad_table.astype({"version": "int64"}).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def to_xlsx(ad_table: pd.DataFrame, **_) -> bytes:
+    return excel_processing.create_excel_report_from_table(ad_table)
+
+
+def _campaign_name(company_name: str, channel: str, funnel_stage: str | None) -> str:
+    return " - ".join(part for part in (company_name, channel, funnel_stage) if part)
+
+
+def to_google_ads_editor_csv(ad_table: pd.DataFrame, company_name: str = "", final_url: str = "", **_) -> bytes:
+    """
+    Google Ads Editor import: one responsive search ad and one responsive display ad row built
+    from the generated headline/description assets.
+    """
+    rows = []
+    for channel, ad_type, max_headlines, max_descriptions in [
+        ("Google Search", "Responsive search ad", GOOGLE_SEARCH_MAX_HEADLINES, GOOGLE_SEARCH_MAX_DESCRIPTIONS),
+        ("Google Display", "Responsive display ad", GOOGLE_DISPLAY_MAX_HEADLINES, GOOGLE_DISPLAY_MAX_DESCRIPTIONS),
+    ]:
+        assets = ad_table[ad_table["channel"] == channel]
+        if assets.empty:
+            continue
+        headlines = [h for h in assets["headline"] if h][:max_headlines]
+        descriptions = [d for d in assets["description"] if d][:max_descriptions]
+        row = {"Campaign": _campaign_name(company_name, channel, None), "Ad group": "Ad group 1", "Ad type": ad_type, "Final URL": final_url}
+        row.update({f"Headline {i}": headline for i, headline in enumerate(headlines, 1)})
+        row.update({f"Description {i}": description for i, description in enumerate(descriptions, 1)})
+        rows.append(row)
+    return _csv_bytes(pd.DataFrame(rows))
+
+
+def to_linkedin_bulk_csv(ad_table: pd.DataFrame, company_name: str = "", **_) -> bytes:
+    """LinkedIn Campaign Manager bulk ad upload (single image ads), one campaign per funnel stage."""
+    ads = ad_table[ad_table["channel"] == "LinkedIn"]
+    return _csv_bytes(pd.DataFrame({
+        "Campaign Name": [_campaign_name(company_name, "LinkedIn", stage) for stage in ads["funnel_stage"]],
+        "Ad Name": ads["ad_name"],
+        "Introductory Text": ads["introductory_text"],
+        "Headline": ads["headline"],
+        "Destination URL": ads["destination_url"],
+        "Call To Action": ads["cta_button"],
+        "Image Copy": ads["image_copy"], # Not a LinkedIn field; kept for the design team
+    }))
+
+
+def _meta_cta(label) -> str:
+    if not label:
+        return ""
+    return META_CTA_VALUES.get(label, re.sub(r"\W+", "_", str(label)).strip("_").upper())
+
+
+def to_meta_bulk_csv(ad_table: pd.DataFrame, company_name: str = "", **_) -> bytes:
+    """Meta Ads Manager bulk import, one campaign/ad set per funnel stage."""
+    ads = ad_table[ad_table["channel"] == "Facebook"]
+    campaign_names = [_campaign_name(company_name, "Facebook", stage) for stage in ads["funnel_stage"]]
+    return _csv_bytes(pd.DataFrame({
+        "Campaign Name": campaign_names,
+        "Ad Set Name": campaign_names,
+        "Ad Name": ads["ad_name"],
+        "Body": ads["primary_text"],
+        "Title": ads["headline"],
+        "Link Description": ads["link_description"],
+        "Link": ads["destination_url"],
+        "Call to Action": [_meta_cta(label) for label in ads["cta_button"]],
+        "Image Copy": ads["image_copy"], # Not an import field; kept for the design team
+    }))
+
+
+# format id -> (label, file suffix, MIME type, exporter). Exporters take the ad table plus
+# optional company_name / final_url keyword arguments.
+EXPORT_FORMATS = {
+    "xlsx": ("Excel (XLSX)", "ads.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", to_xlsx),
+    "csv": ("CSV", "ads.csv", "text/csv", to_csv),
+    "jsonl": ("JSON Lines", "ads.jsonl", "application/jsonl", to_jsonl),
+    "parquet": ("Parquet", "ads.parquet", "application/vnd.apache.parquet", to_parquet),
+    "google_ads_editor": ("Google Ads Editor CSV", "google_ads_editor.csv", "text/csv", to_google_ads_editor_csv),
+    "linkedin_bulk": ("LinkedIn bulk upload CSV", "linkedin_bulk.csv", "text/csv", to_linkedin_bulk_csv),
+    "meta_bulk": ("Meta bulk import CSV", "meta_bulk.csv", "text/csv", to_meta_bulk_csv),
+}
+
+
+def export_ad_table(ad_table: pd.DataFrame, format_id: str, company_name: str = "", final_url: str = "") -> bytes:
+    """Serializes the ad table into one of EXPORT_FORMATS."""
+    _, _, _, exporter = EXPORT_FORMATS[format_id]
+    with run_metrics.span("export", format=format_id):
+        return exporter(ad_table, company_name=company_name, final_url=final_url)
@@ -0,0 +1,169 @@
+# modules/html_extraction.py
+import os
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError: # Optional, faster backend
+    lxml = None
+
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError: # Optional, fastest backend
+    SelectolaxParser = None
+
+# Never visible / never useful as ad context
+NON_CONTENT_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "canvas"]
+# Page chrome that repeats on every page of a marketing site
+BOILERPLATE_TAGS = ["nav", "header", "footer", "aside", "form", "dialog"]
+BOILERPLATE_ROLES = ["navigation", "banner", "contentinfo", "dialog", "search"]
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|consent|gdpr|banner|newsletter|subscribe|popup|modal|navbar|menu|breadcrumb|"
+    r"social|share|sidebar|footer|header|skip-link|announcement",
+    re.IGNORECASE,
+)
+MAIN_CONTENT_SELECTORS = ["main", "article", "[role=main]", "#content", "#main"]
+MIN_MAIN_CONTENT_CHARS = 200 # A <main> shorter than this is probably not the real content
+CONTENT_MARKER_TAGS = ["main", "article", "h1"]
+
+
+def _normalize_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _is_boilerplate(element_id, element_class, role) -> bool:
+    if role in BOILERPLATE_ROLES:
+        return True
+    if isinstance(element_class, list):
+        element_class = " ".join(element_class)
+    return bool(BOILERPLATE_PATTERN.search(f"{element_id or ''} {element_class or ''}"))
+
+
+# --- Backends: each returns (text, links) for one HTML document ---
+# Boilerplate tags and boilerplate-looking wrappers that contain the page's main content (<main>,
+# <article>, <h1>) are kept, so neither an <article><header><h1> nor a class like
+# "page-with-sidebar" on the outer layout div can wipe the page's headline or content.
+
+def _parse_with_bs4(html, base_url: str, strip_boilerplate: bool) -> tuple[str, list[str]]:
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True)] if base_url else []
+    for element in soup(NON_CONTENT_TAGS):
+        element.decompose()
+    if strip_boilerplate:
+        for element in soup(BOILERPLATE_TAGS):
+            if not element.decomposed and not element.find(CONTENT_MARKER_TAGS):
+                element.decompose()
+        for element in soup.find_all(lambda tag: _is_boilerplate(tag.get("id"), tag.get("class"), tag.get("role"))):
+            if not element.decomposed and element.name not in ("html", "body") and not element.find(CONTENT_MARKER_TAGS):
+                element.decompose()
+        for selector in MAIN_CONTENT_SELECTORS:
+            main = soup.select_one(selector)
+            if main is not None:
+                text = _normalize_whitespace(main.get_text(separator=" "))
+                if len(text) >= MIN_MAIN_CONTENT_CHARS:
+                    return text, links
+    return _normalize_whitespace(soup.get_text(separator=" ")), links
+
+
+def _xpath_for_selector(selector: str) -> str:
+    if selector.startswith("#"):
+        return f"//*[@id='{selector[1:]}']"
+    if selector.startswith("[role="):
+        return f"//*[@role='{selector[6:-1]}']"
+    return f"//{selector}"
+
+
+def _parse_with_lxml(html, base_url: str, strip_boilerplate: bool) -> tuple[str, list[str]]:
+    root = lxml.html.fromstring(html if isinstance(html, bytes) else html.encode("utf-8"))
+    links = [urljoin(base_url, href) for href in root.xpath("//a/@href")] if base_url else []
+    for element in root.xpath(" | ".join(f"//{tag}" for tag in NON_CONTENT_TAGS)):
+        element.drop_tree()
+    if strip_boilerplate:
+        content_markers = " | ".join(f".//{tag}" for tag in CONTENT_MARKER_TAGS)
+        for element in root.xpath(" | ".join(f"//{tag}" for tag in BOILERPLATE_TAGS)):
+            if not element.xpath(content_markers):
+                element.drop_tree()
+        for element in root.xpath("//*[@id or @class or @role]"):
+            if (
+                element.tag not in ("html", "body")
+                and _is_boilerplate(element.get("id"), element.get("class"), element.get("role"))
+                and not element.xpath(content_markers)
+            ):
+                element.drop_tree()
+        for selector in MAIN_CONTENT_SELECTORS:
+            matches = root.xpath(_xpath_for_selector(selector))
+            if matches:
+                text = _normalize_whitespace(" ".join(matches[0].itertext()))
+                if len(text) >= MIN_MAIN_CONTENT_CHARS:
+                    return text, links
+    return _normalize_whitespace(" ".join(root.itertext())), links
+
+
+def _parse_with_selectolax(html, base_url: str, strip_boilerplate: bool) -> tuple[str, list[str]]:
+    tree = SelectolaxParser(html)
+    links = [urljoin(base_url, node.attributes["href"]) for node in tree.css("a[href]") if node.attributes.get("href")] if base_url else []
+    tree.strip_tags(NON_CONTENT_TAGS)
+    if strip_boilerplate:
+        candidates = [
+            node for node in tree.css(", ".join(["[id]", "[class]", "[role]"] + BOILERPLATE_TAGS))
+            if node.tag not in ("html", "body")
+            and (
+                node.tag in BOILERPLATE_TAGS
+                or _is_boilerplate(node.attributes.get("id"), node.attributes.get("class"), node.attributes.get("role"))
+            )
+            and node.css_first(", ".join(CONTENT_MARKER_TAGS)) is None
+        ]
+        candidate_ids = {node.mem_id for node in candidates}
+        # Only remove outermost candidates: decomposing a node frees its children
+        outermost = []
+        for node in candidates:
+            parent, nested = node.parent, False
+            while parent is not None:
+                if parent.mem_id in candidate_ids:
+                    nested = True
+                    break
+                parent = parent.parent
+            if not nested:
+                outermost.append(node)
+        for node in outermost:
+            node.decompose()
+        for selector in MAIN_CONTENT_SELECTORS:
+            main = tree.css_first(selector)
+            if main is not None:
+                text = _normalize_whitespace(main.text(separator=" "))
+                if len(text) >= MIN_MAIN_CONTENT_CHARS:
+                    return text, links
+    body = tree.body or tree.root
+    return _normalize_whitespace(body.text(separator=" ") if body else ""), links
+
+
+BACKENDS = {"html.parser": _parse_with_bs4}
+if lxml is not None:
+    BACKENDS["lxml"] = _parse_with_lxml
+if SelectolaxParser is not None:
+    BACKENDS["selectolax"] = _parse_with_selectolax
+
+# Fastest installed backend unless overridden with HTML_PARSER_BACKEND
+DEFAULT_BACKEND = os.environ.get("HTML_PARSER_BACKEND") or next(
+    name for name in ("selectolax", "lxml", "html.parser") if name in BACKENDS
+)
+
+
+def parse_page(html, base_url: str = "", backend: str | None = None, strip_boilerplate: bool = True) -> tuple[str, list[str]]:
+    """
+    Parses one HTML page and returns (main text, absolute links). Links are collected before
+    boilerplate removal so navigation menus still feed the crawler.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"HTML parser backend '{backend}' is not installed. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](html, base_url, strip_boilerplate)
+
+
+def extract_main_text(html, backend: str | None = None, strip_boilerplate: bool = True) -> str:
+    """Visible main-content text of an HTML page, with nav/cookie/footer boilerplate removed."""
+    text, _ = parse_page(html, backend=backend, strip_boilerplate=strip_boilerplate)
+    return text
@@ -0,0 +1,204 @@
+# modules/job_queue.py
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import utils
+
+logger = logging.getLogger(__name__)
+
+# Shared by every session of the server: at most this many pipeline runs at once, later jobs wait
+JOB_MAX_CONCURRENT = int(os.environ.get("JOB_MAX_CONCURRENT", 3))
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 24 * 3600)) # Finished jobs are forgotten after this
+JOB_RESULTS_KEPT = int(os.environ.get("JOB_RESULTS_KEPT", 20)) # Finished results held in memory for reattaching
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class Job:
+    """
+    One background run. Status, progress, notices and the serialized output are persisted as
+    they change; `result` (whatever the target returned) and the streamed `items` live in
+    memory only. Safe to read from the UI while a worker updates it.
+    """
+
+    def __init__(self, job_id: str, label: str, save=None, **state):
+        self.job_id = job_id
+        self.label = label
+        self.status = state.get("status", "queued") # queued | running | done | failed | interrupted
+        self.progress = state.get("progress", 0.0)
+        self.progress_text = state.get("progress_text", "")
+        self.notices = state.get("notices", []) # [level, message]
+        self.error = state.get("error")
+        self.output = state.get("output") # JSON-compatible, from submit's `serialize`
+        self.created_at = state.get("created_at", time.time())
+        self.started_at = state.get("started_at")
+        self.finished_at = state.get("finished_at")
+        self.items = [] # Streamed pieces of output, e.g. (result key, list key, ad)
+        self.result = None
+        self._save = save or (lambda job: None)
+        self._lock = threading.Lock()
+
+    def set_progress(self, fraction: float, text: str):
+        with self._lock:
+            self.progress, self.progress_text = min(max(fraction, 0.0), 1.0), text
+        self._save(self)
+
+    def add_notice(self, level: str, message: str):
+        with self._lock:
+            self.notices.append([level, message])
+        self._save(self)
+
+    def add_item(self, *item):
+        with self._lock:
+            self.items.append(item)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def snapshot(self) -> dict:
+        """A consistent copy of the job's state for rendering."""
+        with self._lock:
+            return {
+                "job_id": self.job_id, "label": self.label, "status": self.status,
+                "progress": self.progress, "progress_text": self.progress_text,
+                "notices": list(self.notices), "items": list(self.items), "error": self.error,
+                "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            }
+
+
+class JobQueue:
+    """
+    Runs jobs on a worker pool shared by the whole server (JOB_MAX_CONCURRENT workers) and keeps
+    their state in SQLite, so a page that reruns, refreshes or reconnects can find its job again
+    by id. Jobs that were queued or running when the process stopped are marked "interrupted".
+    """
+
+    def __init__(self, max_concurrent: int = JOB_MAX_CONCURRENT, path: str = JOB_DB_PATH, retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.retention_seconds = retention_seconds
+        # Not utils.make_thread_pool: these workers outlive the script run that starts them
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="job")
+        self._jobs = {} # job id -> Job, for jobs of this process
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL,
+                progress_text TEXT NOT NULL,
+                notices TEXT NOT NULL,
+                error TEXT,
+                output TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status IN ('queued', 'running')", (time.time(),)
+        )
+        self._conn.commit()
+        self._purge()
+
+    def _save(self, job: Job):
+        with job._lock:
+            row = (
+                job.job_id, job.label, job.status, job.progress, job.progress_text, json.dumps(job.notices),
+                job.error, None if job.output is None else json.dumps(job.output), job.created_at, job.started_at, job.finished_at,
+            )
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._conn.commit()
+
+    def _purge(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+            self._conn.commit()
+            finished = sorted(
+                (job for job in self._jobs.values() if not job.active), key=lambda job: job.finished_at or 0, reverse=True
+            )
+            for job in finished[JOB_RESULTS_KEPT:]: # Still in SQLite, without their in-memory result
+                del self._jobs[job.job_id]
+
+    def submit(self, label: str, target, *args, serialize=None, **kwargs) -> Job:
+        """
+        Queues `target(job, *args, **kwargs)` and returns its Job at once. The target reports
+        through job.set_progress / add_notice / add_item, and its utils.notify messages become job
+        notices too. Its return value becomes job.result and, through `serialize(result)`, the
+        persisted job.output. An exception fails the job.
+        """
+        job = Job(uuid.uuid4().hex, label, self._save)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._save(job)
+        self._executor.submit(self._run, job, target, args, kwargs, serialize)
+        self._purge()
+        return job
+
+    def _run(self, job: Job, target, args, kwargs, serialize):
+        with job._lock:
+            job.status, job.started_at = "running", time.time()
+        self._save(job)
+        try:
+            with utils.capture_notices(job.add_notice): # st.* would reach no page from this thread
+                result = target(job, *args, **kwargs)
+            output = serialize(result) if serialize else None
+            with job._lock:
+                job.result, job.output, job.status = result, output, "done"
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.job_id, job.label)
+            with job._lock:
+                job.status, job.error = "failed", str(e)
+        with job._lock:
+            job.finished_at = time.time()
+        self._save(job)
+
+    def get(self, job_id: str) -> Job | None:
+        """The job with this id: live if it belongs to this process, else as last persisted (without result)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job
+            row = self._conn.execute(
+                "SELECT label, status, progress, progress_text, notices, error, output, created_at, started_at, finished_at FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        label, status, progress, progress_text, notices, error, output, created_at, started_at, finished_at = row
+        return Job(
+            job_id, label, status=status, progress=progress, progress_text=progress_text, notices=json.loads(notices), error=error,
+            output=None if output is None else json.loads(output), created_at=created_at, started_at=started_at, finished_at=finished_at,
+        )
+
+    def queue_position(self, job: Job) -> int:
+        """Number of queued jobs ahead of `job` (0 once it runs)."""
+        if job.status != "queued":
+            return 0
+        with self._lock:
+            return sum(1 for other in self._jobs.values() if other.status == "queued" and other.created_at < job.created_at)
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {"running": statuses.count("running"), "queued": statuses.count("queued"), "max_concurrent": self.max_concurrent}
+
+
+@functools.lru_cache(maxsize=1)
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue shared by every Streamlit session."""
+    return JobQueue()
@@ -0,0 +1,82 @@
+# modules/json_stream.py
+import json
+
+
+class IncrementalListItemParser:
+    """
+    Incremental parser for the JSON shape our prompts ask for: a top-level object whose values
+    are lists, e.g. {"emails": [{...}, {...}]} or {"headlines": ["...", "..."]}.
+
+    Feed it text chunks as they stream in; `feed` returns (list_key, item) for every list item
+    that has been closed so far, so callers can show ads before the full completion arrives.
+    Anything else in the document is ignored here and handled by the final json.loads.
+    """
+
+    def __init__(self):
+        self._position = 0 # Number of characters consumed from the stream
+        self._stack = [] # Open containers: "{" or "["
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_top_level_string = None # Most recent key read at the top level
+        self._current_list_key = None
+        self._item_start = None # Position where the current list item began
+        self._text = ""
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        completed = []
+        self._text += chunk
+        text = self._text
+        for position in range(self._position, len(text)):
+            char = text[position]
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if depth == 1:
+                        self._last_top_level_string = json.loads(text[self._string_start:position + 1])
+                    elif depth == 2 and self._stack[1] == "[" and self._item_start == self._string_start:
+                        completed.append((self._current_list_key, json.loads(text[self._item_start:position + 1])))
+                        self._item_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+                if depth == 2 and self._stack[1] == "[":
+                    self._item_start = position # A string list item (e.g. Google headlines)
+            elif char in "{[":
+                if depth == 1 and char == "[":
+                    self._current_list_key = self._last_top_level_string
+                elif depth == 2 and self._stack[1] == "[":
+                    self._item_start = position
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if len(self._stack) == 2 and self._stack[1] == "[" and self._item_start is not None and char == "}":
+                    completed.append((self._current_list_key, json.loads(text[self._item_start:position + 1])))
+                    self._item_start = None
+
+        self._position = len(text)
+        return completed
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+
+def iter_list_items(parsed_json):
+    """Yields (list_key, item) from an already parsed response, mirroring the streaming output."""
+    if not isinstance(parsed_json, dict):
+        return
+    for list_key, value in parsed_json.items():
+        if isinstance(value, list):
+            for item in value:
+                yield list_key, item
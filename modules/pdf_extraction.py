@@ -0,0 +1,167 @@
+# modules/pdf_extraction.py
+import functools
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pypdf import PdfReader
+
+try:
+    import resource
+except ImportError: # Not available on Windows; memory limits are skipped there
+    resource = None
+
+PDF_MAX_WORKERS = int(os.environ.get("PDF_MAX_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_JOB = int(os.environ.get("PDF_PAGES_PER_JOB", 16))
+PDF_JOB_TIMEOUT_SECONDS = float(os.environ.get("PDF_JOB_TIMEOUT_SECONDS", 30))
+PDF_WORKER_MEMORY_MB = int(os.environ.get("PDF_WORKER_MEMORY_MB", 1024)) # Address-space cap per worker process
+# Summaries are built from at most this much text, so later pages are not extracted
+PDF_MAX_CHARS = int(os.environ.get("PDF_MAX_CHARS", 200_000))
+
+
+class PDFExtractionError(Exception):
+    """Raised when a PDF cannot be opened at all (corrupt, encrypted, over its limits)."""
+
+
+def _limit_worker_memory(memory_mb: int):
+    """Pool initializer: caps the worker's address space so a runaway PDF gets MemoryError, not the host OOM killer."""
+    if resource is None or not memory_mb:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _on_job_timeout(signum, frame):
+    raise TimeoutError("PDF extraction job exceeded its time limit")
+
+
+def _run_with_time_limit(seconds: float, fn, *args):
+    """Runs fn in the worker with a SIGALRM deadline, so a stuck page frees the worker instead of blocking it."""
+    if not hasattr(signal, "setitimer") or not seconds:
+        return fn(*args)
+    previous = signal.signal(signal.SIGALRM, _on_job_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def _extract_page_range(path: str, start: int, stop: int, max_chars: int) -> list[tuple[int, str]]:
+    """Worker job: [(page_number, text)] for pages start..stop-1, stopping once max_chars are collected."""
+    reader = PdfReader(path)
+    pages, collected = [], 0
+    for index in range(start, min(stop, len(reader.pages))):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except (TimeoutError, MemoryError):
+            raise # Job limits apply to the whole range
+        except Exception: # One malformed page should not lose the rest of the range
+            text = ""
+        pages.append((index + 1, text))
+        collected += len(text)
+        if collected >= max_chars:
+            break
+    return pages
+
+
+def count_pages_job(path: str, time_limit: float) -> int:
+    return _run_with_time_limit(time_limit, _count_pages, path)
+
+
+def extract_page_range_job(path: str, start: int, stop: int, max_chars: int, time_limit: float) -> list[tuple[int, str]]:
+    return _run_with_time_limit(time_limit, _extract_page_range, path, start, stop, max_chars)
+
+
+_pool_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_process_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by every session. Workers are spawned (not forked from the threaded
+    Streamlit server) and memory-capped; they only import pypdf.
+    """
+    return ProcessPoolExecutor(
+        max_workers=PDF_MAX_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_limit_worker_memory,
+        initargs=(PDF_WORKER_MEMORY_MB,),
+    )
+
+
+def _reset_pdf_process_pool(broken_pool: ProcessPoolExecutor):
+    """Replaces a pool whose worker died (e.g. killed for memory), unless another thread already did."""
+    with _pool_lock:
+        if get_pdf_process_pool() is broken_pool:
+            get_pdf_process_pool.cache_clear()
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_pdf_pages(
+    path: str,
+    max_chars: int = PDF_MAX_CHARS,
+    pages_per_job: int = PDF_PAGES_PER_JOB,
+    job_timeout: float = PDF_JOB_TIMEOUT_SECONDS,
+    on_skipped=None,
+):
+    """
+    Yields (page_number, text) for a PDF on disk, extracted on the process pool one
+    `pages_per_job` page range per job.
+
+    Pages come out in order as soon as their range is done. Once `max_chars` have been yielded
+    (or the consumer stops iterating) the remaining jobs are cancelled. Ranges that hit their
+    time or memory limit are skipped and reported as `on_skipped(first_page, last_page)`.
+    Raises PDFExtractionError if the document cannot be opened at all.
+
+    The time limit is enforced inside the worker (see _run_with_time_limit), so it counts from
+    when a job starts: jobs waiting for a worker on the shared pool are not timed out.
+    """
+    pool = get_pdf_process_pool()
+    try:
+        page_count = pool.submit(count_pages_job, path, job_timeout).result()
+    except BrokenProcessPool as e:
+        _reset_pdf_process_pool(pool)
+        raise PDFExtractionError("PDF exceeded the extraction memory limit") from e
+    except TimeoutError as e:
+        raise PDFExtractionError("PDF took too long to open") from e
+    except MemoryError as e:
+        raise PDFExtractionError("PDF exceeded the extraction memory limit") from e
+    except Exception as e:
+        raise PDFExtractionError(str(e)) from e
+
+    on_skipped = on_skipped or (lambda first_page, last_page: None)
+    ranges = [(start, min(start + pages_per_job, page_count)) for start in range(0, page_count, pages_per_job)]
+    futures = [pool.submit(extract_page_range_job, path, start, stop, max_chars, job_timeout) for start, stop in ranges]
+    collected = 0
+    try:
+        for (start, stop), future in zip(ranges, futures):
+            try:
+                range_pages = future.result()
+            except BrokenProcessPool:
+                _reset_pdf_process_pool(pool)
+                on_skipped(start + 1, page_count)
+                return # Every other job on the pool died with the worker
+            except (TimeoutError, MemoryError):
+                on_skipped(start + 1, stop)
+                continue
+            for page_number, text in range_pages:
+                yield page_number, text
+                collected += len(text)
+                if collected >= max_chars:
+                    return
+    finally:
+        for future in futures:
+            future.cancel() # Early stop: queued ranges never start
+
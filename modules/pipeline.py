@@ -0,0 +1,421 @@
+# modules/pipeline.py
+import contextlib
+import functools
+import os
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, replace
+
+from modules import utils, data_extraction, ad_constraints, ai_processing, document_processing, json_stream, run_metrics, stage_cache, token_budget
+from prompts import prompt_assembly, email_prompts, linkedin_prompts, facebook_prompts, google_search_prompts, google_display_prompts
+
+SOURCE_NAMES = {
+    "website": "website content",
+    "additional": "additional context file",
+    "lead_magnet": "lead magnet file",
+}
+GENERAL_SOURCES = ("website", "additional") # Sources feeding context_for_general_ads
+DEMAND_GEN_TASK_KEYS = ("LinkedIn_DG", "Facebook_DG") # The only tasks that wait for the lead magnet summary
+GENERATION_MODES = {
+    "per_stage": "One request per channel and funnel stage",
+    "per_channel": "One request per channel (all funnel stages)",
+    "combined": "One request for every channel",
+}
+TRANSPARENCY_CACHE_ENTRIES = int(os.environ.get("TRANSPARENCY_CACHE_ENTRIES", 16)) # Built documents kept per process
+
+
+@dataclass
+class CampaignInputs:
+    """Validated campaign options shared by every generation request."""
+    client_url: str
+    lead_objective: str
+    content_count: int
+    learn_more_link: str | None = None
+    lead_magnet_download_link: str | None = None
+    objective_specific_link: str | None = None
+
+
+@dataclass
+class PipelineResult:
+    texts: dict = field(default_factory=dict) # source -> extracted text (website) or list of TextChunks (files)
+    summaries: dict = field(default_factory=dict) # source -> AI summary
+    ad_content: dict = field(default_factory=dict) # result key -> parsed JSON (or None on failure)
+    document_inputs: tuple | None = None # Arguments of the transparency document, built on demand by build_transparency_document
+    has_context: bool = False
+    metrics: run_metrics.RunMetrics = field(default_factory=run_metrics.RunMetrics) # Timings, tokens, cost, cache hits
+    constraint_violations: list = field(default_factory=list) # ad_constraints.Violation left after the fix-up request
+
+
+def build_context_strings(website_summary: str | None, additional_summary: str | None, lead_magnet_summary: str | None) -> tuple[str, str]:
+    """Returns (context_for_general_ads, context_for_demand_gen_ads)."""
+    # General context (URL + Additional)
+    general_context_parts = []
+    if website_summary:
+        general_context_parts.append(f"Company Website Summary:\n{website_summary}")
+    if additional_summary:
+        general_context_parts.append(f"Additional Company Context Summary:\n{additional_summary}")
+
+    context_for_general_ads = "\n\n---\n\n".join(general_context_parts) if general_context_parts else "No general company context available."
+
+    # Demand Gen context (URL + Additional + Lead Magnet)
+    demand_gen_context_parts = list(general_context_parts)
+    if lead_magnet_summary:
+        demand_gen_context_parts.append(f"Lead Magnet Summary (Primary Focus for this Ad):\n{lead_magnet_summary}")
+    else: # If no lead magnet summary, DG ads might not be effective, but we can try with general context
+        demand_gen_context_parts.append("NOTE: Lead magnet summary is missing. Ad copy will be based on general company context.")
+
+    context_for_demand_gen_ads = "\n\n---\n\n".join(demand_gen_context_parts)
+    return context_for_general_ads, context_for_demand_gen_ads
+
+
+def _stage_links(campaign: CampaignInputs) -> dict:
+    """Funnel stage code -> (stage name, destination link of its LinkedIn/Facebook ads)."""
+    client_url = campaign.client_url
+    return {
+        "BA": ("Brand Awareness", campaign.learn_more_link or client_url),
+        "DG": ("Demand Gen", campaign.lead_magnet_download_link or client_url),
+        "DC": ("Demand Capture", campaign.objective_specific_link or client_url),
+    }
+
+
+def get_destination_urls(campaign: CampaignInputs) -> dict:
+    """Result key -> the exact destination_url its ads must use."""
+    return {
+        f"{channel}_{key}": link
+        for channel in ("LinkedIn", "Facebook")
+        for key, (_, link) in _stage_links(campaign).items()
+    }
+
+
+def get_generation_task_specs(campaign: CampaignInputs) -> dict:
+    """
+    Returns {result_key: (content_description, build_prompt)} for every channel/stage.
+    `build_prompt(context)` receives the general context, or the demand gen context for
+    the keys in DEMAND_GEN_TASK_KEYS; `build_prompt(None)` returns only the channel/stage
+    instructions, for requests that send the context as a shared prefix (see prompts.prompt_assembly).
+    """
+    client_url = campaign.client_url
+    stages = _stage_links(campaign)
+    specs = {
+        "Email": ("Email Ads", lambda context: email_prompts.get_email_prompt(
+            context, campaign.lead_objective, campaign.objective_specific_link or client_url, campaign.content_count
+        )),
+    }
+
+    channel_ctas = {
+        "LinkedIn": (linkedin_prompts.get_linkedin_prompt, {"BA": "Learn More", "DG": "Download", "DC": "Register, Request Demo"}),
+        "Facebook": (facebook_prompts.get_facebook_prompt, {"BA": "Learn More", "DG": "Download", "DC": "Book Now"}),
+    }
+    for channel, (get_prompt, ctas) in channel_ctas.items():
+        for key, (stage_name, link) in stages.items():
+            if not link and (key == "DG" or key == "DC"): # Ensure critical links are present
+                continue
+            specs[f"{channel}_{key}"] = (f"{channel} {stage_name} Ads", lambda context, get_prompt=get_prompt, stage_name=stage_name, link=link, cta=ctas[key]: get_prompt(
+                context, stage_name, link, cta, campaign.content_count, campaign.lead_objective
+            ))
+
+    specs["GoogleSearch"] = ("Google Search Ads", google_search_prompts.get_google_search_prompt)
+    specs["GoogleDisplay"] = ("Google Display Ads", google_display_prompts.get_google_display_prompt)
+    return specs
+
+
+def _extract_and_summarize(source: str, source_input, client, use_cache: bool, extraction_slots=None) -> tuple[str | list | None, str | None]:
+    """
+    Returns (extracted text, summary). Files are streamed page by page / slide by slide into the
+    summarizer; only the first RAW_TEXT_MAX_CHARS worth of chunks are kept for the transparency document.
+    For files the "extraction" span is the time spent producing chunks and overlaps "summarization".
+    Crawling and producing each file chunk hold one of `extraction_slots` (see run_pipeline).
+    """
+    extraction_slot = extraction_slots or contextlib.nullcontext()
+    if source == "website":
+        with run_metrics.span("extraction", source=source), extraction_slot:
+            text = data_extraction.extract_text_from_site(source_input)
+        if not text:
+            return None, None
+        with run_metrics.span("summarization", source=source):
+            return text, ai_processing.summarize_text(text, client, use_cache=use_cache)
+
+    kept_chunks, kept_chars = [], 0
+    extraction_seconds = 0.0
+
+    def text_pieces():
+        nonlocal kept_chars, extraction_seconds
+        chunks = data_extraction.iter_file_chunks(source_input)
+        while True:
+            started = time.perf_counter()
+            with extraction_slot:
+                chunk = next(chunks, None)
+            extraction_seconds += time.perf_counter() - started
+            if chunk is None:
+                return
+            if kept_chars < document_processing.RAW_TEXT_MAX_CHARS:
+                kept_chunks.append(chunk)
+                kept_chars += len(chunk.text)
+            yield f"{chunk.label}\n{chunk.text}"
+
+    with run_metrics.span("summarization", source=source, streamed=True):
+        summary = ai_processing.summarize_stream(text_pieces(), client, use_cache=use_cache)
+    metrics = run_metrics.current()
+    if metrics:
+        metrics.add_span("extraction", extraction_seconds, source=source, streamed=True)
+    return kept_chunks or None, summary
+
+
+def _create_transparency_document(*args) -> bytes:
+    with run_metrics.span("transparency_document"):
+        return document_processing.create_transparency_document(*args)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_document_cache() -> stage_cache.StageCache:
+    """Process-wide, so sessions and reruns over the same sources share one build."""
+    return stage_cache.StageCache(max_entries=TRANSPARENCY_CACHE_ENTRIES)
+
+
+def build_transparency_document(document_inputs: tuple | None, metrics: run_metrics.RunMetrics | None = None) -> bytes | None:
+    """
+    The transparency document for PipelineResult.document_inputs, with a Run Metrics section if
+    `metrics` is given. Meant to be called when the document is actually wanted (e.g. on
+    download), which keeps building it out of every run. Documents are cached by a fingerprint
+    of their inputs; the metrics section is added per call.
+    """
+    if not document_inputs:
+        return None
+    doc_bytes = _get_document_cache().run(
+        "transparency_document", document_inputs, lambda: _create_transparency_document(*document_inputs)
+    )
+    return document_processing.add_run_metrics_section(doc_bytes, metrics) if metrics else doc_bytes
+
+
+def _run_source_stage(cache: stage_cache.StageCache, source: str, source_input, client, use_cache: bool, extraction_slots=None):
+    """Extraction + summarization of one source, reused while the source content is unchanged."""
+    return cache.run(
+        "source", (source, stage_cache.source_fingerprint(source_input), ai_processing.SUMMARIZER_MODEL, document_processing.RAW_TEXT_MAX_CHARS),
+        lambda: _extract_and_summarize(source, source_input, client, use_cache, extraction_slots),
+        use_cache=use_cache,
+        store_if=lambda output: output[1] is not None,
+    )
+
+
+def _run_generation_stage(cache: stage_cache.StageCache, client, tasks: dict, content_count: int, use_cache: bool, on_item, max_tokens: int, context: str, build_instructions=None) -> dict:
+    """
+    One generation request, reused while its instructions, context and sizes are unchanged (the
+    fixed-size Google sets do not depend on content_count).
+    Reused ad sets are still reported through `on_item`.
+    With `build_instructions(count)` a single large ad set is generated in shards instead
+    (see ai_processing.generate_sharded_ad_set).
+    """
+    def report(ad_sets):
+        for key, ad_set in ad_sets.items():
+            for list_key, item in json_stream.iter_list_items(ad_set):
+                on_item(key, list_key, item)
+
+    if build_instructions:
+        (key, (description, _)), = tasks.items()
+        inputs = (tasks, context, content_count, ai_processing.AI_MODEL, "sharded", ai_processing.GENERATION_SHARD_SIZE)
+        compute = lambda: ai_processing.generate_sharded_ad_set(client, key, description, build_instructions, content_count, use_cache, on_item, context)
+    else:
+        if all(key in token_budget.GOOGLE_LIST_COUNTS for key in tasks): # Fixed size: content_count and max_tokens cannot change the output
+            inputs = (tasks, context, ai_processing.AI_MODEL)
+        else:
+            inputs = (tasks, context, content_count, max_tokens, ai_processing.AI_MODEL)
+        compute = lambda: ai_processing.generate_ad_sets(client, tasks, content_count, use_cache, on_item, max_tokens, context)
+    return cache.run(
+        "generation", inputs, compute,
+        use_cache=use_cache,
+        store_if=lambda ad_sets: all(ad_set is not None for ad_set in ad_sets.values()),
+        on_hit=report if on_item else None,
+    )
+
+
+def _enforce_constraints(result: PipelineResult, client, campaign: CampaignInputs, use_cache: bool, on_notice):
+    """
+    Checks the generated ads against the platform rules in ad_constraints. Wrong destination URLs
+    are corrected locally; the other violating items go back in one batched fix-up request.
+    """
+    destination_urls = get_destination_urls(campaign)
+    url_fixes = ad_constraints.fix_destination_urls(result.ad_content, destination_urls)
+    violations = ad_constraints.check_ad_content(result.ad_content, campaign.content_count, destination_urls)
+    fixed = ai_processing.fix_constraint_violations(client, result.ad_content, violations, use_cache, destination_urls) if violations else 0
+    if fixed:
+        violations = ad_constraints.check_ad_content(result.ad_content, campaign.content_count, destination_urls)
+    result.constraint_violations = violations
+    if url_fixes or fixed:
+        on_notice("info", f"Fixed {url_fixes + fixed} ads that broke platform limits.")
+    if violations:
+        shown = "; ".join(ad_constraints.format_violation(violation) for violation in violations[:5])
+        on_notice("warning", f"{len(violations)} platform limit problems remain: {shown}" + ("; ..." if len(violations) > 5 else ""))
+
+
+def plan_generation_groups(keys, mode: str = "per_stage") -> list[tuple]:
+    """Groups result keys into requests: one key each, one group per channel, or a single group."""
+    if mode == "per_stage":
+        return [(key,) for key in keys]
+    if mode == "per_channel":
+        channels = {}
+        for key in keys:
+            channels.setdefault(key.split("_")[0], []).append(key)
+        return [tuple(channel_keys) for channel_keys in channels.values()]
+    if mode == "combined":
+        return [tuple(keys)]
+    raise ValueError(f"Unknown generation mode '{mode}'. Choose one of: {', '.join(GENERATION_MODES)}")
+
+
+def run_pipeline(client, campaign: CampaignInputs, sources: dict, on_progress=None, on_notice=None, use_cache: bool = True, on_ad=None, generation_mode: str = "per_stage", stages: stage_cache.StageCache | None = None, extraction_slots=None) -> PipelineResult:
+    """
+    Runs extraction -> summarization -> generation with every independent step in parallel.
+
+    `sources` maps "website" / "additional" / "lead_magnet" to a URL, an uploaded file or a file
+    path (missing or None entries are skipped). Generation for a channel starts as soon as the summaries it
+    needs exist: everything except Demand Gen only waits for the website and additional context,
+    Demand Gen also waits for the lead magnet. The transparency document is not built here:
+    result.document_inputs holds what build_transparency_document needs once it is wanted.
+
+    `on_progress(fraction, text)` and `on_notice(level, message)` are called from the calling
+    thread; `level` is one of "success", "info", "warning" or "error".
+    `use_cache=False` bypasses the persistent LLM response cache for every call.
+    `on_ad(result_key, list_key, item)`, if given, streams the generation calls and is called
+    (also from the calling thread) for every ad as soon as it has been generated.
+    `generation_mode` (see GENERATION_MODES) batches several channels/stages into one request;
+    results are split back into the usual ad_content keys. A request that includes a Demand Gen
+    stage waits for every source and uses the demand gen context. A single ad set of more than
+    ai_processing.GENERATION_SHARD_SIZE variations is generated in parallel shards and
+    near-duplicates are removed (see ai_processing.generate_sharded_ad_set).
+    Stage timings, per-call token usage and cost, and cache hits are collected in result.metrics,
+    finished when the pipeline returns (callers doing more work call result.metrics.finish() again).
+    Finished ads are checked against the platform limits in ad_constraints; violating items are
+    rewritten in one batched request and whatever still breaks a rule is in
+    result.constraint_violations.
+
+    `stages` keeps stage outputs between runs (see stage_cache.StageCache): a source whose
+    content is unchanged is neither extracted nor summarized again, and only the generation
+    requests whose instructions or context changed are sent, e.g. a new lead magnet link only
+    regenerates the Demand Gen ads. `use_cache=False` recomputes every stage.
+
+    `extraction_slots`, a threading.Semaphore shared by concurrent runs (e.g. the batch runner's),
+    bounds how many of them crawl or parse files at once; summarization and generation are not
+    limited by it.
+    """
+    result = PipelineResult()
+    with run_metrics.activate(result.metrics):
+        _run_pipeline(result, client, campaign, sources, on_progress, on_notice, use_cache, on_ad, generation_mode, stages if stages is not None else stage_cache.StageCache(), extraction_slots)
+    result.metrics.finish()
+    reused, recomputed = (result.metrics.cache_events.get(("stage", outcome), 0) for outcome in ("hit", "miss"))
+    if reused and on_notice:
+        on_notice("info", f"Reused {reused} of {reused + recomputed} pipeline stages from earlier runs.")
+    return result
+
+
+def _run_pipeline(result: PipelineResult, client, campaign: CampaignInputs, sources: dict, on_progress, on_notice, use_cache: bool, on_ad, generation_mode: str, stages: stage_cache.StageCache, extraction_slots):
+    on_progress = on_progress or (lambda fraction, text: None)
+    on_notice = on_notice or (lambda level, message: None)
+
+    specs = get_generation_task_specs(campaign)
+    groups = plan_generation_groups(list(specs), generation_mode)
+    sources = {name: value for name, value in sources.items() if value}
+    total_steps = len(sources) + len(specs)
+    completed_steps = 0
+
+    def step_done(text):
+        nonlocal completed_steps
+        completed_steps += 1
+        on_progress(min(completed_steps / total_steps, 1.0), text)
+
+    if not sources:
+        on_notice("error", "No context sources were provided.")
+        return
+
+    with utils.make_thread_pool(len(SOURCE_NAMES) + ai_processing.GENERATION_MAX_WORKERS) as executor:
+        pending = {}
+        for source, source_input in sources.items():
+            pending[executor.submit(_run_source_stage, stages, source, source_input, client, use_cache, extraction_slots)] = ("source", source)
+        on_progress(0.0, "Extracting and summarizing context...")
+
+        general_submitted = False
+        demand_gen_submitted = False
+
+        # Streamed ads are handed over from the worker threads through this queue
+        streamed_ads = queue.Queue()
+
+        def submit_generation(groups, context):
+            if not groups:
+                return
+            tasks = {keys: {key: (specs[key][0], specs[key][1](None)) for key in keys} for keys in groups}
+            # The context goes first in every request, so it is trimmed once for the longest
+            # instructions: each call then shares the same cacheable prompt prefix
+            instruction_tokens = max(
+                token_budget.count_tokens(
+                    group_tasks[keys[0]][1] if len(keys) == 1 else prompt_assembly.build_combined_instructions(group_tasks),
+                    ai_processing.AI_MODEL,
+                )
+                for keys, group_tasks in tasks.items()
+            )
+            context_budget = max(token_budget.GENERATION_PROMPT_TOKENS - instruction_tokens, token_budget.MIN_CONTEXT_TOKENS)
+            context_tokens = token_budget.count_tokens(context, ai_processing.AI_MODEL)
+            if context_tokens > context_budget:
+                context = token_budget.trim_context(context, context_budget, ai_processing.AI_MODEL)
+                on_notice("warning", f"Context trimmed from {context_tokens} to {context_budget} tokens to fit the generation prompt.")
+            on_item = (lambda key, list_key, item: streamed_ads.put((key, list_key, item))) if on_ad else None
+            for keys in groups:
+                max_tokens = sum(token_budget.estimate_output_tokens(key, campaign.content_count) for key in keys)
+                build_instructions = None
+                if len(keys) == 1 and ai_processing.is_sharded(keys[0], campaign.content_count):
+                    # Same instructions, asking for the shard's number of variations
+                    build_instructions = lambda count, key=keys[0]: get_generation_task_specs(replace(campaign, content_count=count))[key][1](None)
+                future = executor.submit(
+                    _run_generation_stage, stages, client, tasks[keys], campaign.content_count, use_cache, on_item, max_tokens, context, build_instructions
+                )
+                pending[future] = ("generate", keys)
+
+        def report_streamed_ads():
+            while not streamed_ads.empty():
+                on_ad(*streamed_ads.get_nowait())
+
+        while pending:
+            done, _ = wait(pending, timeout=0.2 if on_ad else None, return_when=FIRST_COMPLETED)
+            if on_ad:
+                report_streamed_ads()
+            for future in done:
+                kind, name = pending.pop(future)
+                if kind == "source":
+                    text, summary = future.result()
+                    result.texts[name], result.summaries[name] = text, summary
+                    if summary:
+                        on_notice("success", f"{SOURCE_NAMES[name].capitalize()} processed.")
+                    else:
+                        on_notice("warning", f"Could not extract text from {SOURCE_NAMES[name]}.")
+                    step_done(f"Summarized {SOURCE_NAMES[name]}.")
+                elif kind == "generate":
+                    result.ad_content.update(future.result())
+                    for key in name:
+                        step_done(f"Generated {specs[key][0]}.")
+
+            sources_left = {name for kind, name in pending.values() if kind == "source"}
+            general_ready = not (sources_left & set(GENERAL_SOURCES))
+            has_general_summary = any(result.summaries.get(name) for name in GENERAL_SOURCES)
+            result.has_context = any(result.summaries.values())
+
+            if not general_submitted and general_ready and (has_general_summary or not sources_left):
+                if not sources_left and not result.has_context:
+                    on_notice("error", "No context could be summarized. Please provide valid inputs.")
+                    return
+                general_context, _ = build_context_strings(result.summaries.get("website"), result.summaries.get("additional"), None)
+                submit_generation([keys for keys in groups if not set(keys) & set(DEMAND_GEN_TASK_KEYS)], general_context)
+                general_submitted = True
+
+            if not demand_gen_submitted and general_submitted and not sources_left:
+                _, demand_gen_context = build_context_strings(
+                    result.summaries.get("website"), result.summaries.get("additional"), result.summaries.get("lead_magnet")
+                )
+                submit_generation([keys for keys in groups if set(keys) & set(DEMAND_GEN_TASK_KEYS)], demand_gen_context)
+                website_text = result.texts.get("website")
+                result.document_inputs = (
+                    campaign.client_url,
+                    website_text[:document_processing.RAW_TEXT_MAX_CHARS] if website_text else None, result.summaries.get("website"),
+                    result.texts.get("additional"), result.summaries.get("additional"),
+                    result.texts.get("lead_magnet"), result.summaries.get("lead_magnet"),
+                )
+                demand_gen_submitted = True
+
+    _enforce_constraints(result, client, campaign, use_cache, on_notice)
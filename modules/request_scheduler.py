@@ -0,0 +1,212 @@
+# modules/request_scheduler.py
+import email.utils
+import functools
+import os
+import random
+import threading
+import time
+
+import openai
+
+# Account limits for the OpenAI project; override per deployment with environment variables.
+REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_RPM_LIMIT", 500))
+TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TPM_LIMIT", 200_000))
+MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 16))
+INITIAL_CONCURRENCY = int(os.environ.get("OPENAI_INITIAL_CONCURRENCY", 8))
+MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 5))
+DEFAULT_OUTPUT_TOKENS = 1000 # Assumed completion size for requests without max_tokens
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `capacity` per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        """Blocks until `amount` tokens are available, then takes them."""
+        amount = min(amount, self.capacity) # A single oversized request must still get through eventually
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_seconds = (amount - self.tokens) / self.refill_per_second
+            time.sleep(wait_seconds)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and connection errors are worth retrying."""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+def get_retry_after_seconds(error: Exception) -> float | None:
+    """Reads Retry-After / retry-after-ms from an API error response, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after) # HTTP-date form
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RequestScheduler:
+    """
+    Shared gate for every OpenAI request in the process.
+
+    - Token buckets enforce requests-per-minute and tokens-per-minute budgets.
+    - Retryable failures (429/5xx/connection) back off exponentially with full jitter,
+      honoring Retry-After when the API sends it.
+    - The number of in-flight requests adapts AIMD-style: +1 slot per window of successful
+      requests at healthy latency, halved on throttling and trimmed when latency degrades.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        max_concurrency: int = MAX_CONCURRENCY,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        min_concurrency: int = 1,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        latency_tolerance: float = 2.0,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_tolerance = latency_tolerance # Per-token latency above tolerance x baseline counts as congestion
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.throttled_count = 0
+        self.retry_count = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0 # Served from the provider's prompt-prefix cache
+        self.completion_tokens = 0
+        self._condition = threading.Condition()
+
+    def _acquire_slot(self):
+        with self._condition:
+            while self.in_flight >= int(self.concurrency_limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def _release_slot(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        with self._condition:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.cached_prompt_tokens += get_cached_tokens(usage) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def _on_success(self, latency_per_token: float | None):
+        with self._condition:
+            baseline = self.latency_ewma
+            if latency_per_token is not None:
+                self.latency_ewma = latency_per_token if baseline is None else 0.8 * baseline + 0.2 * latency_per_token
+            if baseline is not None and latency_per_token is not None and latency_per_token > self.latency_tolerance * baseline:
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * 0.9)
+            else:
+                # Additive increase: roughly +1 slot after `limit` successful requests
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._condition.notify_all()
+
+    def _on_throttled(self):
+        with self._condition:
+            self.throttled_count += 1
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2.0)
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = get_retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))) # Full jitter
+
+    def run(self, request_fn, estimated_tokens: int = 1000):
+        """Calls `request_fn()` under the rate limits, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot()
+            try:
+                self.request_bucket.acquire(1)
+                self.token_bucket.acquire(estimated_tokens)
+                started = time.monotonic()
+                result = request_fn()
+            except Exception as e:
+                self._release_slot()
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    raise
+                if getattr(e, "status_code", None) == 429:
+                    self._on_throttled()
+                with self._condition:
+                    self.retry_count += 1
+                time.sleep(self._backoff_delay(attempt, e))
+                continue
+            self._release_slot()
+            self._record_usage(getattr(result, "usage", None))
+            # Output length dominates completion latency, so compare seconds per generated token
+            completion_tokens = getattr(getattr(result, "usage", None), "completion_tokens", None)
+            self._on_success((time.monotonic() - started) / completion_tokens if completion_tokens else None)
+            return result
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "concurrency_limit": int(self.concurrency_limit),
+                "in_flight": self.in_flight,
+                "retries": self.retry_count,
+                "throttled": self.throttled_count,
+                "seconds_per_token_ewma": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "prompt_cache_hit_rate": round(self.cached_prompt_tokens / self.prompt_tokens, 3) if self.prompt_tokens else None,
+            }
+
+
+def get_cached_tokens(usage) -> int | None:
+    """Prompt tokens the provider served from its prefix cache (usage.prompt_tokens_details.cached_tokens)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
+
+
+@functools.lru_cache(maxsize=None)
+def get_request_scheduler() -> RequestScheduler:
+    """Process-wide scheduler shared by the app, the batch runner and every worker thread."""
+    return RequestScheduler()
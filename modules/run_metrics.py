@@ -0,0 +1,205 @@
+# modules/run_metrics.py
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+# USD per 1M tokens: (input, cached input, output). Update when pricing changes.
+MODEL_PRICES = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+METRIC_PREFIX = "danskvand"
+
+_current_metrics = contextvars.ContextVar("run_metrics", default=None)
+
+
+def estimate_cost(model: str | None, prompt_tokens: int, cached_tokens: int, completion_tokens: int, price_factor: float = 1.0) -> float | None:
+    """Estimated USD cost of one call, or None for a model missing from MODEL_PRICES."""
+    prices = MODEL_PRICES.get(model or "")
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    cost = (prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price + completion_tokens * output_price
+    return cost / 1_000_000 * price_factor
+
+
+def _prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+class RunMetrics:
+    """
+    Instrumentation for one pipeline run: timed spans per stage, one record per LLM call (tokens,
+    estimated cost, response-cache hit) and cache hit/miss counts. Thread-safe; worker threads
+    reach the active instance through current() (see utils.make_thread_pool). The run's wall time
+    ends at the last finish() call, so reading the metrics later does not add to it.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.finished_at = None
+        self._finished = None
+        self.spans = [] # {"name", "start", "seconds", **attrs}; start is seconds since the run began
+        self.calls = [] # One dict per chat completion, see record_call
+        self.cache_events = {} # (cache, "hit" | "miss") -> count
+        self._lock = threading.Lock()
+
+    def finish(self):
+        """Marks the end of the run; call again after extra work (e.g. exports) to extend it."""
+        with self._lock:
+            self.finished_at, self._finished = time.time(), time.perf_counter()
+
+    def duration(self) -> float:
+        """Wall time of the run: up to finish(), or so far while it is still running."""
+        with self._lock:
+            finished = self._finished
+        return (finished if finished is not None else time.perf_counter()) - self._started
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """Times the block as a `name` span (recorded even if it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - started, started, **attrs)
+
+    def add_span(self, name: str, seconds: float, started: float | None = None, **attrs):
+        """Records a span measured elsewhere, e.g. time spent inside a generator."""
+        start = (started if started is not None else time.perf_counter() - seconds) - self._started
+        with self._lock:
+            self.spans.append({"name": name, "start": round(start, 4), "seconds": round(seconds, 4), **attrs})
+
+    def record_call(self, label: str, model: str | None, prompt_tokens: int, completion_tokens: int, cached_tokens: int, seconds: float, cache_hit: bool, price_factor: float = 1.0):
+        """One chat completion. Response-cache hits cost nothing and are recorded with zero tokens."""
+        cost = 0.0 if cache_hit else estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens, price_factor)
+        with self._lock:
+            self.calls.append({
+                "label": label, "model": model, "cache_hit": cache_hit, "seconds": round(seconds, 4),
+                "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "completion_tokens": completion_tokens,
+                "cost_usd": None if cost is None else round(cost, 8),
+            })
+        self.record_cache("llm_response", cache_hit)
+
+    def record_cache(self, cache: str, hit: bool):
+        with self._lock:
+            key = (cache, "hit" if hit else "miss")
+            self.cache_events[key] = self.cache_events.get(key, 0) + 1
+
+    def stage_totals(self) -> dict:
+        """{span name: {"count", "seconds"}} in order of first appearance."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                stage = totals.setdefault(span["name"], {"count": 0, "seconds": 0.0})
+                stage["count"] += 1
+                stage["seconds"] = round(stage["seconds"] + span["seconds"], 4)
+        return totals
+
+    def totals(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+            cache_events = dict(self.cache_events)
+        prompt_tokens = sum(call["prompt_tokens"] for call in calls)
+        cached_tokens = sum(call["cached_tokens"] for call in calls)
+        costs = [call["cost_usd"] for call in calls]
+        cache_hit_rates = {}
+        for cache in sorted({cache for cache, _ in cache_events}):
+            hits, misses = cache_events.get((cache, "hit"), 0), cache_events.get((cache, "miss"), 0)
+            cache_hit_rates[cache] = hits / (hits + misses)
+        return {
+            "seconds": round(self.duration(), 4),
+            "llm_calls": len(calls),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            "prompt_cache_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "cost_usd": round(sum(cost for cost in costs if cost is not None), 6),
+            "cost_complete": None not in costs, # False if some model had no price
+            "cache_hit_rates": cache_hit_rates,
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans, calls = list(self.spans), list(self.calls)
+            cache_events = [{"cache": cache, "result": result, "count": count} for (cache, result), count in self.cache_events.items()]
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "totals": self.totals(),
+            "stages": self.stage_totals(),
+            "spans": spans,
+            "calls": calls,
+            "cache_events": cache_events,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (e.g. for a textfile collector or pushgateway)."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{_prometheus_labels(labels)} {value:.10g}")
+
+        stages = self.stage_totals()
+        with self._lock:
+            calls = list(self.calls)
+            cache_events = dict(self.cache_events)
+        requests, tokens, costs = {}, {}, {}
+        for call in calls:
+            model = call["model"] or "unknown"
+            cache = "hit" if call["cache_hit"] else "miss"
+            requests[(model, cache)] = requests.get((model, cache), 0) + 1
+            for kind in ("prompt", "cached", "completion"):
+                tokens[(model, kind)] = tokens.get((model, kind), 0) + call[f"{kind}_tokens"]
+            costs[model] = costs.get(model, 0.0) + (call["cost_usd"] or 0.0)
+
+        metric("run_duration_seconds", "gauge", "Wall time of the run (so far, if it has not finished).", [({}, self.duration())])
+        metric("stage_duration_seconds_total", "counter", "Time spent per pipeline stage, summed over its spans.", [({"stage": name}, stage["seconds"]) for name, stage in stages.items()])
+        metric("stage_spans_total", "counter", "Number of spans per pipeline stage.", [({"stage": name}, stage["count"]) for name, stage in stages.items()])
+        metric("llm_requests_total", "counter", "Chat completions, by model and response-cache result.", [({"model": model, "cache": cache}, count) for (model, cache), count in requests.items()])
+        metric("llm_tokens_total", "counter", "Tokens billed, by model and kind (cached is part of prompt).", [({"model": model, "kind": kind}, count) for (model, kind), count in tokens.items()])
+        metric("llm_cost_usd_total", "counter", "Estimated cost in USD, by model.", [({"model": model}, cost) for model, cost in costs.items()])
+        metric("cache_lookups_total", "counter", "Cache lookups, by cache and result.", [({"cache": cache, "result": result}, count) for (cache, result), count in cache_events.items()])
+        return "\n".join(lines) + "\n"
+
+
+def current() -> RunMetrics | None:
+    """The RunMetrics of the run this thread works for, if any."""
+    return _current_metrics.get()
+
+
+@contextlib.contextmanager
+def activate(metrics: RunMetrics):
+    """Makes `metrics` the current() instance for this thread and the pools it starts."""
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def span(name: str, **attrs):
+    """RunMetrics.span on the current run; does nothing outside a run."""
+    metrics = current()
+    return metrics.span(name, **attrs) if metrics else contextlib.nullcontext()
+
+
+def record_cache(cache: str, hit: bool):
+    metrics = current()
+    if metrics:
+        metrics.record_cache(cache, hit)
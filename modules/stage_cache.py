@@ -0,0 +1,104 @@
+# modules/stage_cache.py
+import copy
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from modules import run_metrics
+
+STAGE_CACHE_MAX_ENTRIES = int(os.environ.get("STAGE_CACHE_MAX_ENTRIES", 128))
+STAGE_CACHE_TTL_SECONDS = float(os.environ.get("STAGE_CACHE_TTL_SECONDS", 3600)) # Websites change: recrawl after this
+
+
+def _encode(value):
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(value).hexdigest()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Cannot fingerprint {type(value).__name__}")
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of JSON-like values (dataclasses, bytes and sets included)."""
+    payload = json.dumps(parts, default=_encode, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def source_fingerprint(source_input) -> str:
+    """
+    Identifies a context source by content: an uploaded file by its bytes, a file path by its
+    size and modification time, and a URL by itself.
+    """
+    if hasattr(source_input, "getbuffer"): # Streamlit UploadedFile / BytesIO
+        return fingerprint(getattr(source_input, "name", ""), source_input.getbuffer())
+    if isinstance(source_input, str) and os.path.isfile(source_input):
+        stat = os.stat(source_input)
+        return fingerprint(os.path.abspath(source_input), stat.st_size, stat.st_mtime_ns)
+    return fingerprint(source_input)
+
+
+class StageCache:
+    """
+    Outputs of pipeline stages keyed by a fingerprint of their exact inputs. A stage's inputs
+    include the outputs of the stages it depends on (a summary is keyed by its source, a
+    generation request by its instructions and context, a report by the ad sets), so a changed
+    input invalidates exactly the stages downstream of it and everything else is reused.
+
+    In memory with LRU eviction and a TTL; the app keeps one per browser session.
+    """
+
+    def __init__(self, max_entries: int = STAGE_CACHE_MAX_ENTRIES, ttl_seconds: float = STAGE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (stored at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value) # Callers may mutate what they get back
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def run(self, stage: str, inputs: tuple, compute, use_cache: bool = True, store_if=None, on_hit=None):
+        """
+        Returns the stored output of `stage` for `inputs`, or computes it with `compute()` and
+        stores it if `store_if(output)` (default: not None) holds, so failures are retried next
+        time. `use_cache=False` recomputes but still stores. `on_hit(output)` runs on reuse.
+        Hits and misses are counted on the current run_metrics run as the "stage" cache.
+        """
+        key = fingerprint(stage, *inputs)
+        if use_cache:
+            output = self.get(key)
+            if output is not None:
+                run_metrics.record_cache("stage", True)
+                if on_hit:
+                    on_hit(output)
+                return output
+        run_metrics.record_cache("stage", False)
+        output = compute()
+        if (store_if or (lambda value: value is not None))(output):
+            self.set(key, output)
+        return output
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
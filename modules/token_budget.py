@@ -0,0 +1,122 @@
+# modules/token_budget.py
+import functools
+import math
+import os
+
+from modules import ad_records
+
+try:
+    import tiktoken
+except ImportError: # Optional: without it, token counts are estimated from characters
+    tiktoken = None
+
+DEFAULT_ENCODING = "o200k_base" # gpt-4o / gpt-4.1 family
+CHARS_PER_TOKEN = 4 # Fallback estimate for English prose
+MESSAGE_OVERHEAD_TOKENS = 3 # Role/separator tokens the chat format adds per message
+REPLY_PRIMING_TOKENS = 3
+
+# Per-call input budgets
+SUMMARY_INPUT_TOKENS = int(os.environ.get("SUMMARY_INPUT_TOKENS", 8000)) # One summarization call (map or reduce)
+GENERATION_PROMPT_TOKENS = int(os.environ.get("GENERATION_PROMPT_TOKENS", 6000)) # One ad generation request, context included
+MIN_CONTEXT_TOKENS = int(os.environ.get("MIN_CONTEXT_TOKENS", 1500)) # Context kept however long the instructions get
+
+# Output sizing: generous upper bounds per ad field, from the limits the prompts ask for
+FIELD_MAX_CHARS = {
+    "headline": 90,
+    "subject_line": 90,
+    "body": 1500,
+    "cta": 40,
+    "introductory_text": 450,
+    "primary_text": 450,
+    "image_copy": 80,
+    "destination_url": 200,
+    "cta_button": 40,
+    "link_description": 40,
+    "description": 90,
+}
+# Google sets are fixed-size parallel lists instead of content_count ads
+GOOGLE_LIST_COUNTS = {
+    "GoogleSearch": {"headlines": (15, 30), "descriptions": (4, 90)}, # list key -> (items, max chars per item)
+    "GoogleDisplay": {"headlines": (5, 30), "descriptions": (5, 90)},
+}
+OUTPUT_CHARS_PER_TOKEN = 3 # Conservative: ad copy is dense with emojis, URLs and punctuation
+OUTPUT_HEADROOM = 1.25
+OUTPUT_BASE_TOKENS = 50 # JSON wrapper and list key
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str | None):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError: # Model newer than the installed tiktoken
+        pass
+    except Exception: # Encoding files not downloadable (offline)
+        return None
+    try:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Exact token count with tiktoken, otherwise a ~4 characters per token estimate."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list, model: str | None = None) -> int:
+    """Prompt tokens of a chat request, including the per-message formatting overhead."""
+    return sum(count_tokens(message.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS for message in messages) + REPLY_PRIMING_TOKENS
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str | None = None) -> str:
+    """Cuts text to at most `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def max_tokens_for_chars(max_chars: int) -> int:
+    """Output allowance for a free-text answer of at most `max_chars` characters."""
+    return math.ceil(max_chars / OUTPUT_CHARS_PER_TOKEN * OUTPUT_HEADROOM)
+
+
+def trim_context(context: str, budget_tokens: int, model: str | None = None, separator: str = "\n\n---\n\n") -> str:
+    """
+    Trims a context made of `separator`-joined summaries to `budget_tokens`. The longest summary
+    is cut first so no source (e.g. the lead magnet at the end) is dropped entirely.
+    """
+    overflow = count_tokens(context, model) - budget_tokens
+    if overflow <= 0:
+        return context
+
+    parts = context.split(separator)
+    part_tokens = [count_tokens(part, model) for part in parts]
+    while overflow > 0 and max(part_tokens) > 1:
+        longest = part_tokens.index(max(part_tokens))
+        cut = min(overflow, part_tokens[longest] - 1)
+        parts[longest] = truncate_to_tokens(parts[longest], part_tokens[longest] - cut, model)
+        part_tokens[longest] -= cut
+        overflow -= cut
+    return separator.join(parts)
+
+
+def estimate_output_tokens(result_key: str, content_count: int) -> int:
+    """max_tokens for one generation call: ads requested x per-field character limits, in tokens."""
+    if result_key in GOOGLE_LIST_COUNTS:
+        chars = sum(items * (max_chars + 4) for items, max_chars in GOOGLE_LIST_COUNTS[result_key].values())
+    else:
+        _, _, _, fields = ad_records.AD_SET_SPECS[result_key]
+        chars_per_ad = sum(FIELD_MAX_CHARS[field] + len(field) + 6 for field in fields) # + quotes, colon, comma
+        chars = content_count * chars_per_ad
+    return OUTPUT_BASE_TOKENS + math.ceil(chars / OUTPUT_CHARS_PER_TOKEN * OUTPUT_HEADROOM)
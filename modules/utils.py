@@ -1,6 +1,10 @@
+import contextlib
+import contextvars
 import re
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import tldextract # For robust domain name extraction
 
 def validate_and_format_url(url_string: str) -> str | None:
@@ -51,4 +55,46 @@ def sanitize_for_filename(text: str) -> str:
     text = text.lower()
     text = re.sub(r'\s+', '_', text) # Replace spaces with underscores
     text = re.sub(r'[^\w\-.]', '', text) # Remove non-alphanumeric characters except _ and -
-    return text[:50] # Limit length
\ No newline at end of file
+    return text[:50] # Limit length
+
+_notice_sink = contextvars.ContextVar("notice_sink", default=None)
+
+def notify(level: str, message: str):
+    """
+    Shows a message on the page with st.error / st.warning / st.info / st.success, or hands
+    (level, message) to the sink installed with capture_notices, e.g. for code that runs on a
+    background job's threads, where st.* calls reach no page.
+    """
+    sink = _notice_sink.get()
+    if sink:
+        sink(level, message)
+    else:
+        getattr(st, level)(message)
+
+@contextlib.contextmanager
+def capture_notices(sink):
+    """Routes notify() calls of this thread and the pools it starts (see make_thread_pool) to `sink(level, message)`."""
+    token = _notice_sink.set(sink)
+    try:
+        yield
+    finally:
+        _notice_sink.reset(token)
+
+class _ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Runs each task in a copy of the submitting thread's contextvars (e.g. run_metrics.current())."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def make_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """
+    Returns a ThreadPoolExecutor whose workers are attached to the current Streamlit
+    script run, so st.error/st.warning (and utils.notify) calls made inside them still reach the page.
+    Works outside of Streamlit too (the context is simply None). Tasks also see the
+    submitting thread's context variables, such as the active run_metrics.RunMetrics.
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return _ContextThreadPoolExecutor(max_workers=max_workers)
+    return _ContextThreadPoolExecutor(max_workers=max_workers, initializer=add_script_run_ctx, initargs=(None, ctx))
@@ -0,0 +1,251 @@
+# modules/web_crawler.py
+import hashlib
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from urllib.parse import urljoin, urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from modules import html_extraction, run_metrics, utils
+
+CRAWL_MAX_PAGES = 15
+CRAWL_MAX_DEPTH = 2 # Homepage is depth 0
+CRAWL_MAX_WORKERS = 8
+CRAWL_PER_HOST_LIMIT = 4 # Simultaneous requests to one host
+REQUEST_TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (compatible; DanskvandAdGenerator/1.0)"
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", os.path.join(".cache", "http"))
+MAX_SITEMAP_FILES = 5 # Nested sitemaps followed from a sitemap index
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json", ".xml",
+    ".zip", ".mp4", ".mp3", ".mov", ".doc", ".docx", ".ppt", ".pptx", ".xls", ".xlsx",
+)
+
+
+class HTTPCache:
+    """
+    On-disk HTTP cache: one metadata JSON and one body file per URL. Entries are revalidated
+    with If-None-Match / If-Modified-Since, so unchanged pages cost a 304 instead of a download.
+    """
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+    def get(self, url: str) -> tuple[dict, bytes] | None:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url: str, response: requests.Response):
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type", ""),
+            "fetched_at": time.time(),
+        }
+        if not (meta["etag"] or meta["last_modified"]):
+            return # Nothing to revalidate with
+        meta_path, body_path = self._paths(url)
+        for path, data, mode in ((body_path, response.content, "wb"), (meta_path, json.dumps(meta), "w")):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, path) # Atomic, so concurrent crawls never read half a file
+
+
+def create_session(pool_size: int = CRAWL_MAX_WORKERS) -> requests.Session:
+    """One pooled, keep-alive session per crawl."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def fetch(session: requests.Session, url: str, cache: HTTPCache | None) -> tuple[bytes, str] | None:
+    """GETs a URL, revalidating a cached copy if there is one. Returns (body, content_type)."""
+    cached = cache.get(url) if cache else None
+    headers = {}
+    if cached:
+        meta, _ = cached
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if cache:
+        run_metrics.record_cache("http", response.status_code == 304 and cached is not None)
+    if response.status_code == 304 and cached:
+        meta, body = cached
+        return body, meta.get("content_type", "")
+    response.raise_for_status()
+    if cache:
+        cache.store(url, response)
+    return response.content, response.headers.get("Content-Type", "")
+
+
+def normalize_url(url: str) -> str:
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    if path != "/" and path.endswith("/"):
+        path = path.rstrip("/")
+    return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), path=path).geturl()
+
+
+def _same_site(url: str, start_url: str) -> bool:
+    host, start_host = urlparse(url).netloc.lower(), urlparse(start_url).netloc.lower()
+    return host.removeprefix("www.") == start_host.removeprefix("www.")
+
+
+def _is_crawlable(url: str, start_url: str) -> bool:
+    parsed = urlparse(url)
+    return (
+        parsed.scheme in ("http", "https")
+        and _same_site(url, start_url)
+        and not parsed.path.lower().endswith(SKIPPED_EXTENSIONS)
+    )
+
+
+def load_robots(session: requests.Session, start_url: str) -> RobotFileParser | None:
+    """Fetches robots.txt; None means no usable robots file (everything allowed)."""
+    robots_url = urljoin(start_url, "/robots.txt")
+    try:
+        response = session.get(robots_url, timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    robots = RobotFileParser(robots_url)
+    robots.parse(response.text.splitlines())
+    return robots
+
+
+def discover_sitemap_urls(session: requests.Session, start_url: str, robots: RobotFileParser | None, cache: HTTPCache | None) -> list[str]:
+    """Page URLs listed in the site's sitemap(s), following one level of sitemap index."""
+    sitemap_urls = list((robots.site_maps() if robots else None) or [urljoin(start_url, "/sitemap.xml")])
+    page_urls = []
+    fetched_sitemaps = 0
+    while sitemap_urls and fetched_sitemaps < MAX_SITEMAP_FILES:
+        sitemap_url = sitemap_urls.pop(0)
+        fetched_sitemaps += 1
+        try:
+            body, _ = fetch(session, sitemap_url, cache)
+            root = ET.fromstring(body)
+        except (requests.exceptions.RequestException, ET.ParseError):
+            continue
+        for loc in root.iter():
+            if not loc.tag.endswith("loc") or not loc.text:
+                continue
+            if root.tag.endswith("sitemapindex"):
+                sitemap_urls.append(loc.text.strip())
+            else:
+                page_urls.append(loc.text.strip())
+    return page_urls
+
+
+def crawl_site(
+    start_url: str,
+    max_pages: int = CRAWL_MAX_PAGES,
+    max_depth: int = CRAWL_MAX_DEPTH,
+    max_workers: int = CRAWL_MAX_WORKERS,
+    per_host_limit: int = CRAWL_PER_HOST_LIMIT,
+    use_sitemap: bool = True,
+    respect_robots: bool = True,
+    page_parser=None,
+    cache: HTTPCache | None = None,
+) -> list[dict]:
+    """
+    Crawls a site breadth-first from `start_url` and returns [{"url": ..., "text": ...}] per page.
+
+    Pages are fetched level by level on a bounded thread pool sharing one pooled session, with
+    at most `per_host_limit` requests in flight per host. Sitemap URLs seed depth 1, robots.txt
+    is honored, and responses are revalidated against the on-disk HTTP cache. Pages whose text
+    duplicates an earlier page (e.g. the same page under two URLs) are dropped.
+    `page_parser(html_bytes, page_url)` returns (text, links); defaults to html_extraction.parse_page,
+    so each page is parsed only once.
+    """
+    page_parser = page_parser or (lambda html, page_url: html_extraction.parse_page(html, base_url=page_url))
+    cache = cache if cache is not None else HTTPCache()
+    session = create_session(max_workers)
+    host_limits = defaultdict(lambda: threading.Semaphore(per_host_limit))
+    host_limits_lock = threading.Lock()
+
+    robots = load_robots(session, start_url) if respect_robots else None
+
+    def allowed(url: str) -> bool:
+        return robots is None or robots.can_fetch(USER_AGENT, url)
+
+    def fetch_page(url: str):
+        with host_limits_lock:
+            host_limit = host_limits[urlparse(url).netloc]
+        with host_limit:
+            try:
+                body, content_type = fetch(session, url, cache)
+            except requests.exceptions.RequestException:
+                return url, None
+        if content_type and "html" not in content_type.lower():
+            return url, None
+        return url, body
+
+    start_url = normalize_url(start_url)
+    seen = {start_url}
+    frontier = [start_url]
+    sitemap_urls = []
+    if use_sitemap:
+        sitemap_urls = [
+            normalize_url(url) for url in discover_sitemap_urls(session, start_url, robots, cache)
+            if _is_crawlable(url, start_url)
+        ]
+
+    pages, seen_texts = [], set()
+    with utils.make_thread_pool(max_workers) as executor:
+        for depth in range(max_depth + 1):
+            frontier = [url for url in frontier if allowed(url)][:max_pages - len(pages)]
+            if not frontier:
+                break
+            next_frontier = []
+            for url, body in executor.map(fetch_page, frontier):
+                if body is None:
+                    continue
+                try:
+                    text, links = page_parser(body, url)
+                except Exception: # Unparseable page; skip it rather than failing the crawl
+                    continue
+                text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                if text and text_hash not in seen_texts:
+                    seen_texts.add(text_hash)
+                    pages.append({"url": url, "text": text})
+                for link in links:
+                    link = normalize_url(link)
+                    if link not in seen and _is_crawlable(link, start_url):
+                        seen.add(link)
+                        next_frontier.append(link)
+            if depth == 0: # Sitemap pages come right after the homepage
+                new_sitemap_urls = list(dict.fromkeys(url for url in sitemap_urls if url not in seen))
+                seen.update(new_sitemap_urls)
+                next_frontier = new_sitemap_urls + next_frontier
+            # Shallow paths (/, /product, /pricing) tend to carry the most product information
+            frontier = sorted(next_frontier, key=lambda url: urlparse(url).path.count("/"))
+            if len(pages) >= max_pages:
+                break
+    session.close()
+    return pages
@@ -1,13 +1,13 @@
-def get_email_prompt(context_summary: str, lead_objective: str, objective_link: str, content_count: int) -> str:
+from prompts.prompt_assembly import format_context_block
+
+
+def get_email_prompt(context_summary: str | None, lead_objective: str, objective_link: str, content_count: int) -> str:
     return f"""
     You are an expert email marketing copywriter. Based on the provided context, generate {content_count} variations of a demand capture email.
     The lead objective is: {lead_objective}.
     The primary call to action link is: {objective_link}
 
-    Context:
-    ---
-    {context_summary}
-    ---
+    {format_context_block(context_summary)}
 
     For each email variation, provide a JSON object with the following keys: "headline", "subject_line", "body", "cta".
     - "headline": A compelling headline for the email (can be similar to subject or an internal title).
@@ -1,11 +1,11 @@
-def get_google_display_prompt(context_summary: str) -> str:
+from prompts.prompt_assembly import format_context_block
+
+
+def get_google_display_prompt(context_summary: str | None) -> str:
     return f"""
     You are an expert Google Display Ads copywriter. Based on the provided context, generate components for Responsive Display Ads.
 
-    Context:
-    ---
-    {context_summary}
-    ---
+    {format_context_block(context_summary)}
 
     Provide a single JSON object with two keys: "headlines" and "descriptions".
     - "headlines": A list of 5 unique headline strings. Each headline should be approximately 30 characters or less. (These are short headlines)
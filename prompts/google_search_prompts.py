@@ -1,11 +1,11 @@
-def get_google_search_prompt(context_summary: str) -> str:
+from prompts.prompt_assembly import format_context_block
+
+
+def get_google_search_prompt(context_summary: str | None) -> str:
     return f"""
     You are an expert Google Search Ads copywriter. Based on the provided context, generate components for Responsive Search Ads (RSAs).
 
-    Context:
-    ---
-    {context_summary}
-    ---
+    {format_context_block(context_summary)}
 
     Provide a single JSON object with two keys: "headlines" and "descriptions".
     - "headlines": A list of 15 unique headline strings. Each headline should be approximately 30 characters or less.
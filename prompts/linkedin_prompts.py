@@ -1,4 +1,7 @@
-def get_linkedin_prompt(context_summary: str, funnel_stage: str, destination_link: str, cta_button_options: str, content_count: int, lead_objective: str = None) -> str:
+from prompts.prompt_assembly import format_context_block
+
+
+def get_linkedin_prompt(context_summary: str | None, funnel_stage: str, destination_link: str, cta_button_options: str, content_count: int, lead_objective: str = None) -> str:
     
     intro_text_guidance = "300-400 characters. Hook in the first 150 characters. Embed relevant emojis. Split into paragraphs for readability."
     headline_chars = "~70 characters."
@@ -16,10 +19,7 @@ def get_linkedin_prompt(context_summary: str, funnel_stage: str, destination_lin
     {specific_instructions}
     The destination URL for this ad is: {destination_link}
 
-    Context:
-    ---
-    {context_summary}
-    ---
+    {format_context_block(context_summary)}
 
     For each ad variation, provide a JSON object with the following keys: "introductory_text", "image_copy", "headline", "destination_url", "cta_button".
     - "introductory_text": {intro_text_guidance}
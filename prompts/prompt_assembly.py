@@ -0,0 +1,107 @@
+import json
+
+GENERATION_SYSTEM_PROMPT = "You are an expert marketing copywriter. Generate content in the specified JSON format."
+# One per shard of a large request (see ai_processing.generate_sharded_ad_set), so shards do not converge on the same ads
+CREATIVE_ANGLES = (
+    "the pain point: open with the problem the audience feels and what it costs them",
+    "proof and outcomes: lead with concrete results, numbers or before/after contrasts",
+    "curiosity: open with a question or a surprising insight that makes the reader want more",
+    "aspiration: paint the better future the product enables for the reader and their team",
+    "peer proof: reference what similar companies or roles are doing and achieving",
+    "simplicity: emphasize how quick and easy it is to get started and see value",
+    "timeliness: tie the message to current pressures, trends or deadlines in the market",
+    "objection handling: address the most likely reason to hesitate and answer it",
+)
+
+
+def format_context_block(context_summary: str | None) -> str:
+    """
+    The "Context:" section of a channel prompt. With None the context is not repeated: it was
+    already sent as the shared prompt prefix (see build_generation_messages).
+    """
+    if context_summary is None:
+        return "Use the company context provided at the start of this conversation."
+    return f"""Context:
+    ---
+    {context_summary}
+    ---"""
+
+
+def build_generation_messages(context_summary: str, channel_instructions: str) -> list[dict]:
+    """
+    Chat messages for one generation call, ordered for provider prompt-prefix caching: the
+    system prompt and the context summary come first and are byte-identical for every channel
+    and stage of a run, the channel/stage instructions (built with context_summary=None) last.
+    """
+    return [
+        {"role": "system", "content": f"{GENERATION_SYSTEM_PROMPT}\n\nCompany context for every request in this conversation:\n---\n{context_summary}\n---"},
+        {"role": "user", "content": channel_instructions},
+    ]
+
+
+def build_combined_instructions(tasks: dict) -> str:
+    """
+    Instructions for one request that covers several channel/stage tasks at once.
+    `tasks` maps result key -> (content description, that task's instructions built with
+    context_summary=None); the answer nests each task's JSON object under its result key.
+    """
+    keys = ", ".join(f'"{key}"' for key in tasks)
+    sections = "\n\n".join(
+        f"=== Task {key}: {description} ===\n{instructions.strip()}" for key, (description, instructions) in tasks.items()
+    )
+    return f"""
+    Complete every task below in a single response.
+    Return one JSON object with exactly these top-level keys: {keys}.
+    The value of each key is the complete JSON object that task asks for (including its own list key).
+    If the context contains a lead magnet summary, make it the primary focus only for Demand Gen tasks.
+
+{sections}
+    """
+
+
+def build_repair_instructions(channel_instructions: str, existing_items: dict, missing_counts: dict) -> str:
+    """
+    Instructions that re-request only the items missing from an incomplete ad set.
+    `existing_items` maps list key -> items already accepted, `missing_counts` list key -> items needed.
+    """
+    needed = ", ".join(f'{count} item(s) for "{list_key}"' for list_key, count in missing_counts.items())
+    return f"""
+    {channel_instructions.strip()}
+
+    REPAIR REQUEST: an earlier response to these instructions was incomplete.
+    These items are already done; do not repeat them: {json.dumps(existing_items, ensure_ascii=False)}
+    Generate only the missing items: {needed}. Each one must follow the instructions above.
+    Return a JSON object with only these keys: {", ".join(f'"{list_key}"' for list_key in missing_counts)}.
+    """
+
+
+def add_angle_hint(channel_instructions: str, angle: str, shard_number: int, shard_total: int) -> str:
+    """Channel instructions for one shard of a sharded request, steered towards its own creative angle."""
+    return f"""
+    {channel_instructions.strip()}
+
+    This is batch {shard_number} of {shard_total}; other batches cover other angles.
+    Creative angle for every variation in this batch: {angle}.
+    Vary hooks, structure and wording between variations; avoid stock phrases.
+    """
+
+
+def build_fixup_instructions(entries: dict) -> str:
+    """
+    Instructions for one request that rewrites ads breaking platform limits (see ad_constraints).
+    `entries` maps item id -> (content description, the item as generated, list of problems).
+    """
+    sections = "\n\n".join(
+        f"=== {item_id} ({description}) ===\nProblems: {'; '.join(problems)}\nCurrent: {json.dumps(item, ensure_ascii=False)}"
+        for item_id, (description, item, problems) in entries.items()
+    )
+    return f"""
+    The ad copy below breaks platform limits. Rewrite each item so that it fixes every listed problem.
+    Keep the message, tone, language, links and emojis; change nothing that is not needed for the fix.
+    Shorten by tightening the wording, never by cutting off mid-sentence. Email bodies keep their
+    greeting, paragraphs and call-to-action link.
+    Return one JSON object with exactly these keys: {", ".join(f'"{item_id}"' for item_id in entries)}.
+    The value of each key is the complete rewritten item, in the same format as its current version.
+
+{sections}
+    """